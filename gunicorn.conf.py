@@ -1,4 +1,7 @@
 
+import os
+import shutil
+
 bind = "unix:/var/run/yang/yang-search.sock"
 #umask = os.umask('007')
 
@@ -17,4 +20,33 @@ accesslog = '/var/yang/logs/uwsgi/yang-search-access.log'
 errorlog = '/var/yang/logs/uwsgi/yang-search-error.log'
 loglevel = 'debug'
 #change log format
-access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"'
\ No newline at end of file
+access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"'
+
+# workers write prometheus metrics here, it has to exist before the application is loaded
+prometheus_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/var/run/yang/prometheus')
+os.makedirs(prometheus_dir, exist_ok=True)
+
+
+def on_starting(server):
+    # metrics of workers of the previous run would be merged with the new ones
+    shutil.rmtree(prometheus_dir, ignore_errors=True)
+    os.makedirs(prometheus_dir, exist_ok=True)
+    os.chown(prometheus_dir, server.cfg.uid, server.cfg.gid)
+    # indices are created once by the master, not by every worker importing the views
+    from search import connections
+    try:
+        connections.initialize_indices()
+    except Exception:
+        server.log.exception('Elasticsearch indices could not be initialized')
+    connections.reset()
+
+
+def post_fork(server, worker):
+    # connections and configuration inherited from the master are not used by the worker
+    from search import connections
+    connections.reset()
+
+
+def child_exit(server, worker):
+    from search import metrics
+    metrics.mark_process_dead(worker.pid)
@@ -33,6 +33,7 @@ from pyang.plugins.name import emit_name
 from pyang.plugins.yang_catalog_index_es import IndexerPlugin, resolve_organization
 from pyang.util import get_latest_revision
 from scripts.yangParser import create_context
+from search.generation import IndexGeneration, bump_generation, generation_path
 
 
 def __run_pyang_commands(commands, output_only=True, decode=True):
@@ -70,6 +71,7 @@ def build_yindex(ytree_dir, modules, LOGGER, save_file_dir, es_host, es_port, es
             time.sleep(30)
     # it must be able to connect in here
     es.ping()
+    generation = IndexGeneration(generation_path(temp_dir))
     x = 0
     modules_copy = modules.copy()
     for module in modules:
@@ -268,6 +270,8 @@ def build_yindex(ytree_dir, modules, LOGGER, save_file_dir, es_host, es_port, es
                 failed_mods[key] = val
             with open(failed_changes_dir, 'w') as f:
                 json.dump(failed_mods, f)
+    # once for the whole run, every increase reloads caches and snapshots of all the search workers
+    bump_generation(es, generation, LOGGER)
 
 
 def find_submodules(ctx, mods, module):
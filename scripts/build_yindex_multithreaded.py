@@ -36,6 +36,7 @@ from pyang.util import get_latest_revision
 import multiprocessing
 
 from scripts.yangParser import create_context
+from search.generation import IndexGeneration, bump_generation, generation_path
 
 modules_copy = multiprocessing.Manager().list()
 locking_value = multiprocessing.Manager().Value('i', 0)
@@ -94,6 +95,8 @@ def build_yindex(ytree_dir, modules, LOGGER, save_file_dir, es_host, es_port, es
         process_pool.append(proc)
     for p in process_pool:
         p.join()
+    # once for the whole run, every increase reloads caches and snapshots of all the search workers
+    bump_generation(es, IndexGeneration(generation_path(temp_dir)), LOGGER)
 
 
 def build_and_populate(lock_exception, lock_write_rest, lock_remove_list, lock_remove_elk, lock_index_elk, es, modules,
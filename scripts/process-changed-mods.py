@@ -38,6 +38,7 @@ import logging
 import os
 import stat
 import sys
+from collections import OrderedDict
 
 import dateutil.parser
 from elasticsearch import Elasticsearch, NotFoundError
@@ -45,6 +46,8 @@ from git import Repo
 from git.cmd import Git
 
 from scripts import build_yindex
+from search.generation import IndexGeneration, bump_generation, generation_path
+from search.journal import ChangeJournal, journal_path
 
 __author__ = "Miroslav Kovac, Joe Clarke"
 __copyright__ = "Copyright 2018 Cisco and its affiliates"
@@ -88,6 +91,28 @@ def pull(repo_dir):
         s.update(recursive=True, init=True)
 
 
+def module_paths(changes, yang_models):
+    """
+    Builds arguments of build_yindex from the changes cache.
+    :param changes: list of module paths or (name, path) pairs
+    :param yang_models: directory of the yangModels/yang repository, relative paths are in it
+    :return: list of module paths
+    """
+    mod_args = []
+    for change in changes:
+        if isinstance(change, tuple):
+            m, mod_path = change
+            mparts = m.split('/')
+            if len(mparts) == 2:
+                mod_path += ':' + mparts[1]
+        else:
+            mod_path = change
+        if not mod_path.startswith('/'):
+            mod_path = yang_models + '/' + mod_path
+        mod_args.append(mod_path)
+    return mod_args
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         description="Process changed modules in a git repo")
@@ -138,8 +163,10 @@ if __name__ == '__main__':
 
     changes_cache = {}
     delete_cache = []
+    journal = ChangeJournal(journal_path(changes_cache_dir))
     if ((not os.path.exists(changes_cache_dir) or os.path.getsize(changes_cache_dir) <= 0)
-            and (not os.path.exists(delete_cache_dir) or os.path.getsize(delete_cache_dir) <= 0)):
+            and (not os.path.exists(delete_cache_dir) or os.path.getsize(delete_cache_dir) <= 0)
+            and not journal):
         LOGGER.info('No new modules are added or removed. Exiting script!!!')
         os.unlink(lock_file)
         os.unlink(lock_file_cron)
@@ -170,6 +197,12 @@ if __name__ == '__main__':
 
             f.truncate(0)
             f.close()
+
+        # updates received by metadata_update, older ones may still be in the cache files above,
+        # updates of a run which failed before committing them are loaded again
+        LOGGER.info('Loading changes journal')
+        journal_changes, journal_deletes = journal.consume()
+        delete_cache = list(OrderedDict.fromkeys(delete_cache + journal_deletes))
         os.unlink(lock_file)
 
     if len(delete_cache) > 0:
@@ -235,34 +268,30 @@ if __name__ == '__main__':
             except NotFoundError as e:
                 LOGGER.warning('module not found {}'.format(e))
                 pass
+        bump_generation(es, IndexGeneration(generation_path(temp_dir)), LOGGER)
 
-    if len(changes_cache) == 0:
+    if len(changes_cache) == 0 and len(journal_changes) == 0:
         LOGGER.info("No module to be processed. Exiting.")
+        journal.commit()
         os.unlink(lock_file_cron)
         sys.exit(0)
 
     LOGGER.info('Pulling latest yangModels/yang repository')
     pull(yang_models)
 
-    mod_args = []
     if type(changes_cache) is list:
-        for mod_path in changes_cache:
-            if not mod_path.startswith('/'):
-                mod_path = yang_models + '/' + mod_path
-            mod_args.append(mod_path)
+        mod_args = module_paths(changes_cache, yang_models)
     else:
-        for m, mod_path in changes_cache.items():
-            mparts = m.split('/')
-            if len(mparts) == 2:
-                mod_path += ':' + mparts[1]
-            if not mod_path.startswith('/'):
-                mod_path = yang_models + '/' + mod_path
-            mod_args.append(mod_path)
+        changes_cache.update(journal_changes)
+        journal_changes = {}
+        mod_args = module_paths(changes_cache.items(), yang_models)
+    mod_args = list(OrderedDict.fromkeys(mod_args + module_paths(journal_changes.items(), yang_models)))
     sys.setrecursionlimit(50000)
     build_yindex.build_yindex(ytree_dir, mod_args, LOGGER, save_file_dir,
                               es_host, es_port, es_aws, elk_credentials, threads,
                               log_directory + '/process-changed-mods.log', failed_changes_cache_dir,
                               temp_dir, processes)
     sys.setrecursionlimit(recursion_limit)
+    journal.commit()
     os.unlink(lock_file_cron)
     LOGGER.info("Job finished successfully")
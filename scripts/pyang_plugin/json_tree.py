@@ -181,6 +181,7 @@ def get_node(s, module, prefix, ctx):
         child['class'] = s.keyword
         child['type_info'] = typestring(s)
 
+    # children has to be written as the last key, search.ytree parses the node before them
     if hasattr(s, 'i_children'):
         if s.keyword in ['choice', 'case']:
             child['children'] = get_children(s.i_children, module, prefix, ctx)
@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# Copyright The IETF Trust 2019, All Rights Reserved
+# Copyright 2018 Cisco and its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Replays requests from the gunicorn access log against a running instance and
+reports latency percentiles and error rates per route. Requests are sent at a
+fixed rate, or with the original spacing of the log sped up by a factor, by a
+pool of concurrent clients. Only GET requests are replayed by default, bodies of
+the POST requests are not logged and replaying metadata_update would change data.
+
+    PYTHONPATH=. python scripts/replay_access_log.py --target http://localhost:8005 --rate 20 --concurrency 5
+"""
+
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from search.benchmark import percentile
+
+ACCESS_LOG = '/var/yang/logs/uwsgi/yang-search-access.log'
+
+# access_log_format of gunicorn.conf.py: '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"'
+LOG_LINE = re.compile(r'^(?P<host>\S+) (?P<ident>\S+) (?P<user>\S+) \[(?P<time>[^\]]+)\] "(?P<request>[^"]*)" '
+                      r'(?P<status>\d{3}) (?P<size>\S+) "(?P<referer>[^"]*)" "(?P<agent>[^"]*)"')
+TIME_FORMAT = '%d/%b/%Y:%H:%M:%S %z'
+
+# routes of search/urls.py under the yang-search/ prefix, first match wins as in django
+ROUTES = [
+    ('index', r'$'),
+    ('show_node', r'(yang_tree/)?show_node/'),
+    ('reload_config', r'reload_config$'),
+    ('completions', r'(impact_analysis|module_details)/completions/[^/]+/[^/]+$'),
+    ('metadata_update', r'metadata_update$'),
+    ('yang_tree_data', r'yang_tree/data/[^/]+$'),
+    ('yang_tree_children', r'yang_tree/children/[^/]+/[^/]+$'),
+    ('module_details', r'module_details/([^/]+)?$'),
+    ('yang_tree', r'yang_tree/([^/]+)?$'),
+    ('impact_analysis', r'impact_analysis/([^/]+)?$'),
+    ('yangsuite', r'yangsuite/[^/]+$'),
+    ('impact_analysis_php', r'impact_analysis_php/$'),
+    ('ping', r'ping$'),
+    ('metrics', r'metrics$'),
+    ('static', r'static/')
+]
+ROUTE_PATTERNS = [(name, re.compile(r'^/yang-search/' + pattern)) for name, pattern in ROUTES]
+
+
+def parse_line(line):
+    """
+    :param line: line of the access log
+    :return: (dict) method, path, status and time of the request or None if the line can not be parsed
+    """
+    match = LOG_LINE.match(line)
+    if match is None:
+        return None
+    parts = match.group('request').split(' ')
+    if len(parts) != 3:
+        return None
+    try:
+        timestamp = datetime.strptime(match.group('time'), TIME_FORMAT).timestamp()
+    except ValueError:
+        return None
+    return {'method': parts[0], 'path': parts[1], 'status': int(match.group('status')), 'time': timestamp}
+
+
+def route(path):
+    """
+    :param path: path of the request with query string
+    :return: name of the route of the request, other when no route matches
+    """
+    path = path.split('?', 1)[0]
+    for name, pattern in ROUTE_PATTERNS:
+        if pattern.match(path):
+            return name
+    return 'other'
+
+
+def load_requests(log_file, methods, exclude, limit):
+    """
+    :param log_file: path to the access log
+    :param methods: replayed http methods
+    :param exclude: names of routes which are not replayed
+    :param limit: maximal number of requests, 0 for all of them
+    :return: list of parsed requests in the order of the log
+    """
+    loaded = []
+    with open(log_file, 'r', errors='replace') as f:
+        for line in f:
+            request = parse_line(line)
+            if request is None or request['method'] not in methods:
+                continue
+            request['route'] = route(request['path'])
+            if request['route'] in exclude:
+                continue
+            loaded.append(request)
+            if limit and len(loaded) == limit:
+                break
+    return loaded
+
+
+def schedule(loaded, rate, speed):
+    """
+    :param loaded: parsed requests
+    :param rate: requests per second, used when speed is not set
+    :param speed: factor by which the original spacing of the requests is shortened
+    :return: list of offsets in seconds from the start of the replay at which the requests are sent
+    """
+    if speed:
+        start = loaded[0]['time'] if loaded else 0
+        return [(request['time'] - start) / speed for request in loaded]
+    if rate:
+        return [i / rate for i in range(len(loaded))]
+    return [0.0] * len(loaded)
+
+
+class Replay(object):
+    """
+    Sends the requests with a pool of clients, each thread keeps its own session.
+    """
+
+    def __init__(self, target, concurrency, timeout):
+        self.target = target.rstrip('/')
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.results = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def send(self, request, scheduled):
+        start = time.perf_counter()
+        try:
+            response = self._session().request(request['method'], self.target + request['path'],
+                                               timeout=self.timeout, allow_redirects=False)
+            # the whole page is read, same as a browser would
+            len(response.content)
+            status = response.status_code
+        except requests.exceptions.RequestException:
+            status = None
+        duration = time.perf_counter() - start
+        with self._lock:
+            self.results.append({'route': request['route'], 'status': status, 'logged_status': request['status'],
+                                 'duration': duration, 'lag': start - scheduled})
+
+    def run(self, loaded, offsets):
+        """
+        Sends every request at its offset, requests wait for a free client when all of them are busy.
+        :param loaded: parsed requests
+        :param offsets: offsets of the requests in seconds from the start of the replay
+        :return: (float) duration of the replay in seconds
+        """
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for request, offset in zip(loaded, offsets):
+                delay = start + offset - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self.send, request, start + offset)
+        return time.perf_counter() - start
+
+
+def report(results, elapsed):
+    """
+    :param results: results of the sent requests
+    :param elapsed: duration of the replay in seconds
+    :return: (OrderedDict) statistics per route and of all the requests
+    """
+    by_route = OrderedDict()
+    for result in sorted(results, key=lambda result: result['route']):
+        by_route.setdefault(result['route'], []).append(result)
+    by_route['all'] = results
+    out = OrderedDict()
+    for name, route_results in by_route.items():
+        durations = sorted(result['duration'] for result in route_results)
+        failed = [result for result in route_results if result['status'] is None or result['status'] >= 500]
+        client_errors = [result for result in route_results if result['status'] is not None
+                         and 400 <= result['status'] < 500]
+        count = len(route_results)
+        out[name] = OrderedDict([
+            ('requests', count),
+            ('errors', len(failed)),
+            ('error_rate', round(len(failed) / count, 4) if count else 0.0),
+            ('client_errors', len(client_errors)),
+            ('status_changed', sum(1 for result in route_results if result['status'] != result['logged_status']
+                                   and result['logged_status'] != 304)),
+            ('p50_ms', round(percentile(durations, 0.5) * 1000, 2)),
+            ('p95_ms', round(percentile(durations, 0.95) * 1000, 2)),
+            ('p99_ms', round(percentile(durations, 0.99) * 1000, 2)),
+            ('max_ms', round(durations[-1] * 1000, 2) if durations else 0.0),
+            ('max_lag_ms', round(max([result['lag'] for result in route_results] or [0]) * 1000, 2))
+        ])
+    out['all']['throughput_rps'] = round(len(results) / elapsed, 2) if elapsed else 0.0
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay the access log against a yang-search instance')
+    parser.add_argument('--log', type=str, default=ACCESS_LOG, help='Path to the gunicorn access log')
+    parser.add_argument('--target', type=str, default='http://localhost:8005',
+                        help='Url of the instance the requests are sent to')
+    parser.add_argument('--rate', type=float, default=10.0,
+                        help='Requests per second, 0 sends them as fast as the clients manage')
+    parser.add_argument('--speed', type=float, default=0.0,
+                        help='Replay with the original spacing of the requests sped up by this factor, '
+                             'overrides --rate')
+    parser.add_argument('--concurrency', type=int, default=5, help='Number of concurrent clients')
+    parser.add_argument('--limit', type=int, default=0, help='Maximal number of replayed requests, 0 for all')
+    parser.add_argument('--timeout', type=float, default=300, help='Timeout of a request in seconds')
+    parser.add_argument('--methods', nargs='+', default=['GET'], help='Replayed http methods')
+    parser.add_argument('--exclude', nargs='+', default=['static', 'metadata_update', 'reload_config', 'metrics'],
+                        help='Routes which are not replayed')
+    parser.add_argument('--output', type=str, default=None, help='Path of the json report')
+    args = parser.parse_args()
+
+    loaded = load_requests(args.log, args.methods, args.exclude, args.limit)
+    if not loaded:
+        print('No requests to replay in {}'.format(args.log))
+        sys.exit(1)
+    offsets = schedule(loaded, args.rate, args.speed)
+    print('Replaying {} requests to {} with {} clients'.format(len(loaded), args.target, args.concurrency))
+    replay = Replay(args.target, args.concurrency, args.timeout)
+    elapsed = replay.run(loaded, offsets)
+    stats = report(replay.results, elapsed)
+
+    print('{:<20} {:>8} {:>8} {:>10} {:>10} {:>10}'.format('route', 'requests', 'error %', 'p50 ms', 'p95 ms',
+                                                        'p99 ms'))
+    for name, route_stats in stats.items():
+        print('{:<20} {:>8} {:>7.2%} {:>10.2f} {:>10.2f} {:>10.2f}'
+              .format(name, route_stats['requests'], route_stats['error_rate'], route_stats['p50_ms'],
+                      route_stats['p95_ms'], route_stats['p99_ms']))
+    print('Throughput {} requests per second'.format(stats['all']['throughput_rps']))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(stats, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+# Copyright The IETF Trust 2019, All Rights Reserved
+# Copyright 2018 Cisco and its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Client for the yangcatalog backend api. Every worker process uses a single
+pooled session with keep-alive connections, per call timeouts, bounded
+retries and a circuit breaker which fails fast while the api is down.
+"""
+
+import logging
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import timing
+
+logger = logging.getLogger(__name__)
+
+JSON_HEADERS = {'Content-type': 'application/json', 'Accept': 'application/json'}
+
+
+class BackendUnavailable(requests.exceptions.ConnectionError):
+    """
+    Raised without contacting the api while the circuit breaker is open.
+    """
+
+
+class CircuitBreaker(object):
+    """
+    Opens after failure_threshold consecutive failures. While open every call fails
+    immediately, after reset_timeout seconds one trial call is let through and its
+    result decides whether the circuit closes again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        :return: (bool) whether call can be made
+        """
+        with self._lock:
+            if self.opened is None:
+                return True
+            if time.monotonic() - self.opened >= self.reset_timeout:
+                # half open, let one call through and wait for its result
+                self.opened = time.monotonic()
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened = None
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if self.opened is None:
+                    logger.error('Backend api failed {} times in a row, opening circuit'.format(self.failures))
+                self.opened = time.monotonic()
+
+    @property
+    def is_open(self):
+        return self.opened is not None
+
+
+class BackendClient(object):
+    """
+    Pooled and instrumented client of the backend api. Latency is recorded per endpoint,
+    which is a name given by the caller so that urls with module names in them are counted
+    together.
+    """
+
+    def __init__(self, api_prefix, timeout=(5, 120), retries=2, pool_size=20, failure_threshold=5, reset_timeout=30):
+        """
+        :param api_prefix: api url prefix
+        :param timeout: default (connect, read) timeout in seconds
+        :param retries: number of retries of failed connections and 502, 503 and 504 responses
+        :param pool_size: maximal number of kept alive connections
+        :param failure_threshold: number of consecutive failures which opens the circuit
+        :param reset_timeout: number of seconds after which open circuit lets a trial call through
+        """
+        self.api_prefix = api_prefix
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.session = requests.Session()
+        self.session.headers.update(JSON_HEADERS)
+        retry = Retry(total=retries, connect=retries, read=0, backoff_factor=0.2,
+                      status_forcelist=(502, 503, 504), allowed_methods=frozenset(['GET', 'POST']),
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._stats = dict()
+        self._lock = threading.Lock()
+
+    def get(self, path, endpoint=None, **kwargs):
+        return self.request('GET', path, endpoint, **kwargs)
+
+    def post(self, path, endpoint=None, **kwargs):
+        return self.request('POST', path, endpoint, **kwargs)
+
+    def request(self, method, path, endpoint=None, **kwargs):
+        """
+        Sends request to the api.
+        :param method: http method
+        :param path: path of the api url starting with /api
+        :param endpoint: name under which the call is counted, path is used if not set
+        :param kwargs: other arguments of requests.Session.request
+        :return: requests.Response
+        """
+        endpoint = endpoint or path
+        if not self.breaker.allow():
+            self._record(endpoint, 0.0, True)
+            raise BackendUnavailable('Backend api circuit is open, not requesting {}'.format(path))
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.perf_counter()
+        try:
+            with timing.measure('backend'):
+                response = self.session.request(method, '{}{}'.format(self.api_prefix, path), **kwargs)
+        except requests.exceptions.RequestException:
+            self._record(endpoint, time.perf_counter() - start, True)
+            self.breaker.failure()
+            raise
+        failed = response.status_code >= 500
+        self._record(endpoint, time.perf_counter() - start, failed)
+        if failed:
+            self.breaker.failure()
+        else:
+            self.breaker.success()
+        return response
+
+    def _record(self, endpoint, duration, failed):
+        with self._lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                stats = self._stats[endpoint] = {'count': 0, 'errors': 0, 'total_time': 0.0, 'max_time': 0.0}
+            stats['count'] += 1
+            stats['total_time'] += duration
+            stats['max_time'] = max(stats['max_time'], duration)
+            if failed:
+                stats['errors'] += 1
+
+    def stats(self):
+        """
+        :return: (dict) endpoint -> call count, error count, total, average and maximal latency in seconds
+        """
+        with self._lock:
+            out = dict()
+            for endpoint, stats in self._stats.items():
+                out[endpoint] = dict(stats)
+                out[endpoint]['avg_time'] = stats['total_time'] / stats['count'] if stats['count'] else 0.0
+            return out
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client(api_prefix):
+    """
+    Returns the client of this process. New client is created after fork or when the
+    api prefix changes, so connections are never shared between gunicorn workers.
+    :param api_prefix: api url prefix
+    :return: BackendClient
+    """
+    global _client
+    client = _client
+    if client is not None and client.pid == os.getpid() and client.api_prefix == api_prefix:
+        return client
+    with _client_lock:
+        if _client is None or _client.pid != os.getpid() or _client.api_prefix != api_prefix:
+            _client = BackendClient(api_prefix)
+        return _client
@@ -0,0 +1,425 @@
+# Copyright The IETF Trust 2019, All Rights Reserved
+# Copyright 2018 Cisco and its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Stand-ins used by the benchmark management command to run the views without a
+network. SyntheticCatalog generates a reproducible catalog of modules, their
+yindex nodes and json-ytree files. FakeElasticsearch answers the subset of the
+query language built by search/queries.py from documents held in memory and
+FakeBackendAdapter answers the backend api calls of the views when it is mounted
+on the session of the backend client. percentile() is shared with the access log
+replay script.
+"""
+
+import json
+import os
+import random
+import re
+import time
+from collections import Counter, OrderedDict
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from . import timing
+
+ORGANIZATIONS = ['ietf', 'ieee', 'bbf', 'openconfig', 'cisco', 'juniper', 'huawei', 'nokia']
+WORDS = ['interfaces', 'routing', 'ip', 'bgp', 'ospf', 'isis', 'mpls', 'qos', 'acl', 'system', 'vlan', 'lldp',
+         'ntp', 'snmp', 'syslog', 'keychain', 'te', 'pim', 'igmp', 'dhcp', 'l2vpn', 'l3vpn', 'evpn', 'optical',
+         'platform', 'hardware', 'alarms', 'crypto', 'netconf', 'restconf', 'yang', 'types', 'inet', 'policy']
+MATURITY_LEVELS = ['ratified', 'adopted', 'initial']
+YANG_CATALOG_REVISION = '2018-04-03'
+# keys of the module details with help texts in the yang-catalog module
+YANG_CATALOG_KEYS = ['name', 'revision', 'organization', 'ietf', 'namespace', 'schema', 'maturity-level',
+                     'document-name', 'author-email', 'reference', 'module-classification', 'compilation-status',
+                     'prefix', 'yang-version', 'description', 'contact', 'module-type', 'dependencies', 'dependents']
+
+
+def percentile(values, fraction):
+    """
+    :param values: sorted list of values
+    :param fraction: percentile as a fraction, 0.95 for the 95th percentile
+    :return: value of the percentile, nearest rank
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def _property(key, value, children=None):
+    return {key: {'value': value, 'has_children': bool(children), 'children': children or []}}
+
+
+class SyntheticCatalog(object):
+    """
+    Catalog of modules generated from a seed, the same seed always gives the same
+    catalog. Every module imports a few modules generated before it, so impact graphs
+    have a realistic depth, and has a tree of nodes indexed in the yindex.
+    """
+
+    def __init__(self, modules=300, seed=1, nodes_per_module=40):
+        """
+        :param modules: number of modules
+        :param seed: seed of the random generator
+        :param nodes_per_module: average number of nodes of a module
+        """
+        self.rand = random.Random(seed)
+        self.modules = []
+        self.nodes = []
+        self.trees = dict()
+        names = []
+        for i in range(modules):
+            org = self.rand.choice(ORGANIZATIONS)
+            name = '{}-{}-{}'.format(org, self.rand.choice(WORDS), i)
+            imports = self.rand.sample(names, min(len(names), self.rand.randint(0, 4)))
+            for revision in self._revisions():
+                self._add_module(name, revision, org, imports, nodes_per_module)
+            names.append(name)
+        self._add_yang_catalog()
+        dependents = dict()
+        for mod in self.modules:
+            for dep in mod['dependencies']:
+                dependents.setdefault(dep['name'], OrderedDict())[mod['name']] = mod
+        for mod in self.modules:
+            mod['dependents'] = [{'name': name, 'revision': dep['revision'], 'schema': dep['schema']}
+                                 for name, dep in dependents.get(mod['name'], {}).items()]
+        self.by_key = {(mod['name'], mod['revision'], mod['organization']): mod for mod in self.modules}
+
+    def _revisions(self):
+        year = self.rand.randint(2015, 2020)
+        count = self.rand.randint(1, 3)
+        return ['{}-{:02d}-{:02d}'.format(year + i, self.rand.randint(1, 12), self.rand.randint(1, 28))
+                for i in range(count)]
+
+    def _add_module(self, name, revision, org, imports, nodes_per_module):
+        prefix = name.split('-', 1)[1].replace('-', '')
+        mod = {
+            'name': name,
+            'revision': revision,
+            'organization': org,
+            'namespace': 'urn:{}:yang:{}'.format(org, name),
+            'prefix': prefix,
+            'yang-version': self.rand.choice(['1.0', '1.1']),
+            'module-type': 'module',
+            'maturity-level': self.rand.choice(MATURITY_LEVELS) if org == 'ietf' else 'N/A',
+            'compilation-status': self.rand.choice(['passed', 'passed', 'passed-with-warnings', 'failed']),
+            'document-name': 'draft-{}-{}-{}.txt'.format(org, name, revision[:4]) if org == 'ietf' else '',
+            'reference': 'https://datatracker.ietf.org/doc/{}'.format(name) if org == 'ietf' else '',
+            'author-email': 'author@{}.example'.format(org),
+            'description': 'Synthetic module {} generated for benchmarks.'.format(name),
+            'contact': 'contact@{}.example'.format(org),
+            'schema': 'https://example.com/{}@{}.yang'.format(name, revision),
+            'ietf': {'ietf-wg': self.rand.choice(['netmod', 'netconf', 'rtgwg', 'teas'])} if org == 'ietf' else {},
+            'dependencies': [{'name': dep, 'schema': 'https://example.com/{}.yang'.format(dep)} for dep in imports],
+            'dependents': []
+        }
+        self.modules.append(mod)
+        children = self._children(name, revision, org, prefix, '', nodes_per_module, 0)
+        self.trees['{}@{}'.format(name, revision)] = {
+            'name': name, 'type': 'module', 'namespace': mod['namespace'], 'prefix': prefix,
+            'rpcs': [], 'notifications': [], 'children': children
+        }
+
+    def _children(self, module, revision, org, prefix, parent, budget, depth):
+        children = []
+        while budget > 0:
+            statement = self.rand.choice(['container', 'list', 'leaf', 'leaf', 'leaf-list']) if depth < 4 else 'leaf'
+            argument = '{}-{}'.format(self.rand.choice(WORDS), len(children))
+            path = '{}/{}:{}'.format(parent, prefix, argument)
+            budget -= 1
+            node = {
+                'name': argument, 'prefix': prefix, 'description': 'Description of {}'.format(argument),
+                'flags': {'config': self.rand.random() < 0.8}, 'status': 'current', 'path': path,
+                'schema_type': statement, 'options': '', 'class': statement
+            }
+            if statement in ('container', 'list'):
+                size = self.rand.randint(1, max(1, budget // 2))
+                node['children'] = self._children(module, revision, org, prefix, path, size, depth + 1)
+                budget -= size
+            else:
+                node['type'] = self.rand.choice(['string', 'uint32', 'boolean', 'inet:ip-address'])
+                node['type_info'] = {'type': node['type']}
+            children.append(node)
+            self.nodes.append({
+                'module': module, 'revision': revision, 'organization': org, 'path': path,
+                'statement': statement, 'argument': argument, 'description': node['description'],
+                'properties': json.dumps([_property('type', node.get('type', '')),
+                                          _property('description', node['description'])])
+            })
+        return children
+
+    def _add_yang_catalog(self):
+        mod = {'name': 'yang-catalog', 'revision': YANG_CATALOG_REVISION, 'organization': 'ietf',
+               'dependencies': [], 'dependents': [], 'maturity-level': 'N/A', 'compilation-status': 'passed'}
+        self.modules.append(mod)
+        for key in YANG_CATALOG_KEYS:
+            enums = [_property('enum', value, [_property('description', 'Help text of {}'.format(value))])
+                     for value in ('first', 'second')]
+            self.nodes.append({
+                'module': 'yang-catalog', 'revision': YANG_CATALOG_REVISION, 'organization': 'ietf',
+                'path': '/yc:catalog/yc:modules/yc:module/yc:{}'.format(key), 'statement': 'leaf',
+                'argument': key, 'description': 'Help text of {}.'.format(key),
+                'properties': json.dumps([_property('type', 'enumeration', enums)])
+            })
+
+    def module_documents(self):
+        """
+        :return: documents of the modules index
+        """
+        return [{'module': mod['name'], 'revision': mod['revision'], 'organization': mod['organization'],
+                 'namespace': mod.get('namespace', '')} for mod in self.modules]
+
+    def write_ytrees(self, ytree_dir):
+        """
+        Writes json-ytree file of every module the same way the json_tree plugin does.
+        :param ytree_dir: directory of the json-ytree files
+        """
+        os.makedirs(ytree_dir, exist_ok=True)
+        for module, tree in self.trees.items():
+            with open(os.path.join(ytree_dir, '{}.json'.format(module)), 'w') as f:
+                json.dump(tree, f, indent=4)
+
+    def latest(self):
+        """
+        :return: (dict) module name -> module object of its latest revision
+        """
+        latest = dict()
+        for mod in self.modules:
+            current = latest.get(mod['name'])
+            if current is None or mod['revision'] > current['revision']:
+                latest[mod['name']] = mod
+        return latest
+
+
+class FakeElasticsearch(object):
+    """
+    In-memory stand-in of the Elasticsearch client. Supports bool queries with
+    match_phrase and term clauses, sort, _source filtering and the terms, cardinality
+    and composite aggregations. filter_path is ignored, the views read responses
+    defensively because elasticsearch leaves out empty parts of filtered responses.
+    """
+
+    def __init__(self, indices, latency=0.0):
+        """
+        :param indices: (dict) index name -> list of documents
+        :param latency: seconds every request waits, as a network round trip would
+        """
+        self.documents = indices
+        # documents of every module, so queries for one module do not scan the whole index
+        self.by_module = dict()
+        for name, docs in indices.items():
+            for doc in docs:
+                self.by_module.setdefault(name, dict()).setdefault(doc.get('module'), []).append(doc)
+        self.latency = latency
+        self.indices = FakeIndices()
+        self.requests = Counter()
+
+    @staticmethod
+    def _field(doc, field):
+        if field.endswith('.keyword'):
+            field = field[:-len('.keyword')]
+        return doc.get(field)
+
+    @staticmethod
+    def _tokens(value):
+        return re.split(r'[^a-z0-9]+', str(value).lower())
+
+    def _matches(self, doc, clause):
+        kind, condition = next(iter(clause.items()))
+        field, expected = next(iter(condition.items()))
+        if isinstance(expected, dict):
+            expected = expected.get('query', expected.get('value'))
+        value = self._field(doc, field)
+        if value is None:
+            return False
+        if kind == 'match_phrase':
+            if field.endswith('.keyword'):
+                return value == expected
+            return str(expected).lower() in str(value).lower()
+        if kind == 'term':
+            expected = str(expected).lower()
+            return expected == str(value).lower() or expected in self._tokens(value)
+        if kind == 'match_all':
+            return True
+        raise ValueError('Unsupported query clause {}'.format(kind))
+
+    def _query(self, index, body):
+        query = body.get('query') or {}
+        must = query.get('bool', {}).get('must', [])
+        module = None
+        for clause in must:
+            condition = clause.get('match_phrase', {}).get('module.keyword')
+            if condition is not None:
+                module = condition.get('query') if isinstance(condition, dict) else condition
+        docs = []
+        for name in index.split(','):
+            if module is not None:
+                docs.extend(self.by_module.get(name, {}).get(module, []))
+            else:
+                docs.extend(self.documents.get(name, []))
+        if must:
+            docs = [doc for doc in docs if all(self._matches(doc, clause) for clause in must)]
+        for sort in reversed(body.get('sort', [])):
+            field, order = next(iter(sort.items()))
+            reverse = (order.get('order') if isinstance(order, dict) else order) == 'desc'
+            docs = sorted(docs, key=lambda doc: self._field(doc, field) or '', reverse=reverse)
+        return docs
+
+    def _aggregate(self, docs, aggs):
+        out = dict()
+        for name, agg in aggs.items():
+            if 'terms' in agg:
+                counts = Counter(self._field(doc, agg['terms']['field']) for doc in docs)
+                counts.pop(None, None)
+                ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:agg['terms'].get('size', 10)]
+                out[name] = {'buckets': [{'key': key, 'doc_count': count} for key, count in ranked]}
+            elif 'cardinality' in agg:
+                out[name] = {'value': len(set(self._field(doc, agg['cardinality']['field']) for doc in docs))}
+            elif 'composite' in agg:
+                source_name, source = next(iter(agg['composite']['sources'][0].items()))
+                counts = Counter(self._field(doc, source['terms']['field']) for doc in docs)
+                counts.pop(None, None)
+                keys = sorted(counts)
+                after = agg['composite'].get('after')
+                if after is not None:
+                    keys = [key for key in keys if key > after[source_name]]
+                keys = keys[:agg['composite']['size']]
+                out[name] = {'buckets': [{'key': {source_name: key}, 'doc_count': counts[key]} for key in keys]}
+                if keys:
+                    out[name]['after_key'] = {source_name: keys[-1]}
+            else:
+                raise ValueError('Unsupported aggregation {}'.format(name))
+        return out
+
+    def _search(self, index, body, size=None):
+        docs = self._query(index, body)
+        size = body.get('size', 10) if size is None else size
+        source = body.get('_source', True)
+        hits = []
+        for i, doc in enumerate(docs[body.get('from', 0):body.get('from', 0) + size]):
+            if source is False:
+                doc_source = dict()
+            elif isinstance(source, list):
+                doc_source = {key: doc[key] for key in source if key in doc}
+            else:
+                doc_source = dict(doc)
+            hits.append({'_index': index, '_type': 'modules', '_id': str(i), '_source': doc_source})
+        response = {'hits': {'total': len(docs), 'hits': hits}}
+        if body.get('aggs'):
+            response['aggregations'] = self._aggregate(docs, body['aggs'])
+        return response
+
+    def search(self, index=None, doc_type=None, body=None, size=None, filter_path=None, **kwargs):
+        with timing.measure('es'):
+            self.requests['search'] += 1
+            time.sleep(self.latency)
+            return self._search(index, body or {}, size)
+
+    def msearch(self, body=None, index=None, doc_type=None, filter_path=None, **kwargs):
+        with timing.measure('es'):
+            self.requests['msearch'] += 1
+            time.sleep(self.latency)
+            responses = []
+            for header, query in zip(body[::2], body[1::2]):
+                responses.append(self._search(header.get('index', index), query))
+            return {'responses': responses}
+
+
+class FakeIndices(object):
+
+    def create(self, index=None, body=None, **kwargs):
+        return {'acknowledged': True, 'index': index}
+
+    def refresh(self, index=None, **kwargs):
+        return {}
+
+
+class FakeBackendAdapter(BaseAdapter):
+    """
+    Transport adapter answering the backend api calls of the views from the catalog.
+    Mounted on the session of the backend client, it replaces the network completely.
+    """
+
+    def __init__(self, catalog, latency=0.0):
+        """
+        :param catalog: SyntheticCatalog
+        :param latency: seconds every request waits, as a network round trip would
+        """
+        super(FakeBackendAdapter, self).__init__()
+        self.catalog = catalog
+        self.latency = latency
+        self.requests = Counter()
+
+    def send(self, request, **kwargs):
+        time.sleep(self.latency)
+        path = requests.utils.urlparse(request.url).path
+        body = json.loads(request.body) if request.body else None
+        self.requests['{} {}'.format(request.method, re.sub(r'/[^/]*,[^/]*$', '/<module>', path))] += 1
+        status, payload = self._route(request.method, path, body)
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(payload).encode('utf-8')
+        response.headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+    def _route(self, method, path, body):
+        catalog = self.catalog
+        if method == 'POST' and path.endswith('/api/fast'):
+            return 200, {'results': self._fast(body)}
+        if method == 'POST' and path.endswith('/api/search/modules'):
+            found = [catalog.by_key.get((mod['name'], mod['revision'], mod['organization']))
+                     for mod in body.get('input', [])]
+            return 200, {'module': [mod for mod in found if mod is not None]}
+        if path.endswith('/api/search/modules'):
+            return 200, {'module': catalog.modules}
+        match = re.search(r'/api/search/modules/([^/,]+),([^/,]*),([^/]*)$', path)
+        if match is not None:
+            mod = catalog.by_key.get(match.groups())
+            if mod is None:
+                return 404, {'error': 'Module {} not found'.format(','.join(match.groups()))}
+            return 200, {'module': [mod]}
+        match = re.search(r'/api/search/(.+)$', path)
+        if match is not None:
+            keys = match.group(1).split('/')
+            found = []
+            for mod in catalog.modules:
+                value = mod
+                for key in keys[:-1]:
+                    value = value.get(key, {}) if isinstance(value, dict) else {}
+                if value == keys[-1]:
+                    found.append(mod)
+            return 200, {'yang-catalog:modules': {'module': found}}
+        return 404, {'error': 'Not found'}
+
+    def _fast(self, body):
+        term = body.get('search', '').lower()
+        results = []
+        for node in self.catalog.nodes:
+            if term in node['argument'].lower() or term in node['module'].lower():
+                mod = self.catalog.by_key[(node['module'], node['revision'], node['organization'])]
+                results.append({
+                    'module': {key: mod.get(key) for key in ('name', 'revision', 'organization', 'maturity-level',
+                                                             'compilation-status', 'dependents')},
+                    'node': {'type': node['statement'], 'path': node['path'], 'name': node['argument'],
+                             'description': node['description']}
+                })
+        return results
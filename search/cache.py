@@ -0,0 +1,505 @@
+# Copyright The IETF Trust 2019, All Rights Reserved
+# Copyright 2018 Cisco and its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Caches used by the search views. LRUCache and SnapshotHolder live in the
+memory of a single gunicorn worker, SharedCache is stored in a SQLite
+database shared by all the workers of the host.
+"""
+
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache(object):
+    """
+    Thread safe least recently used cache with a bounded number of entries
+    and an optional time to live for each entry. Optionally the total weight of
+    the entries is bounded as well, weight being for example the size of an entry
+    in bytes, and entries heavier than a limit are not stored at all. Entries can also be bound to
+    the index generation, they are dropped as soon as the generation changes and
+    nothing is served nor stored while the generation is not known.
+    Hit and miss counters are kept so that the efficiency of the cache can be
+    logged.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, name='', generation=None, weight=None, maxweight=None,
+                 max_entry_weight=None):
+        """
+        :param maxsize: maximal number of entries kept in the cache
+        :param ttl: (int) number of seconds after which entry expires, None means never
+        :param name: name of the cache used in logs
+        :param generation: function without arguments returning current index generation,
+                           None if entries do not depend on it
+        :param weight: function returning weight of a value, needed by maxweight and max_entry_weight
+        :param maxweight: maximal total weight of the entries kept in the cache, None means unbounded
+        :param max_entry_weight: values heavier than this are not stored, maxweight when not given
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self.generation = generation
+        self.weight = weight
+        self.maxweight = maxweight
+        self.max_entry_weight = maxweight if max_entry_weight is None else max_entry_weight
+        self.hits = 0
+        self.misses = 0
+        self.total_weight = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Get value stored under key and mark it as recently used.
+        :param key: cache key
+        :param default: value returned when key is not cached or has expired
+        :return: cached value or default
+        """
+        generation = self.generation() if self.generation is not None else None
+        if self.generation is not None and generation is None:
+            return self._miss(default)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires, entry_generation, entry_weight = entry
+                if (expires is None or expires > time.monotonic()) and entry_generation == generation:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    metrics.observe_cache(self.name, 'local', True)
+                    return value
+                del self._data[key]
+                self.total_weight -= entry_weight
+        return self._miss(default)
+
+    def _miss(self, default):
+        with self._lock:
+            self.misses += 1
+        metrics.observe_cache(self.name, 'local', False)
+        return default
+
+    def set(self, key, value):
+        """
+        Store value under key, evicting least recently used entries if the cache is full.
+        A value heavier than max_entry_weight is not stored and drops the previous value.
+        :param key: cache key
+        :param value: value to store
+        """
+        expires = None
+        if self.ttl is not None:
+            expires = time.monotonic() + self.ttl
+        generation = self.generation() if self.generation is not None else None
+        weight = self.weight(value) if self.weight is not None else 0
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.total_weight -= old[3]
+            if self.generation is not None and generation is None:
+                return
+            if self.max_entry_weight is not None and weight > self.max_entry_weight:
+                return
+            self._data[key] = (value, expires, generation, weight)
+            self.total_weight += weight
+            while len(self._data) > self.maxsize or (self.maxweight is not None and
+                                                     self.total_weight > self.maxweight):
+                self.total_weight -= self._data.popitem(last=False)[1][3]
+
+    def pop(self, key, default=None):
+        """
+        Remove key from the cache.
+        :param key: cache key
+        :param default: value returned when key is not cached
+        :return: removed value or default
+        """
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self.total_weight -= entry[3]
+        if entry is None:
+            return default
+        return entry[0]
+
+    def clear(self):
+        """
+        Drop all the entries and reset hit and miss counters.
+        """
+        with self._lock:
+            self._data.clear()
+            self.total_weight = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        :return: (dict) size of the cache together with hit and miss counters
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'weight': self.total_weight,
+                'maxweight': self.maxweight,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SnapshotHolder(object):
+    """
+    Holds a snapshot of data of the whole catalog, like the dependency graph or the
+    completion indexes. The snapshot is loaded lazily in a background thread and reloaded
+    once it is older than max_age seconds or has been invalidated. Until the first snapshot
+    is ready get() returns None and callers are expected to fall back to the api or
+    elasticsearch. A snapshot loaded for an older index generation is reloaded as well.
+    """
+
+    def __init__(self, loader, max_age=3600, retry_after=60, name='', generation=None):
+        """
+        :param loader: function without arguments returning the snapshot
+        :param max_age: number of seconds after which the snapshot is reloaded
+        :param retry_after: number of seconds to wait before retrying a failed load
+        :param name: name of the snapshot used in logs
+        :param generation: function without arguments returning current index generation,
+                           None if the snapshot does not depend on it
+        """
+        self.loader = loader
+        self.max_age = max_age
+        self.retry_after = retry_after
+        self.name = name
+        self.generation = generation
+        self.snapshot = None
+        self.created = 0
+        self.snapshot_generation = None
+        self.stale = True
+        self.failed = 0
+        self._loading = False
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        :return: current snapshot or None if none has been loaded yet
+        """
+        snapshot = self.snapshot
+        if self.generation is not None and self.snapshot_generation != self.generation():
+            self.stale = True
+        if self.stale or snapshot is None or time.time() - self.created > self.max_age:
+            self.refresh()
+        return snapshot
+
+    def invalidate(self):
+        """
+        Marks the snapshot as outdated, the next get() starts reloading it. The old snapshot
+        is still served until the new one is loaded.
+        """
+        self.stale = True
+
+    def refresh(self):
+        """
+        Starts loading of a new snapshot in a background thread unless one is already loading.
+        """
+        with self._lock:
+            if self._loading or time.time() - self.failed < self.retry_after:
+                return
+            self._loading = True
+            self.stale = False
+        thread = threading.Thread(target=self._load, name=self.name, daemon=True)
+        thread.start()
+
+    def _load(self):
+        start = time.time()
+        generation = self.generation() if self.generation is not None else None
+        try:
+            snapshot = self.loader()
+            self.snapshot = snapshot
+            self.snapshot_generation = generation
+            self.created = time.time()
+            self.failed = 0
+            logger.info('Snapshot {} with {} entries loaded in {:.2f}s'
+                        .format(self.name, len(snapshot), time.time() - start))
+        except Exception:
+            logger.exception('Failed to load snapshot {}'.format(self.name))
+            self.failed = time.time()
+            self.stale = True
+        finally:
+            with self._lock:
+                self._loading = False
+
+
+class SharedCache(object):
+    """
+    Least recently used cache stored in a SQLite database, shared by all the gunicorn
+    workers of the host and surviving their restarts. The database runs in WAL mode so
+    that readers do not block each other. Values are pickled. Every process and thread
+    opens its own connection. Errors of the database are logged and handled as misses,
+    the cache never fails a request. Entries bound to the index generation are neither
+    served nor stored while the generation is not known.
+
+    The cache is bounded by number of entries and optionally by total size of the pickled
+    values, values larger than max_entry_bytes are not stored. Entries optionally expire
+    after ttl seconds like those of LRUCache. Reads never write to the database, access
+    times of the hits are kept in memory and written with the next set.
+    """
+
+    # number of sets after which the table is trimmed to maxsize entries
+    EVICT_EVERY = 64
+    # number of seconds after which a hit updates access time of the entry
+    TOUCH_AFTER = 10
+
+    def __init__(self, path, maxsize=10000, name='shared', generation=None, timeout=1.0, maxbytes=None,
+                 max_entry_bytes=None, ttl=None):
+        """
+        :param path: function without arguments returning path to the database file
+        :param maxsize: maximal number of entries kept in the cache
+        :param name: name of the cache, used as name of its table and in logs
+        :param generation: function without arguments returning current index generation,
+                           None if entries do not depend on it
+        :param timeout: number of seconds to wait for a lock of the database
+        :param maxbytes: maximal total size of the pickled values, None means unbounded
+        :param max_entry_bytes: pickled values larger than this are not stored, maxbytes when not given
+        :param ttl: (int) number of seconds after which entry expires, None means never
+        """
+        self.path = path
+        self.maxsize = maxsize
+        self.name = name
+        self.table = 'cache_{}'.format(''.join(c if c.isalnum() else '_' for c in name))
+        self.generation = generation
+        self.timeout = timeout
+        self.maxbytes = maxbytes
+        self.max_entry_bytes = maxbytes if max_entry_bytes is None else max_entry_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._sets = 0
+        self._touched = dict()
+        self._touched_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+        connection = sqlite3.connect(self.path(), timeout=self.timeout, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        columns = [row[1] for row in connection.execute('PRAGMA table_info({})'.format(self.table))]
+        if columns and ('size' not in columns or 'expires' not in columns):
+            # table of an older version without sizes or expiration times of the values
+            connection.execute('DROP TABLE IF EXISTS {}'.format(self.table))
+        connection.execute('CREATE TABLE IF NOT EXISTS {} (key TEXT PRIMARY KEY, value BLOB, generation INTEGER, '
+                           'atime REAL, size INTEGER, expires REAL)'.format(self.table))
+        connection.execute('CREATE INDEX IF NOT EXISTS {0}_atime ON {0} (atime)'.format(self.table))
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    def _current_generation(self):
+        return self.generation() if self.generation is not None else 0
+
+    @staticmethod
+    def _key(key):
+        return json.dumps(key)
+
+    def get(self, key, default=None):
+        """
+        Get value stored under key and mark it as recently used. Access time of the entry
+        is only remembered here and written to the database by the next set.
+        :param key: cache key, has to be serializable to json
+        :param default: value returned when key is not cached
+        :return: cached value or default
+        """
+        generation = self._current_generation()
+        try:
+            if generation is None:
+                row = None
+            else:
+                row = self._connection().execute('SELECT value, generation, atime, expires FROM {} WHERE key = ?'
+                                                 .format(self.table), (self._key(key),)).fetchone()
+            now = time.time()
+            if row is not None and row[1] == generation and (row[3] is None or row[3] > now):
+                if now - row[2] > self.TOUCH_AFTER:
+                    with self._touched_lock:
+                        self._touched[self._key(key)] = now
+                value = pickle.loads(row[0])
+                self.hits += 1
+                metrics.observe_cache(self.name, 'shared', True)
+                return value
+        except (sqlite3.Error, OSError, pickle.UnpicklingError):
+            logger.exception('Failed to read {} from shared cache {}'.format(key, self.name))
+        self.misses += 1
+        metrics.observe_cache(self.name, 'shared', False)
+        return default
+
+    def set(self, key, value):
+        """
+        Store value under key, evicting least recently used entries if the cache is full.
+        A value larger than max_entry_bytes is not stored and drops the previous value.
+        :param key: cache key, has to be serializable to json
+        :param value: value to store, has to be picklable
+        """
+        generation = self._current_generation()
+        try:
+            connection = self._connection()
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL) if generation is not None else None
+            if data is None or (self.max_entry_bytes is not None and len(data) > self.max_entry_bytes):
+                connection.execute('DELETE FROM {} WHERE key = ?'.format(self.table), (self._key(key),))
+                return
+            with self._touched_lock:
+                touched = list(self._touched.items())
+                self._touched.clear()
+            if touched:
+                connection.executemany('UPDATE {} SET atime = ? WHERE key = ?'.format(self.table),
+                                       [(atime, touched_key) for touched_key, atime in touched])
+            now = time.time()
+            expires = now + self.ttl if self.ttl is not None else None
+            connection.execute('INSERT OR REPLACE INTO {} (key, value, generation, atime, size, expires) '
+                               'VALUES (?, ?, ?, ?, ?, ?)'.format(self.table),
+                               (self._key(key), data, generation, now, len(data), expires))
+            self._sets += 1
+            if self._sets % self.EVICT_EVERY == 0:
+                self._evict(connection, generation)
+            elif self.maxbytes is not None:
+                self._evict_bytes(connection)
+        except (sqlite3.Error, OSError, pickle.PicklingError):
+            logger.exception('Failed to write {} to shared cache {}'.format(key, self.name))
+
+    def _evict(self, connection, generation):
+        connection.execute('DELETE FROM {} WHERE generation != ? OR expires <= ?'.format(self.table),
+                           (generation, time.time()))
+        connection.execute('DELETE FROM {0} WHERE key IN (SELECT key FROM {0} ORDER BY atime DESC LIMIT -1 OFFSET ?)'
+                           .format(self.table), (self.maxsize,))
+        if self.maxbytes is not None:
+            self._evict_bytes(connection)
+
+    def _evict_bytes(self, connection):
+        total = connection.execute('SELECT TOTAL(size) FROM {}'.format(self.table)).fetchone()[0]
+        if total <= self.maxbytes:
+            return
+        evicted = []
+        for key, size in connection.execute('SELECT key, size FROM {} ORDER BY atime'.format(self.table)).fetchall():
+            if total <= self.maxbytes:
+                break
+            evicted.append((key,))
+            total -= size
+        connection.executemany('DELETE FROM {} WHERE key = ?'.format(self.table), evicted)
+
+    def pop(self, key, default=None):
+        """
+        Remove key from the cache.
+        :param key: cache key
+        :param default: value returned when key is not cached
+        :return: removed value or default
+        """
+        value = self.get(key, default)
+        try:
+            self._connection().execute('DELETE FROM {} WHERE key = ?'.format(self.table), (self._key(key),))
+        except (sqlite3.Error, OSError):
+            logger.exception('Failed to remove {} from shared cache {}'.format(key, self.name))
+        return value
+
+    def clear(self):
+        """
+        Drop all the entries for all the workers and reset hit and miss counters of this one.
+        """
+        self.hits = 0
+        self.misses = 0
+        try:
+            self._connection().execute('DELETE FROM {}'.format(self.table))
+        except (sqlite3.Error, OSError):
+            logger.exception('Failed to clear shared cache {}'.format(self.name))
+
+    def __len__(self):
+        try:
+            return self._connection().execute('SELECT COUNT(*) FROM {}'.format(self.table)).fetchone()[0]
+        except (sqlite3.Error, OSError):
+            return 0
+
+    def stats(self):
+        """
+        :return: (dict) size of the cache together with hit and miss counters of this worker
+        """
+        lookups = self.hits + self.misses
+        return {
+            'name': self.name,
+            'size': len(self),
+            'maxsize': self.maxsize,
+            'maxbytes': self.maxbytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+
+class TieredCache(object):
+    """
+    Worker local LRUCache in front of a SharedCache. Values found only in the shared
+    cache are copied to the local one, stored values are written to both.
+    """
+
+    def __init__(self, local, shared):
+        """
+        :param local: LRUCache
+        :param shared: SharedCache
+        """
+        self.local = local
+        self.shared = shared
+        self.name = local.name
+
+    def get(self, key, default=None):
+        value = self.local.get(key)
+        if value is None:
+            value = self.shared.get(key)
+            if value is None:
+                return default
+            self.local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        self.shared.set(key, value)
+
+    def pop(self, key, default=None):
+        value = self.local.pop(key)
+        shared_value = self.shared.pop(key)
+        if value is None:
+            value = shared_value
+        return default if value is None else value
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def stats(self):
+        """
+        :return: (dict) stats of both the local and the shared cache
+        """
+        return {'name': self.name, 'local': self.local.stats(), 'shared': self.shared.stats()}
+
+    def __len__(self):
+        return len(self.local)
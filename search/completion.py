@@ -0,0 +1,110 @@
+# Copyright The IETF Trust 2019, All Rights Reserved
+# Copyright 2018 Cisco and its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+In-memory index of module names and organizations used by the completions of
+the module_details and impact_analysis search bars. Values are numbered in the
+order they are ranked in and every substring of up to NGRAM characters of their
+lower case form points to the sorted numbers of the values containing it, so
+the best matches are found by walking a single such list from its beginning.
+"""
+
+from array import array
+
+from . import queries
+
+COMPLETION_LIMIT = 15
+NGRAM = 3
+
+
+class CompletionIndex(object):
+    """
+    Immutable index of all the values of one field. Matches are ranked by the number
+    of documents having the value, same as the terms aggregation used to rank them.
+    """
+
+    def __init__(self, counts):
+        """
+        :param counts: (dict) value -> number of documents with the value
+        """
+        self.counts = counts
+        self.values = sorted(counts, key=lambda value: (-counts[value], value))
+        self.lowered = [value.lower() for value in self.values]
+        grams = dict()
+        for number, lowered in enumerate(self.lowered):
+            for gram in set(lowered[i:i + size] for size in range(1, NGRAM + 1)
+                            for i in range(len(lowered) - size + 1)):
+                posting = grams.get(gram)
+                if posting is None:
+                    posting = grams[gram] = array('I')
+                posting.append(number)
+        self.grams = grams
+
+    def __len__(self):
+        return len(self.values)
+
+    def _candidates(self, pattern):
+        if len(pattern) <= NGRAM:
+            return self.grams.get(pattern, ())
+        postings = [self.grams.get(pattern[i:i + NGRAM], ()) for i in range(len(pattern) - NGRAM + 1)]
+        return min(postings, key=len)
+
+    def lookup(self, pattern, limit=COMPLETION_LIMIT):
+        """
+        Finds values containing the pattern, ignoring case. Values starting with the
+        pattern come first, values containing it elsewhere are used only when there
+        are not enough of those. Candidates are checked in the order of their rank,
+        so the lookup stops as soon as enough values starting with the pattern are found.
+        :param pattern: pattern written by the user
+        :param limit: maximal number of returned values
+        :return: list of matching values
+        """
+        pattern = pattern.lower()
+        if not pattern:
+            return self.values[:limit]
+        starting = []
+        containing = []
+        for number in self._candidates(pattern):
+            lowered = self.lowered[number]
+            if lowered.startswith(pattern):
+                starting.append(self.values[number])
+                if len(starting) == limit:
+                    break
+            elif len(containing) < limit and pattern in lowered:
+                containing.append(self.values[number])
+        return (starting + containing)[:limit]
+
+
+def load_completion_index(es, field, page_size=10000):
+    """
+    Reads all the values of the field from the modules index.
+    :param es: Elasticsearch client
+    :param field: keyword field of the modules index
+    :param page_size: number of values read at once
+    :return: CompletionIndex
+    """
+    counts = dict()
+    after = None
+    while True:
+        response = es.search(index='modules', doc_type='modules', body=queries.distinct_values(field, page_size, after),
+                             filter_path=queries.DISTINCT_VALUES_FILTER)
+        values = response.get('aggregations', {}).get('values', {})
+        buckets = values.get('buckets', [])
+        for bucket in buckets:
+            counts[bucket['key']['value']] = bucket['doc_count']
+        after = values.get('after_key')
+        if after is None or len(buckets) < page_size:
+            break
+    return CompletionIndex(counts)
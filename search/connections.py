@@ -0,0 +1,191 @@
+# Copyright The IETF Trust 2019, All Rights Reserved
+# Copyright 2018 Cisco and its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Configuration and elasticsearch client of the worker process. Both are created
+on first use instead of at import time, so the gunicorn master which preloads the
+application neither reads the configuration nor opens connections which all the
+forked workers would then share. A client created by another process is never
+returned, and gunicorn drops everything inherited from the master in post_fork.
+
+This module does not depend on Django, gunicorn.conf.py imports it as well.
+"""
+
+import configparser
+import json
+import os
+import threading
+
+from elasticsearch import Elasticsearch
+
+from . import timing
+
+CONFIG_PATH = '/etc/yangcatalog/yangcatalog.conf'
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'json')
+
+# index name -> file with the settings and mappings the index is created with
+INDICES = (
+    ('yindex', 'initialize_yindex_elasticsearch.json'),
+    ('modules', 'initialize_module_elasticsearch.json')
+)
+
+_config = None
+_es = None
+_pid = None
+_lock = threading.Lock()
+
+
+class TimedElasticsearch(Elasticsearch):
+    """
+    Elasticsearch client counting its queries to the timer of the current request.
+    """
+
+    def search(self, *args, **kwargs):
+        with timing.measure('es'):
+            return super(TimedElasticsearch, self).search(*args, **kwargs)
+
+    def msearch(self, *args, **kwargs):
+        with timing.measure('es'):
+            return super(TimedElasticsearch, self).msearch(*args, **kwargs)
+
+
+def load_config(config_path=CONFIG_PATH):
+    """
+    :param config_path: path to the yangcatalog configuration file
+    :return: ConfigParser with the configuration read
+    """
+    config = configparser.ConfigParser()
+    config._interpolation = configparser.ExtendedInterpolation()
+    config.read(config_path)
+    return config
+
+
+def create_es(config):
+    """
+    :param config: yangcatalog configuration
+    :return: Elasticsearch client for the configured host
+    """
+    es_host = config.get('DB-Section', 'es-host')
+    es_port = config.get('DB-Section', 'es-port')
+    es_aws = config.get('DB-Section', 'es-aws')
+    if es_aws == 'True':
+        elk_credentials = config.get('Secrets-Section', 'elk-secret').strip('"').split(' ')
+        return TimedElasticsearch([es_host], http_auth=(elk_credentials[0], elk_credentials[1]), scheme="https",
+                                  port=443)
+    return TimedElasticsearch([{'host': '{}'.format(es_host), 'port': es_port}])
+
+
+def _check_pid():
+    global _config, _es, _pid
+    if _pid != os.getpid():
+        _config = None
+        _es = None
+        _pid = os.getpid()
+
+
+def get_config():
+    """
+    :return: configuration of this process, read on first use
+    """
+    global _config
+    config = _config
+    if config is not None and _pid == os.getpid():
+        return config
+    with _lock:
+        _check_pid()
+        if _config is None:
+            _config = load_config()
+        return _config
+
+
+def get_es():
+    """
+    Returns the elasticsearch client of this process. New client is created after fork,
+    so connections of its pool are never shared between gunicorn workers.
+    :return: Elasticsearch
+    """
+    global _es
+    es = _es
+    if es is not None and _pid == os.getpid():
+        return es
+    config = get_config()
+    with _lock:
+        _check_pid()
+        if _es is None:
+            _es = create_es(config)
+        return _es
+
+
+def get_api_prefix():
+    """
+    :return: (str) api url prefix from the configuration
+    """
+    return get_config().get('Web-Section', 'my-uri')
+
+
+def reload():
+    """
+    Reads the configuration again and drops the elasticsearch client, the next call
+    of get_es() connects to the host from the new configuration.
+    :return: new configuration
+    """
+    global _config, _es, _pid
+    config = load_config()
+    with _lock:
+        _config = config
+        _es = None
+        _pid = os.getpid()
+    return config
+
+
+def reset():
+    """
+    Forgets configuration and client of this process without closing the client,
+    its connections may belong to the parent process. Called by gunicorn in post_fork.
+    """
+    global _config, _es, _pid
+    with _lock:
+        _config = None
+        _es = None
+        _pid = None
+
+
+def override(config, es):
+    """
+    Makes this process use the given configuration and elasticsearch client, used by
+    the benchmark to run the views against stand-ins.
+    :param config: ConfigParser with the configuration
+    :param es: object with the interface of the Elasticsearch client
+    """
+    global _config, _es, _pid
+    with _lock:
+        _config = config
+        _es = es
+        _pid = os.getpid()
+
+
+def initialize_indices(es=None):
+    """
+    Creates the yindex and modules indices unless they already exist. Called once by
+    the gunicorn master before workers are started, indexing scripts create them as well.
+    :param es: Elasticsearch client, client of this process when not given
+    """
+    if es is None:
+        es = get_es()
+    for index, file_name in INDICES:
+        with open(os.path.join(TEMPLATES_DIR, file_name), 'r') as f:
+            body = json.load(f)
+        es.indices.create(index=index, body=body, ignore=400)
@@ -0,0 +1,182 @@
+# Copyright The IETF Trust 2019, All Rights Reserved
+# Copyright 2018 Cisco and its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compact in-memory snapshot of the dependency graph of the whole catalog used
+by impact_analysis. Adjacency is kept in CSR (compressed sparse row) form:
+neighbours of node i are indices[indptr[i]:indptr[i + 1]]. Strings shared by
+many modules (organizations, maturity levels, compilation statuses) are stored
+once and referenced by small integer codes.
+"""
+
+import time
+from array import array
+
+
+class DependencyGraph(object):
+    """
+    Immutable snapshot of the dependency graph. Every module name gets an integer id.
+    Names which are only referenced as a dependency or a dependent but are missing in
+    the catalog get an id as well, but have no revision.
+    """
+
+    def __init__(self, names, revisions, org_codes, orgs, maturity_codes, maturities, status_codes, statuses,
+                 dependents, dependencies, belongs_to, documents):
+        self.names = names
+        self.ids = {name: i for i, name in enumerate(names)}
+        self.revisions = revisions
+        self.org_codes = org_codes
+        self.orgs = orgs
+        self.maturity_codes = maturity_codes
+        self.maturities = maturities
+        self.status_codes = status_codes
+        self.statuses = statuses
+        self.dependents_indptr, self.dependents_indices = dependents
+        self.dependencies_indptr, self.dependencies_indices = dependencies
+        self.belongs_to = belongs_to
+        self.documents = documents
+        self.created = time.time()
+
+    @classmethod
+    def from_modules(cls, modules):
+        """
+        Builds the snapshot from module objects as they are returned by the api. Only the
+        latest revision of every module is kept, which is the one impact_analysis resolves.
+        :param modules: list of module objects
+        :return: DependencyGraph
+        """
+        latest = dict()
+        for mod in modules:
+            name = mod.get('name')
+            if not name:
+                continue
+            current = latest.get(name)
+            if current is None or (mod.get('revision') or '') > (current.get('revision') or ''):
+                latest[name] = mod
+
+        names = sorted(latest)
+        ids = {name: i for i, name in enumerate(names)}
+
+        def node_id(name):
+            if name not in ids:
+                ids[name] = len(names)
+                names.append(name)
+            return ids[name]
+
+        def code(table, codes, value):
+            if value not in codes:
+                codes[value] = len(table)
+                table.append(value)
+            return codes[value]
+
+        orgs, maturities, statuses = [], [], []
+        org_index, maturity_index, status_index = dict(), dict(), dict()
+        revisions = []
+        org_codes = array('H')
+        maturity_codes = array('B')
+        status_codes = array('B')
+        belongs_to = dict()
+        documents = dict()
+        adjacency = {'dependents': [], 'dependencies': []}
+        for i, name in enumerate(sorted(latest)):
+            mod = latest[name]
+            revisions.append(mod.get('revision') or '')
+            org_codes.append(code(orgs, org_index, mod.get('organization') or ''))
+            maturity_codes.append(code(maturities, maturity_index, mod.get('maturity-level') or ''))
+            status_codes.append(code(statuses, status_index, mod.get('compilation-status') or ''))
+            if mod.get('belongs-to'):
+                belongs_to[i] = mod['belongs-to']
+            if mod.get('document-name') or mod.get('reference'):
+                documents[i] = (mod.get('document-name'), mod.get('reference'))
+            for key in adjacency:
+                adjacency[key].append([node_id(dep['name']) for dep in mod.get(key) or [] if dep.get('name')])
+        # referenced only, these are not part of the catalog
+        for _ in range(len(revisions), len(names)):
+            revisions.append(None)
+            for key in adjacency:
+                adjacency[key].append([])
+
+        csr = dict()
+        for key, rows in adjacency.items():
+            indptr = array('I', [0])
+            indices = array('I')
+            for row in rows:
+                indices.extend(row)
+                indptr.append(len(indices))
+            csr[key] = (indptr, indices)
+        return cls(names, revisions, org_codes, orgs, maturity_codes, maturities, status_codes, statuses,
+                   csr['dependents'], csr['dependencies'], belongs_to, documents)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        i = self.ids.get(name)
+        return i is not None and self.revisions[i] is not None
+
+    def dependents(self, name):
+        """
+        :param name: module name
+        :return: names of the modules which import given module
+        """
+        i = self.ids[name]
+        return [self.names[j]
+                for j in self.dependents_indices[self.dependents_indptr[i]:self.dependents_indptr[i + 1]]]
+
+    def dependencies(self, name):
+        """
+        :param name: module name
+        :return: names of the modules imported by given module
+        """
+        i = self.ids[name]
+        return [self.names[j]
+                for j in self.dependencies_indices[self.dependencies_indptr[i]:self.dependencies_indptr[i + 1]]]
+
+    def module_object(self, name):
+        """
+        Creates module object with all the attributes build_graph needs.
+        :param name: module name
+        :return: (dict) module object or None if the module is not in the catalog
+        """
+        i = self.ids.get(name)
+        if i is None or i >= len(self.org_codes):
+            return None
+        doc_name, reference = self.documents.get(i, (None, None))
+        return {
+            'name': name,
+            'revision': self.revisions[i],
+            'organization': self.orgs[self.org_codes[i]] or 'independent',
+            'maturity-level': self.maturities[self.maturity_codes[i]] or None,
+            'compilation-status': self.statuses[self.status_codes[i]] or None,
+            'belongs-to': self.belongs_to.get(i),
+            'document-name': doc_name,
+            'reference': reference,
+            'dependents': [{'name': dep} for dep in self.dependents(name)],
+            'dependencies': [{'name': dep} for dep in self.dependencies(name)],
+            'initialized': True
+        }
+
+
+def load_dependency_graph(client, timeout=(5, 300)):
+    """
+    Downloads all the modules from the api and builds the dependency graph snapshot.
+    :param client: BackendClient
+    :param timeout: (connect, read) timeout of the request in seconds
+    :return: DependencyGraph
+    """
+    response = client.get('/api/search/modules', endpoint='search/modules (all)', timeout=timeout)
+    response.raise_for_status()
+    modules = response.json().get('module') or []
+    return DependencyGraph.from_modules(modules)
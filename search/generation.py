@@ -0,0 +1,157 @@
+# Copyright The IETF Trust 2019, All Rights Reserved
+# Copyright 2018 Cisco and its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Index generation counter shared by the indexing scripts and all the gunicorn
+workers of a host. The counter lives in a small file which every process maps
+into memory, so reading it costs no system call. Indexer increases it after
+a run has written its modules to elasticsearch and the json-ytree directory,
+and workers drop everything they cached for an older generation.
+
+This module does not depend on Django, the scripts import it as well.
+"""
+
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import time
+
+GENERATION_FILE = 'index-generation'
+
+# generation counter and time of its last increase in nanoseconds since epoch
+LAYOUT = struct.Struct('<QQ')
+
+logger = logging.getLogger(__name__)
+
+
+class IndexGeneration(object):
+    """
+    Memory mapped generation counter. The file is created when it does not exist.
+    Increases are serialized with an exclusive flock of the file. When the file can not
+    be opened the generation is unknown, the failure is logged and opening is retried
+    after RETRY_AFTER seconds.
+    """
+
+    # number of seconds after which opening of the file is retried
+    RETRY_AFTER = 10
+
+    def __init__(self, path):
+        """
+        :param path: path to the generation file
+        """
+        self.path = path
+        self._fd = None
+        self._map = None
+        self._failed = None
+
+    def _open(self):
+        if self._map is not None:
+            return True
+        if self._failed is not None and time.monotonic() - self._failed < self.RETRY_AFTER:
+            return False
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o664)
+        except OSError:
+            self._open_failed()
+            return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size < LAYOUT.size:
+                    os.ftruncate(fd, LAYOUT.size)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            self._map = mmap.mmap(fd, LAYOUT.size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        except OSError:
+            os.close(fd)
+            self._open_failed()
+            return False
+        if self._failed is not None:
+            logger.info('Index generation file {} opened'.format(self.path))
+        self._failed = None
+        self._fd = fd
+        return True
+
+    def _open_failed(self):
+        if self._failed is None:
+            logger.exception('Index generation file {} can not be opened, generation is unknown'.format(self.path))
+        self._failed = time.monotonic()
+
+    def read(self):
+        """
+        :return: (tuple) generation and time of its last increase in seconds since epoch,
+                 None if the file can not be opened
+        """
+        if not self._open():
+            return None
+        generation, changed = LAYOUT.unpack_from(self._map, 0)
+        return generation, changed / 1e9
+
+    def current(self):
+        """
+        :return: (int) current generation, None if it is not known
+        """
+        state = self.read()
+        return None if state is None else state[0]
+
+    def bump(self):
+        """
+        Increases the generation, called by the indexer after it committed its changes.
+        :return: (int) new generation
+        """
+        if not self._open():
+            raise OSError('Index generation file {} can not be opened'.format(self.path))
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            generation = LAYOUT.unpack_from(self._map, 0)[0] + 1
+            LAYOUT.pack_into(self._map, 0, generation, time.time_ns())
+            self._map.flush()
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return generation
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            os.close(self._fd)
+            self._map = None
+            self._fd = None
+
+
+def generation_path(temp_dir):
+    """
+    :param temp_dir: temp directory from Directory-Section of the configuration
+    :return: path to the generation file
+    """
+    return os.path.join(temp_dir, GENERATION_FILE)
+
+
+def bump_generation(es, generation, log=None):
+    """
+    Makes the indexed documents visible to searches and increases the index generation,
+    so that the search workers drop everything they cached before. Every increase empties
+    the caches and reloads the snapshots of all the workers, so the indexer calls it once
+    after all its modules were written, not for every module.
+    :param es: Elasticsearch client
+    :param generation: IndexGeneration
+    :param log: logger of the calling script, logger of this module when not given
+    """
+    try:
+        es.indices.refresh(index='yindex,modules')
+        generation.bump()
+    except Exception:
+        (log or logger).exception('Failed to increase index generation')
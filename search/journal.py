@@ -0,0 +1,152 @@
+# Copyright The IETF Trust 2019, All Rights Reserved
+# Copyright 2018 Cisco and its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Journal of the module changes sent by the backend to metadata_update. Every
+update is appended as a single json line while an exclusive flock of the file is
+held, which takes no longer than the write itself. The process-changed-mods cron
+job consumes the journal, compacting all the updates into one set of modules to
+index and one set of modules to delete, and commits them once they were indexed.
+
+This module does not depend on Django, the scripts import it as well.
+"""
+
+import fcntl
+import json
+import os
+from collections import OrderedDict
+
+JOURNAL_FILE = 'changes-journal.jsonl'
+
+
+class ChangeJournal(object):
+    """
+    Append-only file of updates, one json object per line with modules-to-index
+    and modules-to-delete keys, same as the body of the metadata_update request.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: path to the journal file, created on first append
+        """
+        self.path = path
+
+    def append(self, modules_to_index, modules_to_delete):
+        """
+        Appends one update to the journal.
+        :param modules_to_index: (dict) module name -> path of the module to index
+        :param modules_to_delete: (list) name@revision/organization of the modules to delete
+        :return: (bool) whether anything was written
+        """
+        if not modules_to_index and not modules_to_delete:
+            return False
+        line = json.dumps({'modules-to-index': modules_to_index, 'modules-to-delete': modules_to_delete})
+        data = '{}\n'.format(line).encode('utf-8')
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o664)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                written = 0
+                while written < len(data):
+                    written += os.write(fd, data[written:])
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+        return True
+
+    def consume(self):
+        """
+        Reads all the updates and empties the journal. The updates are moved to a pending
+        file next to the journal until commit() is called after they were indexed, updates
+        left pending by a run which failed are returned again by the next one. Updates are
+        applied in the order they were appended, later path of the same module wins and every
+        module to delete is returned only once. A line which can not be parsed, such as one
+        cut short by a full disk, is skipped.
+        :return: (tuple) dict of modules to index and list of modules to delete
+        """
+        changes = dict()
+        deletes = OrderedDict()
+        try:
+            fd = os.open(self.path, os.O_RDWR)
+        except FileNotFoundError:
+            fd = None
+        content = b''
+        try:
+            if fd is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                try:
+                    with os.fdopen(os.dup(fd), 'rb') as f:
+                        content = f.read()
+                    if content:
+                        # appended before the journal is emptied, a crash in between only repeats updates
+                        with open(self.pending_path, 'ab') as f:
+                            f.write(content)
+                            f.flush()
+                            os.fsync(f.fileno())
+                        os.ftruncate(fd, 0)
+                finally:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            if fd is not None:
+                os.close(fd)
+        try:
+            with open(self.pending_path, 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            content = b''
+        for line in content.decode('utf-8', errors='replace').splitlines():
+            try:
+                update = json.loads(line)
+            except ValueError:
+                continue
+            changes.update(update.get('modules-to-index') or {})
+            for mod in update.get('modules-to-delete') or []:
+                deletes[mod] = None
+        return changes, list(deletes)
+
+    def commit(self):
+        """
+        Marks the updates returned by consume() as indexed. They are kept in a .bak
+        file next to the journal until the next commit.
+        """
+        try:
+            os.replace(self.pending_path, '{}.bak'.format(self.path))
+        except FileNotFoundError:
+            pass
+
+    @property
+    def pending_path(self):
+        """
+        :return: path to the updates consumed by a run which has not committed them yet
+        """
+        return '{}.pending'.format(self.path)
+
+    def __bool__(self):
+        for path in (self.path, self.pending_path):
+            try:
+                if os.path.getsize(path) > 0:
+                    return True
+            except OSError:
+                pass
+        return False
+
+
+def journal_path(changes_cache):
+    """
+    :param changes_cache: changes-cache file from Directory-Section of the configuration
+    :return: path to the journal, kept in the directory of the changes cache
+    """
+    return os.path.join(os.path.dirname(changes_cache), JOURNAL_FILE)
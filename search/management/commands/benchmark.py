@@ -0,0 +1,207 @@
+# Copyright The IETF Trust 2019, All Rights Reserved
+# Copyright 2018 Cisco and its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measures latency and throughput of the views against in-memory stand-ins of
+elasticsearch and the backend api filled with a synthetic catalog, so results
+do not depend on the network and are comparable between runs with the same seed.
+
+    python manage.py benchmark --modules 300 --iterations 50 --output benchmark.json
+"""
+
+import configparser
+import json
+import logging
+import shutil
+import tempfile
+import time
+from urllib.parse import quote
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import setup_test_environment
+
+from search import connections, views
+from search.backend import get_client
+from search.benchmark import FakeBackendAdapter, FakeElasticsearch, SyntheticCatalog, percentile
+
+API_PREFIX = 'http://backend.benchmark'
+VIEWS = ['index', 'module_details', 'yang_tree', 'yang_tree_data', 'impact_analysis', 'completions', 'show_node']
+SNAPSHOT_TIMEOUT = 60
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the views against local stand-ins of elasticsearch and the backend api'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modules', type=int, default=300, help='Number of modules of the synthetic catalog')
+        parser.add_argument('--nodes', type=int, default=40, help='Average number of nodes of a module')
+        parser.add_argument('--seed', type=int, default=1, help='Seed of the synthetic catalog')
+        parser.add_argument('--iterations', type=int, default=20, help='Number of measured requests per view')
+        parser.add_argument('--warmup', type=int, default=2, help='Number of not measured requests per view')
+        parser.add_argument('--targets', type=int, default=10,
+                            help='Number of different modules requested, the requests rotate through them')
+        parser.add_argument('--es-latency', type=float, default=0.0,
+                            help='Milliseconds added to every elasticsearch request')
+        parser.add_argument('--backend-latency', type=float, default=0.0,
+                            help='Milliseconds added to every backend api request')
+        parser.add_argument('--cold', action='store_true', help='Clear the caches before every request')
+        parser.add_argument('--views', nargs='+', choices=VIEWS, default=VIEWS, help='Views to benchmark')
+        parser.add_argument('--output', type=str, default='benchmark.json', help='Path of the json report')
+
+    def handle(self, *args, **options):
+        if options['verbosity'] < 2:
+            logging.getLogger('search').setLevel(logging.CRITICAL)
+            logging.getLogger('django').setLevel(logging.CRITICAL)
+        setup_test_environment()
+        work_dir = tempfile.mkdtemp(prefix='yang-search-benchmark-')
+        try:
+            start = time.perf_counter()
+            catalog = SyntheticCatalog(options['modules'], options['seed'], options['nodes'])
+            self.install(catalog, work_dir, options)
+            self.stdout.write('Catalog of {} modules and {} nodes generated in {:.1f} s'
+                              .format(len(catalog.modules), len(catalog.nodes), time.perf_counter() - start))
+            report = {
+                'settings': {key: options[key] for key in ('modules', 'nodes', 'seed', 'iterations', 'warmup',
+                                                           'targets', 'es_latency', 'backend_latency', 'cold')},
+                'catalog': {'modules': len(catalog.modules), 'nodes': len(catalog.nodes)},
+                'views': dict()
+            }
+            client = Client()
+            for view in options['views']:
+                urls = self.urls(view, catalog, options['targets'])
+                report['views'][view] = self.measure(client, view, urls, options)
+            views.clear_caches()
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write('Report written to {}'.format(options['output']))
+
+    def install(self, catalog, work_dir, options):
+        """
+        Points the views to the stand-ins and to a configuration using the work directory.
+        """
+        ytree_dir = '{}/ytree'.format(work_dir)
+        catalog.write_ytrees(ytree_dir)
+        config = configparser.ConfigParser()
+        config.read_dict({
+            'Directory-Section': {'temp': work_dir, 'json-ytree': ytree_dir,
+                                  'changes-cache': '{}/changes-cache'.format(work_dir)},
+            'Web-Section': {'my-uri': API_PREFIX},
+            'Secrets-Section': {'update-signature': 'benchmark', 'elk-secret': ''},
+            'DB-Section': {'es-host': 'localhost', 'es-port': '9200', 'es-aws': 'False'}
+        })
+        self.es = FakeElasticsearch({'modules': catalog.module_documents(), 'yindex': catalog.nodes},
+                                    latency=options['es_latency'] / 1000)
+        connections.override(config, self.es)
+        self.adapter = FakeBackendAdapter(catalog, latency=options['backend_latency'] / 1000)
+        get_client(API_PREFIX).session.mount(API_PREFIX, self.adapter)
+        if views.generation_counter is not None:
+            views.generation_counter.close()
+            views.generation_counter = None
+        views.clear_caches()
+
+    def urls(self, view, catalog, targets):
+        """
+        :return: urls requested for the view, one per target module, the index page also without a search
+        """
+        latest = catalog.latest()
+        # modules with the most dependents give the largest impact graphs and module pages
+        ranked = sorted((mod for name, mod in latest.items() if name != 'yang-catalog'),
+                        key=lambda mod: (-len(mod['dependents']), mod['name']))[:targets]
+        urls = []
+        if view == 'index':
+            # the page as it is opened first, without any search
+            urls.append('/yang-search/')
+        for mod in ranked:
+            name = mod['name']
+            if view == 'index':
+                urls.append('/yang-search/?search_string={}'.format(quote(name.split('-')[1])))
+            elif view == 'module_details':
+                urls.append('/yang-search/module_details/{}'.format(name))
+            elif view == 'yang_tree':
+                urls.append('/yang-search/yang_tree/{}'.format(name))
+            elif view == 'yang_tree_data':
+                urls.append('/yang-search/yang_tree/data/{}'.format(name))
+            elif view == 'impact_analysis':
+                urls.append('/yang-search/impact_analysis/{}'.format(name))
+            elif view == 'completions':
+                urls.append('/yang-search/module_details/completions/module/{}'.format(name[:len(name) // 2]))
+            elif view == 'show_node':
+                node = next(node for node in catalog.nodes
+                            if node['module'] == name and node['revision'] == mod['revision'])
+                urls.append('/yang-search/show_node/{}{}/{}'.format(name, node['path'], mod['revision']))
+        return urls
+
+    def request(self, client, url):
+        """
+        :return: (tuple) duration of the request in seconds including the streamed content and status code
+        """
+        start = time.perf_counter()
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return time.perf_counter() - start, response.status_code
+
+    def wait_for_snapshots(self):
+        deadline = time.monotonic() + SNAPSHOT_TIMEOUT
+        holders = [views.DEPENDENCY_GRAPH] + list(views.COMPLETION_INDEXES.values())
+        while time.monotonic() < deadline and any(holder.get() is None for holder in holders):
+            time.sleep(0.05)
+
+    def measure(self, client, view, urls, options):
+        """
+        Requests the view and computes its statistics.
+        :return: (dict) statistics of the view
+        """
+        for i in range(options['warmup']):
+            for url in urls:
+                self.request(client, url)
+        if options['warmup']:
+            self.wait_for_snapshots()
+        es_before = sum(self.es.requests.values())
+        backend_before = sum(self.adapter.requests.values())
+        durations = []
+        errors = 0
+        total = 0.0
+        for i in range(options['iterations']):
+            if options['cold']:
+                views.clear_caches()
+            duration, status = self.request(client, urls[i % len(urls)])
+            total += duration
+            durations.append(duration)
+            if status >= 400:
+                errors += 1
+        durations.sort()
+        count = len(durations)
+        stats = {
+            'requests': count,
+            'errors': errors,
+            'throughput_rps': round(count / total, 2) if total else 0.0,
+            'mean_ms': round(total / count * 1000, 2) if count else 0.0,
+            'min_ms': round(durations[0] * 1000, 2) if count else 0.0,
+            'p50_ms': round(percentile(durations, 0.5) * 1000, 2),
+            'p95_ms': round(percentile(durations, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(durations, 0.99) * 1000, 2),
+            'max_ms': round(durations[-1] * 1000, 2) if count else 0.0,
+            'es_requests_per_request': round((sum(self.es.requests.values()) - es_before) / count, 2) if count else 0,
+            'backend_requests_per_request': round((sum(self.adapter.requests.values()) - backend_before) / count, 2)
+            if count else 0
+        }
+        self.stdout.write('{:<16} p50 {:>9.2f} ms  p95 {:>9.2f} ms  p99 {:>9.2f} ms  {:>8.2f} req/s  {} errors'
+                          .format(view, stats['p50_ms'], stats['p95_ms'], stats['p99_ms'], stats['throughput_rps'],
+                                  errors))
+        return stats
@@ -0,0 +1,105 @@
+# Copyright The IETF Trust 2019, All Rights Reserved
+# Copyright 2018 Cisco and its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Prometheus metrics of the search service. gunicorn.conf.py points
+PROMETHEUS_MULTIPROC_DIR to a directory shared by all the workers before the
+application is loaded, every worker then writes its values to its own files in
+that directory and the metrics view merges files of all the workers. Without
+the variable, for example under runserver, metrics of the single process are
+exposed.
+
+Hit ratio of a cache is hits / (hits + misses) of search_cache_lookups_total.
+"""
+
+import os
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+MULTIPROC_DIR_ENV = 'PROMETHEUS_MULTIPROC_DIR'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+GRAPH_SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+VIEW_LATENCY = Histogram('search_view_duration_seconds', 'Duration of requests handled by a view',
+                         ['view'], buckets=LATENCY_BUCKETS)
+CALL_LATENCY = Histogram('search_call_duration_seconds',
+                         'Duration of elasticsearch queries (es), backend api calls (backend) '
+                         'and template rendering (render)', ['kind'], buckets=LATENCY_BUCKETS)
+CALL_ERRORS = Counter('search_call_errors_total', 'Calls which raised an exception', ['kind'])
+CACHE_LOOKUPS = Counter('search_cache_lookups_total', 'Cache lookups', ['cache', 'tier', 'result'])
+GRAPH_NODES = Histogram('search_impact_graph_nodes', 'Number of nodes of the impact analysis graphs',
+                        buckets=GRAPH_SIZE_BUCKETS)
+GRAPH_EDGES = Histogram('search_impact_graph_edges', 'Number of edges of the impact analysis graphs',
+                        buckets=GRAPH_SIZE_BUCKETS)
+
+
+def observe_view(view, duration):
+    """
+    :param view: name of the url pattern of the view, None when no view was resolved
+    :param duration: duration of the request in seconds
+    """
+    VIEW_LATENCY.labels(view or 'unknown').observe(duration)
+
+
+def observe_call(kind, duration, failed=False):
+    """
+    :param kind: kind of work, es, backend or render
+    :param duration: duration of the call in seconds
+    :param failed: whether the call raised an exception
+    """
+    CALL_LATENCY.labels(kind).observe(duration)
+    if failed:
+        CALL_ERRORS.labels(kind).inc()
+
+
+def observe_cache(cache, tier, hit):
+    """
+    :param cache: name of the cache
+    :param tier: local for the in-process caches, shared for the caches shared by the workers
+    :param hit: whether the key was found
+    """
+    CACHE_LOOKUPS.labels(cache, tier, 'hit' if hit else 'miss').inc()
+
+
+def observe_graph(nodes, edges):
+    """
+    :param nodes: number of nodes of the impact analysis graph
+    :param edges: number of edges of the impact analysis graph
+    """
+    GRAPH_NODES.observe(nodes)
+    GRAPH_EDGES.observe(edges)
+
+
+def exposition():
+    """
+    :return: (tuple) metrics of all the workers in the text format and its content type
+    """
+    if os.environ.get(MULTIPROC_DIR_ENV):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """
+    Removes live gauges of an exited worker, called by gunicorn in child_exit.
+    :param pid: pid of the worker
+    """
+    if os.environ.get(MULTIPROC_DIR_ENV):
+        multiprocess.mark_process_dead(pid)
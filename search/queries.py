@@ -0,0 +1,195 @@
+# Copyright The IETF Trust 2019, All Rights Reserved
+# Copyright 2018 Cisco and its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Builders of the elasticsearch queries sent by the views. Json templates are read
+from disk only once per process. Every query selects only the _source fields its
+caller reads and is sent together with a filter_path, so elasticsearch does not
+return metadata of the hits or large fields such as properties when they are not
+needed.
+"""
+
+import copy
+import functools
+import json
+import os
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'json')
+
+REV_ORG_SOURCE = ['module', 'revision', 'organization']
+NODE_SOURCE = ['module', 'revision', 'path', 'statement', 'argument', 'properties']
+HELP_TEXT_SOURCE = ['argument', 'description', 'properties']
+
+HITS_FILTER = 'hits.hits._source'
+MSEARCH_FILTER = 'responses.hits.hits._source,responses.error'
+COMPLETION_FILTER = 'aggregations.groupby_module.buckets.key'
+DISTINCT_ORGS_FILTER = 'aggregations.distinct_orgs.value'
+DISTINCT_VALUES_FILTER = 'aggregations.values.buckets,aggregations.values.after_key'
+
+
+@functools.lru_cache(maxsize=None)
+def _load_template(name):
+    with open(os.path.join(TEMPLATES_DIR, name), 'r') as f:
+        return json.load(f)
+
+
+def template(name):
+    """
+    :param name: file name of the json template
+    :return: (dict) private copy of the template which can be modified
+    """
+    return copy.deepcopy(_load_template(name))
+
+
+def hits(response):
+    """
+    Safely gets hits from the search response, with filter_path set elasticsearch
+    leaves out the hits key completely when nothing was found.
+    :param response: search response
+    :return: list of hits
+    """
+    return response.get('hits', {}).get('hits', [])
+
+
+def _match_module(name):
+    return {'match_phrase': {'module.keyword': {'query': name}}}
+
+
+def _match_revision(revision):
+    return {'match_phrase': {'revision': {'query': revision}}}
+
+
+def module_revision(name, revision, source=REV_ORG_SOURCE):
+    """
+    :param name: module name
+    :param revision: module revision
+    :param source: list of _source fields to return
+    :return: query for the modules index matching given revision of the module
+    """
+    return {
+        'query': {'bool': {'must': [_match_module(name), _match_revision(revision)]}},
+        '_source': source
+    }
+
+
+def module_latest(name, source=REV_ORG_SOURCE):
+    """
+    :param name: module name
+    :param source: list of _source fields to return
+    :return: query for the modules index matching all revisions of the module sorted from the latest
+    """
+    return {
+        'query': {'bool': {'must': [_match_module(name)]}},
+        'sort': [{'revision': {'order': 'desc'}}],
+        '_source': source
+    }
+
+
+def rev_org(mod):
+    """
+    :param mod: Module name optionally with @revision
+    :return: query for the modules index which finds revision and organization of the module
+    """
+    if '@' in mod:
+        mod_parts = mod.split('@')
+        return module_revision(mod_parts[0], mod_parts[1])
+    return module_latest(mod)
+
+
+def module_revisions(name):
+    """
+    :param name: module name
+    :return: query for the modules index returning all the revisions of the module from the latest
+    """
+    return module_latest(name, source=['revision'])
+
+
+def node_by_path(name, path, revision):
+    """
+    :param name: module name
+    :param path: path of the node
+    :param revision: module revision
+    :return: query for the yindex matching the node
+    """
+    query = template('show_node.json')
+    query['query']['bool']['must'][0]['match_phrase']['module.keyword']['query'] = name
+    query['query']['bool']['must'][1]['match_phrase']['path']['query'] = path
+    query['query']['bool']['must'][2]['match_phrase']['revision']['query'] = revision
+    query['_source'] = NODE_SOURCE
+    return query
+
+
+def yang_catalog_nodes(revision):
+    """
+    :param revision: revision of the yang-catalog module
+    :return: query for the yindex returning nodes of the yang-catalog module needed for help texts
+    """
+    query = template('get_yang_catalog_yang.json')
+    query['query']['bool']['must'][1]['match_phrase']['revision']['query'] = revision
+    query['_source'] = HELP_TEXT_SOURCE
+    return query
+
+
+def completions(selector, pattern):
+    """
+    :param selector: field to complete, module or organization
+    :param pattern: pattern written by the user
+    :return: query for the modules index aggregating matching values of the field
+    """
+    query = template('completion.json')
+    query['query']['bool']['must'][0]['term'] = {selector: pattern.lower()}
+    query['aggs']['groupby_module']['terms']['field'] = '{}.keyword'.format(selector)
+    query['_source'] = False
+    return query
+
+
+def distinct_orgs():
+    """
+    :return: query for the modules index counting distinct organizations
+    """
+    return {
+        'size': 0,
+        'aggs': {
+            'distinct_orgs': {
+                'cardinality': {
+                    'field': 'organization.keyword'
+                }
+            }
+        }
+    }
+
+
+def distinct_values(field, size, after=None):
+    """
+    :param field: keyword field of the modules index
+    :param size: number of values returned at once
+    :param after: after_key of the previous page or None for the first page
+    :return: query for the modules index returning one page of all the values of the field
+             with their document counts
+    """
+    composite = {
+        'size': size,
+        'sources': [{'value': {'terms': {'field': field}}}]
+    }
+    if after is not None:
+        composite['after'] = after
+    return {
+        'size': 0,
+        'aggs': {
+            'values': {
+                'composite': composite
+            }
+        }
+    }
@@ -152,49 +152,89 @@ def dissolve(properties, indent = '\t'):
 
 @register.filter(name='search_results')
 def search_results(results, search_columns):
-    html = ''
+    """
+    Renders all the rows of the search results table.
+    :param results: search results
+    :param search_columns: selected columns
+    :return: html output
+    """
+    return ''.join(iter_search_results(results, search_columns))
+
+
+def iter_search_results(results, search_columns):
+    """
+    Renders rows of the search results table one by one, so that they can be
+    streamed to the client while they are being produced.
+    :param results: iterable of search results
+    :param search_columns: selected columns
+    :return: generator of html rows
+    """
     if results:
         for result in results:
-            html += '<tr>'
-            if "Name" in search_columns:
-                path = result['path'].replace('?', '%3F')
- #               for type_part in re.findall(r'\?[^/]*', result['path']):
-  #                  path = path.replace(type_part, '')
-                html += '<td> <a href="/yang-search/show_node/{}/{}/{}">{}</a></td>'\
-                    .format(result['name'], path, result['revision'], result['node_name'])
-            if "Revision" in search_columns:
-                html += '<td>{}</td>'.format(result['revision'])
-            if "Schema Type" in search_columns:
-                html += '<td>{}</td>'.format(result['type'])
-            if "Path" in search_columns:
-                html += '<td>{}</td>'.format(result['path'])
-            if "Module" in search_columns:
-                html += '<td>{}<br/>'.format(result['name'])
-                html += '<span style = "font-size: small">'
-                html += '(<a href="/yang-search/module_details/{}">'.format(result['name'])
-                html += '<img src="/yang-search/static/img/details.png" border="0" title="Module Details for {}" > Module Details </a>'.format(result['name'])
-                html += '|<a href="/yang-search/yang_tree/{}" >'.format(result['name'])
-                html += '<img border="0" src="/yang-search/static/img/leaf.png" title="Tree View for {}" >'.format(result['name'])
-                html += 'Tree View </a>|'
-                html += '<a href="/yang-search/impact_analysis/{}" >'.format(result['name'])
-                html += '<img src="/yang-search/static/img/impact.png" border="0" title="Impact Analysis for {}" >'.format(result['name'])
-                html += 'Impact Analysis </a>) </span> </td>'
-            if "Origin" in search_columns:
-                html += '<td> {} </td>'.format(result['origin'])
-            if "Organization" in search_columns:
-                html += '<td> {} </td>'.format(result['organization'])
-            if "Maturity" in search_columns:
-                html += '<td> {} </td>'.format(result['maturity'])
-            if "Imported By # Modules" in search_columns:
-                html += '<td> {} </td>'.format(result['dependents'])
-            if "Compilation Status" in search_columns:
-                if result['compile_status']:
-                    html += '<td> {} </td>'.format(result['compile_status'])
-                else:
-                    html += '<td> N/A </td>'
-            if "Description" in search_columns:
-                html += '<td> {} </td>'.format(result['description'])
-            html += '</tr>'
+            yield search_result_row(result, search_columns)
+
+
+def search_result_row(result, search_columns):
+    """
+    Renders one row of the search results table.
+    :param result: search result
+    :param search_columns: selected columns
+    :return: html output
+    """
+    html = '<tr>'
+    if "Name" in search_columns:
+        path = result['path'].replace('?', '%3F')
+        # for type_part in re.findall(r'\?[^/]*', result['path']):
+        #     path = path.replace(type_part, '')
+        html += '<td> <a href="/yang-search/show_node/{}/{}/{}">{}</a></td>'\
+            .format(result['name'], path, result['revision'], result['node_name'])
+    if "Revision" in search_columns:
+        html += '<td>{}</td>'.format(result['revision'])
+    if "Schema Type" in search_columns:
+        html += '<td>{}</td>'.format(result['type'])
+    if "Path" in search_columns:
+        html += '<td>{}</td>'.format(result['path'])
+    if "Module" in search_columns:
+        html += '<td>{}<br/>'.format(result['name'])
+        html += '<span style = "font-size: small">'
+        html += '(<a href="/yang-search/module_details/{}">'.format(result['name'])
+        html += '<img src="/yang-search/static/img/details.png" border="0" title="Module Details for {}" > Module Details </a>'.format(result['name'])
+        html += '|<a href="/yang-search/yang_tree/{}" >'.format(result['name'])
+        html += '<img border="0" src="/yang-search/static/img/leaf.png" title="Tree View for {}" >'.format(result['name'])
+        html += 'Tree View </a>|'
+        html += '<a href="/yang-search/impact_analysis/{}" >'.format(result['name'])
+        html += '<img src="/yang-search/static/img/impact.png" border="0" title="Impact Analysis for {}" >'.format(result['name'])
+        html += 'Impact Analysis </a>) </span> </td>'
+    if "Origin" in search_columns:
+        html += '<td> {} </td>'.format(result['origin'])
+    if "Organization" in search_columns:
+        html += '<td> {} </td>'.format(result['organization'])
+    if "Maturity" in search_columns:
+        html += '<td> {} </td>'.format(result['maturity'])
+    if "Imported By # Modules" in search_columns:
+        html += '<td> {} </td>'.format(result['dependents'])
+    if "Compilation Status" in search_columns:
+        if result['compile_status']:
+            html += '<td> {} </td>'.format(result['compile_status'])
+        else:
+            html += '<td> N/A </td>'
+    if "Description" in search_columns:
+        html += '<td> {} </td>'.format(result['description'])
+    html += '</tr>'
+    return html
+
+
+def search_error_row(message, search_columns):
+    """
+    Renders row of the search results table telling that the rest of the results failed.
+    It has as many cells as the other rows, the message is in the first one.
+    :param message: error message
+    :param search_columns: selected columns
+    :return: html output
+    """
+    html = '<tr><td class="text-danger"><b>ERROR!</b> {}</td>'.format(escape(message))
+    html += '<td></td>' * (len(search_columns) - 1)
+    html += '</tr>'
     return html
 
 
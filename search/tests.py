@@ -15,6 +15,1024 @@
 #     See the License for the specific language governing permissions and
 #     limitations under the License.
 
-from django.test import TestCase
+import configparser
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import SimpleTestCase, override_settings
+
+from search import connections, timing, views, ytree
+from search.backend import BackendClient, BackendUnavailable, CircuitBreaker, get_client
+from search.benchmark import FakeBackendAdapter, FakeElasticsearch, SyntheticCatalog, percentile
+from search.cache import LRUCache, SharedCache, SnapshotHolder, TieredCache
+from search.completion import CompletionIndex, load_completion_index
+from search.depgraph import DependencyGraph, load_dependency_graph
+from search.generation import IndexGeneration, bump_generation
+from search.journal import ChangeJournal, journal_path
+
+API_PREFIX = 'http://backend.test'
+
+
+class IndexViewTest(SimpleTestCase):
+
+    def test_page_without_search_term(self):
+        response = self.client.get('/yang-search/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.streaming)
+        self.assertContains(response, 'search_string')
+
+    def test_page_with_empty_search_term(self):
+        response = self.client.get('/yang-search/', {'search_string': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.streaming)
+
+
+
+YTREE = {
+    'name': 'example-interfaces',
+    'prefix': 'ex',
+    'namespace': 'urn:example:interfaces',
+    'description': 'Interfaces with "quotes", escapes \\ and unicode é\U0001f600',
+    'children': [{
+        'name': 'interfaces',
+        'schema_type': 'container',
+        'path': '/ex:interfaces',
+        'description': 'Interface\nconfiguration',
+        'flags': {'config': True},
+        'status': 'current',
+        'children': [{
+            'name': 'interface',
+            'schema_type': 'list',
+            'path': '/ex:interfaces/ex:interface',
+            'flags': {'config': True},
+            'options': '*',
+            'children': [{
+                'name': 'name',
+                'schema_type': 'leaf',
+                'path': '/ex:interfaces/ex:interface/ex:name',
+                'type': 'string',
+                'type_info': {'type': 'string', 'length': [1, 64]},
+                'flags': {'config': True}
+            }, {
+                'name': 'mtu',
+                'schema_type': 'leaf',
+                'path': '/ex:interfaces/ex:interface/ex:mtu',
+                'type': 'uint16',
+                'type_info': {'type': 'uint16', 'range': [-1.5e3, 65535], 'default': None},
+                'flags': {'config': False}
+            }, {
+                'name': 'address',
+                'schema_type': 'choice',
+                'path': '/ex:interfaces/ex:interface/ex:address',
+                'children': [{
+                    'name': 'v4',
+                    'schema_type': 'case',
+                    'path': '/ex:interfaces/ex:interface/ex:address/ex:v4',
+                    'children': []
+                }]
+            }]
+        }]
+    }],
+    'rpcs': [{
+        'name': 'reset',
+        'schema_type': 'rpc',
+        'path': '/ex:reset',
+        'children': [{
+            'name': 'input',
+            'schema_type': 'input',
+            'path': '/ex:reset/ex:input',
+            'children': [{'name': 'delay', 'schema_type': 'leaf', 'path': '/ex:reset/ex:input/ex:delay',
+                          'type': 'uint32'}]
+        }]
+    }],
+    'notifications': [],
+    'augments': [{
+        'augment_children': [{'name': 'speed', 'schema_type': 'leaf', 'path': '/ex:interfaces/ex:speed',
+                              'type': 'uint64'}],
+        'augment_path': '/ex:interfaces'
+    }],
+    'revision': '2019-01-01'
+}
+
+
+def materialize(value):
+    if isinstance(value, ytree.LazyNodes):
+        return [materialize(item) for item in value]
+    if isinstance(value, dict):
+        return dict((key, materialize(item)) for key, item in value.items())
+    return value
+
+
+class YangTreeTest(SimpleTestCase):
+
+    def setUp(self):
+        self.text = json.dumps(YTREE, indent=2)
+        self.expected = json.load(io.StringIO(self.text))
+
+    def test_iter_module_matches_json_load(self):
+        for chunk_size in (1, 2, 3, 7, 64, ytree.CHUNK_SIZE):
+            parsed = dict((key, materialize(value))
+                          for key, value in ytree.iter_module(io.StringIO(self.text), chunk_size))
+            self.assertEqual(parsed, self.expected, chunk_size)
+
+    def test_iter_module_skips_values_not_iterated(self):
+        keys = [key for key, value in ytree.iter_module(io.StringIO(self.text), 5)]
+        self.assertEqual(keys, list(self.expected))
+
+    def test_build_jstree_lazy_children_match_whole_tree(self):
+        whole, json_tree, blob, offsets = views.build_jstree(io.StringIO(self.text), 'example-interfaces',
+                                                             inline_depth=100)
+        self.assertEqual(blob, b'')
+        self.assertEqual(offsets, {})
+        self.assertEqual(json_tree, dict((key, value) for key, value in self.expected.items()
+                                         if key not in ('children', 'rpcs', 'notifications', 'augments')))
+        top, json_tree, blob, offsets = views.build_jstree(io.StringIO(self.text), 'example-interfaces')
+        self.assertNotEqual(offsets, {})
+        for start, length in offsets.values():
+            self.assertIsInstance(json.loads(blob[start:start + length].decode('utf-8')), list)
+        tree = {'top': json.dumps(top, cls=DjangoJSONEncoder), 'children': blob, 'offsets': offsets}
+        self.assertEqual(json.loads(views.assemble_jstree(tree)), json.loads(json.dumps(whole, cls=DjangoJSONEncoder)))
+
+    def test_invalid_document(self):
+        with self.assertRaises(ValueError):
+            dict(ytree.iter_module(io.StringIO(self.text[:len(self.text) // 2]), 16))
+
+
+class LRUCacheTest(SimpleTestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    def test_ttl(self):
+        cache = LRUCache(ttl=0.05)
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        time.sleep(0.1)
+        self.assertEqual(cache.get('a', 'expired'), 'expired')
+        self.assertEqual(len(cache), 0)
+
+    def test_generation(self):
+        generation = [1]
+        cache = LRUCache(generation=lambda: generation[0])
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        generation[0] = 2
+        self.assertIsNone(cache.get('a'))
+        generation[0] = None
+        cache.set('a', 1)
+        self.assertEqual(len(cache), 0)
+        self.assertIsNone(cache.get('a'))
+
+    def test_weight(self):
+        cache = LRUCache(weight=len, maxweight=10, max_entry_weight=6)
+        cache.set('a', 'x' * 5)
+        cache.set('b', 'x' * 4)
+        cache.set('c', 'x' * 3)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.total_weight, 7)
+        cache.set('b', 'x' * 7)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.total_weight, 3)
+        cache.pop('c')
+        self.assertEqual(cache.total_weight, 0)
+
+
+class SharedCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.sqlite')
+
+    def test_shared_between_instances(self):
+        SharedCache(lambda: self.path, name='test').set(('a', 1), {'value': [1, 2]})
+        cache = SharedCache(lambda: self.path, name='test')
+        self.assertEqual(cache.get(('a', 1)), {'value': [1, 2]})
+        self.assertEqual(cache.pop(('a', 1)), {'value': [1, 2]})
+        self.assertIsNone(cache.get(('a', 1)))
+
+    def test_generation(self):
+        generation = [1]
+        cache = SharedCache(lambda: self.path, name='test', generation=lambda: generation[0])
+        cache.set('a', 1)
+        generation[0] = 2
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', 2)
+        generation[0] = None
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', 3)
+        generation[0] = 2
+        self.assertIsNone(cache.get('a'))
+
+    def test_evicts_oldest(self):
+        cache = SharedCache(lambda: self.path, maxsize=2, name='test')
+        cache.EVICT_EVERY = 1
+        for key in 'abc':
+            cache.set(key, key)
+            time.sleep(0.01)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('c'), 'c')
+
+    def test_maxbytes(self):
+        cache = SharedCache(lambda: self.path, name='test', maxbytes=2500, max_entry_bytes=1500)
+        cache.set('a', b'x' * 1000)
+        time.sleep(0.01)
+        cache.set('b', b'x' * 1000)
+        time.sleep(0.01)
+        cache.set('c', b'x' * 1000)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 2)
+        cache.set('b', b'x' * 2000)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(len(cache), 1)
+
+    def test_tiered(self):
+        shared = SharedCache(lambda: self.path, name='test')
+        shared.set('a', 1)
+        cache = TieredCache(LRUCache(name='test'), shared)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.local.get('a'), 1)
+        cache.clear()
+        self.assertIsNone(cache.get('a'))
+
+    def test_ttl(self):
+        cache = TieredCache(LRUCache(ttl=0.05, name='test'), SharedCache(lambda: self.path, name='test', ttl=0.05))
+        cache.set('a', 1)
+        self.assertEqual(cache.shared.get('a'), 1)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(views.REV_ORG_CACHE.local.ttl, views.REV_ORG_TTL)
+        self.assertEqual(views.REV_ORG_CACHE.shared.ttl, views.REV_ORG_TTL)
+
+
+class CatalogTestCase(SimpleTestCase):
+    """
+    Runs the views against the stand-ins of the benchmark filled with a small synthetic catalog.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super(CatalogTestCase, cls).setUpClass()
+        cls.work_dir = tempfile.mkdtemp(prefix='yang-search-test-')
+        cls.catalog = cls.create_catalog()
+        ytree_dir = '{}/ytree'.format(cls.work_dir)
+        cls.catalog.write_ytrees(ytree_dir)
+        cls.config = configparser.ConfigParser()
+        cls.config.read_dict({
+            'Directory-Section': {'temp': cls.work_dir, 'json-ytree': ytree_dir,
+                                  'changes-cache': '{}/changes-cache'.format(cls.work_dir)},
+            'Web-Section': {'my-uri': API_PREFIX},
+            'Secrets-Section': {'update-signature': 'test', 'elk-secret': ''},
+            'DB-Section': {'es-host': 'localhost', 'es-port': '9200', 'es-aws': 'False'}
+        })
+        cls.saved_connections = (connections._config, connections._es)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections.override(*cls.saved_connections)
+        shutil.rmtree(cls.work_dir, ignore_errors=True)
+        super(CatalogTestCase, cls).tearDownClass()
+
+    @classmethod
+    def create_catalog(cls):
+        return SyntheticCatalog(30, 1, 10)
+
+    def setUp(self):
+        self.es = FakeElasticsearch({'modules': self.catalog.module_documents(), 'yindex': self.catalog.nodes})
+        connections.override(self.config, self.es)
+        self.adapter = self.create_adapter()
+        get_client(views.get_api_prefix()).session.mount(API_PREFIX, self.adapter)
+        if views.generation_counter is not None:
+            views.generation_counter.close()
+            views.generation_counter = None
+        views.clear_caches()
+        # snapshots of the catalog of another test case must not be served
+        for holder in [views.DEPENDENCY_GRAPH] + list(views.COMPLETION_INDEXES.values()):
+            holder.snapshot = None
+        self.addCleanup(views.clear_caches)
+
+    def create_adapter(self):
+        return FakeBackendAdapter(self.catalog)
+
+    def latest(self, count):
+        latest = self.catalog.latest()
+        return [latest[name] for name in sorted(latest) if name != 'yang-catalog'][:count]
+
+
+class PartialBackendAdapter(FakeBackendAdapter):
+    """
+    Leaves out every other module of the responses of the bulk search, or the module
+    key completely when empty is set.
+    """
+
+    empty = False
+
+    def _route(self, method, path, body):
+        status, payload = super(PartialBackendAdapter, self)._route(method, path, body)
+        if method == 'POST' and path.endswith('/api/search/modules'):
+            payload = dict() if self.empty else {'module': payload['module'][::2]}
+        return status, payload
+
+
+class RevOrgObjsTest(CatalogTestCase):
+
+    def test_batched(self):
+        mods = self.latest(5)
+        alerts = []
+        mod_objs = views.get_rev_org_objs([mod['name'] for mod in mods], alerts)
+        self.assertEqual(alerts, [])
+        for mod in mods:
+            self.assertEqual((mod_objs[mod['name']]['revision'], mod_objs[mod['name']]['description']),
+                             (mod['revision'], mod['description']))
+        self.assertEqual(self.es.requests['msearch'], 1)
+        self.assertEqual(dict(self.adapter.requests), {'POST /api/search/modules': 1})
+        # served from the caches
+        self.assertEqual(views.get_rev_org_objs([mod['name'] for mod in mods], alerts), mod_objs)
+        self.assertEqual(self.es.requests['msearch'], 1)
+        self.assertEqual(dict(self.adapter.requests), {'POST /api/search/modules': 1})
+
+    def test_unknown_module(self):
+        alerts = []
+        self.assertEqual(views.get_rev_org_objs(['missing-module'], alerts), {'missing-module': None})
+        self.assertEqual(len(alerts), 1)
+
+
+class PartialRevOrgObjsTest(CatalogTestCase):
+
+    def create_adapter(self):
+        return PartialBackendAdapter(self.catalog)
+
+    def test_modules_missing_in_bulk_response_are_requested_one_by_one(self):
+        mods = self.latest(4)
+        alerts = []
+        with self.assertLogs('search.views', 'WARNING'):
+            mod_objs = views.get_rev_org_objs([mod['name'] for mod in mods], alerts)
+        self.assertEqual(alerts, [])
+        for mod in mods:
+            self.assertEqual(mod_objs[mod['name']]['description'], mod['description'])
+        self.assertEqual(self.adapter.requests['GET /api/search/modules/<module>'], 2)
+
+    def test_empty_bulk_response(self):
+        mods = self.latest(1)
+        alerts = []
+        self.adapter.empty = True
+        with self.assertLogs('search.views', 'WARNING'):
+            mod_objs = views.get_rev_org_objs([mod['name'] for mod in mods], alerts)
+        self.assertEqual(mod_objs[mods[0]['name']]['description'], mods[0]['description'])
+        self.assertEqual(self.adapter.requests['GET /api/search/modules/<module>'], 1)
+
+
+
+# name, organization, maturity level, compilation status, imported modules and module it belongs to
+GRAPH_MODULES = [
+    ('a-base', 'ietf', 'ratified', 'passed', [], None),
+    ('b-types', 'ietf', 'adopted', 'passed', ['a-base'], None),
+    ('c-if', 'ietf', 'initial', 'failed', ['a-base', 'b-types'], None),
+    ('c-if-sub', 'ietf', 'initial', 'passed', ['b-types'], 'c-if'),
+    ('d-oc', 'openconfig', 'N/A', 'passed', ['c-if', 'c-if-sub'], None),
+    ('e-vendor', 'cisco', 'N/A', 'passed', ['d-oc', 'c-if'], None),
+    ('f-loop', 'ietf', 'initial', 'passed', ['g-loop', 'e-vendor'], None),
+    ('g-loop', 'ietf', 'adopted', 'passed', ['f-loop'], None)
+]
+
+
+class GraphTestCase(CatalogTestCase):
+    """
+    Runs the views against a small catalog with submodules, loops and ratified modules.
+    """
+
+    @classmethod
+    def create_catalog(cls):
+        catalog = SyntheticCatalog(0)
+        for name, org, maturity, status, imports, belongs_to in GRAPH_MODULES:
+            catalog.modules.append({
+                'name': name, 'revision': '2020-01-01', 'organization': org, 'maturity-level': maturity,
+                'compilation-status': status, 'belongs-to': belongs_to,
+                'document-name': 'rfc-{}'.format(name) if maturity == 'ratified' else '', 'reference': '',
+                'dependencies': [{'name': dep} for dep in imports], 'dependents': []
+            })
+        for mod in catalog.modules:
+            for dep in mod['dependencies']:
+                dependent = next(m for m in catalog.modules if m['name'] == dep['name'])
+                dependent['dependents'].append({'name': mod['name']})
+        catalog.by_key = {(mod['name'], mod['revision'], mod['organization']): mod for mod in catalog.modules}
+        return catalog
+
+
+# graphs built by build_graph before the graph was expanded level by level, as
+# (target, recurse, show_rfcs, orgs, show_subm, show_dir) -> (nodes, edges, edge counts, orgs, maturities, alerts)
+OLD_GRAPHS = {
+    ('c-if', 1, True, (), True, 'both'): (
+        [('c-if', 'IETF', '#994F00', 'COMPILATION FAILED', 'N/A', False),
+         ('d-oc', 'OPENCONFIG', '#0C7BDC', 'N/A', 'N/A', False),
+         ('e-vendor', 'CISCO', '#FFC20A', 'N/A', 'N/A', False),
+         ('e-vendor', 'CISCO', '#FFC20A', 'N/A', 'N/A', False),
+         ('f-loop', 'IETF', '#994F00', 'INITIAL', 'N/A', False),
+         ('a-base', 'IETF', '#994F00', 'RATIFIED', 'rfc-a-base', False),
+         ('b-types', 'IETF', '#994F00', 'ADOPTED', 'N/A', False),
+         ('b-types', 'IETF', '#994F00', 'ADOPTED', 'N/A', False),
+         ('c-if-sub', 'IETF', '#994F00', 'INITIAL', 'N/A', True)],
+        [('c-if', 'd-oc', 'OPENCONFIG', '#0C7BDC', 'N/A'),
+         ('d-oc', 'e-vendor', 'CISCO', '#FFC20A', 'N/A'),
+         ('c-if', 'e-vendor', 'CISCO', '#FFC20A', 'N/A'),
+         ('e-vendor', 'f-loop', 'IETF', '#994F00', 'INITIAL'),
+         ('a-base', 'c-if', 'IETF', '#994F00', 'RATIFIED'),
+         ('a-base', 'b-types', 'IETF', '#994F00', 'ADOPTED'),
+         ('b-types', 'c-if', 'IETF', '#994F00', 'ADOPTED'),
+         ('b-types', 'c-if-sub', 'IETF', '#994F00', 'INITIAL')],
+        {'a-base': 0, 'b-types': 2, 'c-if': 2, 'c-if-sub': 1, 'd-oc': 0, 'e-vendor': 0},
+        ['cisco', 'ietf', 'openconfig'],
+        {'ADOPTED': ['b-types', 'b-types', 'b-types'],
+         'COMPILATION FAILED': ['c-if'],
+         'INITIAL': ['c-if-sub', 'f-loop', 'c-if-sub'],
+         'N/A': ['d-oc', 'd-oc', 'e-vendor', 'e-vendor', 'e-vendor'],
+         'RATIFIED': ['a-base', 'a-base']},
+        []),
+    ('b-types', -1, False, ('ietf',), False, 'dependents'): (
+        [('b-types', 'IETF', '#994F00', 'ADOPTED', 'N/A', False),
+         ('c-if', 'IETF', '#994F00', 'COMPILATION FAILED', 'N/A', False)],
+        [('b-types', 'c-if', 'IETF', '#994F00', 'COMPILATION FAILED')],
+        {'b-types': 1, 'c-if': 0},
+        ['ietf'],
+        {'ADOPTED': ['b-types'], 'COMPILATION FAILED': ['c-if', 'c-if'], 'N/A': ['d-oc', 'e-vendor']},
+        []),
+    ('f-loop', 2, True, (), True, 'dependencies'): (
+        [('f-loop', 'IETF', '#994F00', 'INITIAL', 'N/A', False),
+         ('g-loop', 'IETF', '#994F00', 'ADOPTED', 'N/A', False),
+         ('e-vendor', 'CISCO', '#0C7BDC', 'N/A', 'N/A', False),
+         ('d-oc', 'OPENCONFIG', '#FFC20A', 'N/A', 'N/A', False),
+         ('c-if', 'IETF', '#994F00', 'COMPILATION FAILED', 'N/A', False)],
+        [('g-loop', 'f-loop', 'IETF', '#994F00', 'ADOPTED'), ('e-vendor', 'f-loop', 'CISCO', '#0C7BDC', 'N/A')],
+        {'b-types': 1, 'c-if': 2, 'c-if-sub': 1, 'd-oc': 0, 'e-vendor': 0, 'f-loop': 1, 'g-loop': 1},
+        ['cisco', 'ietf', 'openconfig'],
+        {'ADOPTED': ['g-loop', 'g-loop', 'b-types'],
+         'COMPILATION FAILED': ['c-if', 'c-if', 'c-if'],
+         'INITIAL': ['f-loop', 'f-loop', 'c-if-sub'],
+         'N/A': ['e-vendor', 'e-vendor', 'd-oc', 'd-oc'],
+         'RATIFIED': ['a-base']},
+        ['Loop found {} <=> {}'])
+}
+
+
+class GraphBuilderTest(GraphTestCase):
+
+    def build(self, target, recurse, show_rfcs, orgs, show_subm, show_dir):
+        alerts = []
+        graph = views.GraphBuilder(list(orgs), alerts, show_rfcs, ['#FFC20A', '#0C7BDC', '#994F00'], recurse,
+                                   show_subm, show_dir)
+        mod_obj = views.get_rev_org_obj(target, alerts)
+        graph.expand([mod_obj])
+        graph.add_module(target, mod_obj)
+        nodes = [(node['data']['name'], node['data']['org'], node['data']['objColor'], node['data']['mat'],
+                  node['data']['document'], node['data']['sub_mod']) for node in graph.nodes]
+        edges = [(edge['data']['source'][len('mod_'):], edge['data']['target'][len('mod_'):], edge['data']['org'],
+                  edge['data']['objColor'], edge['data']['mat']) for edge in graph.edges]
+        return nodes, edges, graph.edge_counts, sorted(graph.found_orgs), graph.found_mats, alerts
+
+    def test_same_as_build_graph(self):
+        for args, expected in OLD_GRAPHS.items():
+            self.assertEqual(self.build(*args), expected, args)
+
+    def test_same_as_build_graph_with_snapshot(self):
+        views.DEPENDENCY_GRAPH.snapshot = load_dependency_graph(views.backend())
+        views.DEPENDENCY_GRAPH.snapshot_generation = views.index_generation()
+        views.DEPENDENCY_GRAPH.created = time.time()
+        for args, expected in OLD_GRAPHS.items():
+            self.assertEqual(self.build(*args), expected, args)
+        # only the targets are requested, all their neighbours come from the snapshot
+        self.assertEqual(self.adapter.requests['GET /api/search/modules/<module>'], len(OLD_GRAPHS))
+        self.assertEqual(self.adapter.requests['POST /api/search/modules'], 0)
+
+
+class DependencyGraphTest(SimpleTestCase):
+
+    def setUp(self):
+        self.graph = DependencyGraph.from_modules([
+            {'name': 'a', 'revision': '2018-01-01', 'organization': 'ietf', 'dependencies': [{'name': 'old'}]},
+            {'name': 'a', 'revision': '2019-01-01', 'organization': 'ietf', 'maturity-level': 'ratified',
+             'dependencies': [{'name': 'b'}, {'name': 'missing'}], 'document-name': 'rfc1'},
+            {'name': 'b', 'revision': '2019-01-01', 'dependents': [{'name': 'a'}], 'belongs-to': 'c'},
+            {'revision': '2019-01-01'}
+        ])
+
+    def test_latest_revision_and_referenced_modules(self):
+        self.assertEqual(len(self.graph), 3)
+        self.assertIn('a', self.graph)
+        self.assertNotIn('missing', self.graph)
+        self.assertEqual(self.graph.dependencies('a'), ['b', 'missing'])
+        self.assertEqual(self.graph.dependents('b'), ['a'])
+        self.assertEqual(self.graph.dependents('missing'), [])
+        self.assertIsNone(self.graph.module_object('missing'))
+
+    def test_module_object(self):
+        self.assertEqual(self.graph.module_object('a'), {
+            'name': 'a', 'revision': '2019-01-01', 'organization': 'ietf', 'maturity-level': 'ratified',
+            'compilation-status': None, 'belongs-to': None, 'document-name': 'rfc1', 'reference': None,
+            'dependents': [], 'dependencies': [{'name': 'b'}, {'name': 'missing'}], 'initialized': True
+        })
+        b = self.graph.module_object('b')
+        self.assertEqual((b['organization'], b['belongs-to']), ('independent', 'c'))
+
+
+class CircuitBreakerTest(SimpleTestCase):
+
+    def test_opens_and_closes(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        breaker.failure()
+        self.assertTrue(breaker.allow())
+        with self.assertLogs('search.backend', 'ERROR'):
+            breaker.failure()
+        self.assertTrue(breaker.is_open)
+        self.assertFalse(breaker.allow())
+        time.sleep(0.1)
+        # half open, a single trial call is let through
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.failure()
+        self.assertFalse(breaker.allow())
+        time.sleep(0.1)
+        self.assertTrue(breaker.allow())
+        breaker.success()
+        self.assertFalse(breaker.is_open)
+        self.assertTrue(breaker.allow())
+
+
+class BackendClientTest(SimpleTestCase):
+
+    def setUp(self):
+        self.statuses = []
+        self.requests = []
+        test = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                test.requests.append(self.path)
+                self.send_response(test.statuses.pop(0) if test.statuses else 200)
+                self.send_header('Content-Length', '2')
+                self.end_headers()
+                self.wfile.write(b'{}')
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.client = BackendClient('http://127.0.0.1:{}'.format(server.server_port), timeout=5, retries=2,
+                                    failure_threshold=2, reset_timeout=3600)
+
+    def test_retries_unavailable_api(self):
+        self.statuses = [503]
+        response = self.client.get('/api/modules', endpoint='modules')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.requests, ['/api/modules', '/api/modules'])
+        self.assertEqual(self.client.stats()['modules']['count'], 1)
+        self.assertEqual(self.client.stats()['modules']['errors'], 0)
+
+    def test_circuit_opens_after_failures(self):
+        self.statuses = [500, 500]
+        self.assertEqual(self.client.get('/api/a').status_code, 500)
+        with self.assertLogs('search.backend', 'ERROR'):
+            self.assertEqual(self.client.get('/api/a').status_code, 500)
+        with self.assertRaises(BackendUnavailable):
+            self.client.get('/api/a')
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(self.client.stats()['/api/a']['errors'], 3)
+
+
+def search_result(name, node_name, revision='2020-01-01', organization='ietf', description=''):
+    return {
+        'module': {'name': name, 'revision': revision, 'organization': organization, 'maturity-level': 'ratified',
+                   'compilation-status': 'passed', 'dependents': [{'name': 'x'}]},
+        'node': {'type': 'leaf', 'path': '/{}:{}'.format(name, node_name), 'name': node_name,
+                 'description': description}
+    }
+
+
+class SearchRowsTest(SimpleTestCase):
+
+    def test_duplicates_removed_in_backend_order(self):
+        results = [search_result('b', 'x'), search_result('a', 'x'), search_result('b', 'x', description='other'),
+                   search_result('b', 'y'), {'module': {'error': 'failed'}}, {'node': {}}, search_result('a', 'x')]
+        rows = list(views.search_rows(results, ['Name', 'Module', 'Path']))
+        self.assertEqual([(row['name'], row['node_name']) for row in rows], [('b', 'x'), ('a', 'x'), ('b', 'y')])
+        rows = list(views.search_rows(results, ['Name', 'Module', 'Path', 'Description']))
+        self.assertEqual([(row['name'], row['node_name'], row['description']) for row in rows],
+                         [('b', 'x', ''), ('a', 'x', ''), ('b', 'x', 'other'), ('b', 'y', '')])
+
+    def test_selected_columns(self):
+        row = next(views.search_rows([search_result('a', 'x', organization='cisco')],
+                                     ['Organization', 'Origin', 'Imported By # Modules']))
+        self.assertEqual(row, {'mod_sig': 'a@2020-01-01/cisco', 'organization': 'cisco', 'origin': 'Vendor-Specific',
+                               'dependents': 1})
+
+    def test_number_of_rows_is_limited(self):
+        results = (search_result('a', 'n{}'.format(i)) for i in range(views.MAX_SEARCH_RESULTS + 10))
+        self.assertEqual(len(list(views.search_rows(results, ['Name']))), views.MAX_SEARCH_RESULTS)
+
+
+class IndexSearchTest(CatalogTestCase):
+
+    def search(self):
+        term = self.latest(1)[0]['name']
+        response = self.client.get('/yang-search/', {'search_string': term})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return term, b''.join(response.streaming_content).decode('utf-8')
+
+    def test_rows_are_streamed(self):
+        term, page = self.search()
+        self.assertIn('show_node/{}/'.format(term), page)
+        self.assertNotIn(views.SEARCH_RESULTS_PLACEHOLDER, page)
+        self.assertTrue(page.rstrip().endswith('</html>'))
+
+    def test_failing_results_complete_the_page(self):
+        def failing_rows(results, headers):
+            yield next(rows(results, headers))
+            raise ValueError('connection lost')
+
+        rows = views.search_rows
+        with mock.patch.object(views, 'search_rows', failing_rows), self.assertLogs('search.views', 'ERROR'):
+            term, page = self.search()
+        self.assertEqual(page.count('show_node/{}/'.format(term)), 1)
+        self.assertIn('Failed to get all the search results, connection lost', page)
+        self.assertTrue(page.rstrip().endswith('</html>'))
+        # rows of a failed search are not cached
+        self.assertEqual(len(views.SEARCH_CACHE), 0)
+
+
+class SearchCacheKeyTest(SimpleTestCase):
+
+    def test_equivalent_searches_share_key(self):
+        search = {'search': 'ip', 'search-fields': ['module', 'argument'], 'schema-types': ['leaf', 'list'],
+                  'yang-versions': ['1.1', '1.0'], 'headers': ['Name', 'Module'], 'case-sensitive': False}
+        reordered = dict(reversed(list(search.items())))
+        reordered.update({'search-fields': ['argument', 'module'], 'schema-types': ['list', 'leaf'],
+                          'yang-versions': ['1.0', '1.1']})
+        self.assertEqual(views.search_cache_key(search), views.search_cache_key(reordered))
+        self.assertEqual(search['search-fields'], ['module', 'argument'])
+
+    def test_different_searches_have_different_keys(self):
+        search = {'search': 'ip', 'headers': ['Name', 'Module'], 'case-sensitive': False}
+        for change in [{'search': 'IP'}, {'headers': ['Module', 'Name']}, {'case-sensitive': True},
+                       {'schema-types': ['leaf']}]:
+            changed = dict(search, **change)
+            self.assertNotEqual(views.search_cache_key(search), views.search_cache_key(changed), change)
+
+
+class SnapshotHolderTest(SimpleTestCase):
+
+    def wait_for(self, holder, expected):
+        deadline = time.time() + 5
+        while holder.get() != expected and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(holder.get(), expected)
+
+    def test_loads_in_background_and_reloads(self):
+        loads = []
+        generation = [1]
+
+        def loader():
+            loads.append(generation[0])
+            return [len(loads)]
+
+        holder = SnapshotHolder(loader, name='test', generation=lambda: generation[0])
+        self.assertIsNone(holder.get())
+        self.wait_for(holder, [1])
+        generation[0] = 2
+        self.wait_for(holder, [2])
+        holder.invalidate()
+        self.wait_for(holder, [3])
+        self.assertEqual(loads, [1, 2, 2])
+
+    def test_failed_load_is_retried_later(self):
+        calls = []
+
+        def loader():
+            calls.append(None)
+            raise ValueError('failed')
+
+        holder = SnapshotHolder(loader, retry_after=3600, name='test')
+        with self.assertLogs('search.cache', 'ERROR'):
+            holder.get()
+            deadline = time.time() + 5
+            while (holder.failed == 0 or holder._loading) and time.time() < deadline:
+                time.sleep(0.01)
+        self.assertIsNone(holder.get())
+        self.assertEqual(len(calls), 1)
+
+
+class CompletionIndexTest(SimpleTestCase):
+
+    def setUp(self):
+        self.index = CompletionIndex({'ietf-interfaces': 10, 'ietf-ip': 20, 'IETF-routing': 5, 'iana-if-type': 30,
+                                      'openconfig-interfaces': 40, 'cisco-ip': 1})
+
+    def test_values_starting_with_pattern_come_first(self):
+        self.assertEqual(self.index.lookup('ietf'), ['ietf-ip', 'ietf-interfaces', 'IETF-routing'])
+        self.assertEqual(self.index.lookup('Interf'), ['openconfig-interfaces', 'ietf-interfaces'])
+        self.assertEqual(self.index.lookup('i'), ['iana-if-type', 'ietf-ip', 'ietf-interfaces', 'IETF-routing',
+                                                  'openconfig-interfaces', 'cisco-ip'])
+        self.assertEqual(self.index.lookup('-ip'), ['ietf-ip', 'cisco-ip'])
+
+    def test_limit(self):
+        self.assertEqual(self.index.lookup('i', limit=2), ['iana-if-type', 'ietf-ip'])
+        self.assertEqual(self.index.lookup('ip', limit=1), ['ietf-ip'])
+        self.assertEqual(self.index.lookup('missing'), [])
+        self.assertEqual(self.index.lookup('ietf-interfaces-'), [])
+
+    def test_load_pages_through_values(self):
+        class Elasticsearch(object):
+            def __init__(self):
+                self.pages = [{'aggregations': {'values': {'buckets': [{'key': {'value': 'a'}, 'doc_count': 1},
+                                                                       {'key': {'value': 'b'}, 'doc_count': 2}],
+                                                           'after_key': {'value': 'b'}}}},
+                              {'aggregations': {'values': {'buckets': [{'key': {'value': 'c'}, 'doc_count': 3}]}}}]
+
+            def search(self, **kwargs):
+                return self.pages.pop(0)
+
+        index = load_completion_index(Elasticsearch(), 'module.keyword', page_size=2)
+        self.assertEqual(index.counts, {'a': 1, 'b': 2, 'c': 3})
+
+
+class ModuleDetailsTest(CatalogTestCase):
+
+    def get(self):
+        mod = self.latest(1)[0]
+        response = self.client.get('/yang-search/module_details/{}'.format(mod['name']))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, mod['description'])
+        return response
+
+    def test_help_texts(self):
+        self.assertContains(self.get(), 'Help text of description.')
+
+    def test_failing_help_texts(self):
+        with mock.patch.object(views, 'get_help_texts', side_effect=ValueError('index missing')), \
+                self.assertLogs('search.views', 'ERROR'):
+            response = self.get()
+        self.assertContains(response, 'Failed to get help texts, index missing')
+        self.assertNotContains(response, 'Help text of description.')
+
+    def test_unknown_yang_catalog_revision(self):
+        get_rev_org = views.get_rev_org
+
+        def rev_org(mod, depth=1, alerts=[]):
+            return None if mod == 'yang-catalog' else get_rev_org(mod, depth, alerts)
+
+        with mock.patch.object(views, 'get_rev_org', rev_org):
+            response = self.get()
+        self.assertContains(response, 'Help texts could not be loaded, revision of yang-catalog not found')
+
+    def test_help_texts_out_of_time(self):
+        loaded = threading.Event()
+        self.addCleanup(loaded.set)
+        get_help_texts = views.get_help_texts
+
+        def slow_help_texts(revision):
+            loaded.wait(5)
+            return get_help_texts(revision)
+
+        with mock.patch.object(views, 'get_help_texts', slow_help_texts), \
+                mock.patch.object(views, 'MODULE_DETAILS_BUDGET', 0.5):
+            response = self.get()
+        self.assertContains(response, 'Help texts could not be loaded in time')
+
+
+class ConditionalPageTest(CatalogTestCase):
+
+    def test_not_modified(self):
+        views.get_generation().bump()
+        url = '/yang-search/module_details/{}'.format(self.latest(1)[0]['name'])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        self.adapter.requests.clear()
+        self.es.requests.clear()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(sum(self.adapter.requests.values()), 0)
+        self.assertEqual(sum(self.es.requests.values()), 0)
+
+        # pages of another search or of a newer index are sent in full
+        self.assertEqual(self.client.get(url + '?x=1', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        views.get_generation().bump()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_no_etag_without_generation(self):
+        url = '/yang-search/module_details/{}'.format(self.latest(1)[0]['name'])
+        with mock.patch.object(views, 'index_generation', return_value=None):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+
+class IndexGenerationTest(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_bump_is_seen_by_other_instances(self):
+        path = os.path.join(self.directory, 'generation')
+        reader = IndexGeneration(path)
+        writer = IndexGeneration(path)
+        self.addCleanup(reader.close)
+        self.addCleanup(writer.close)
+        self.assertEqual(reader.read(), (0, 0))
+        self.assertEqual(writer.bump(), 1)
+        generation, changed = reader.read()
+        self.assertEqual(generation, 1)
+        self.assertAlmostEqual(changed, time.time(), delta=60)
+
+    def test_unknown_generation(self):
+        path = os.path.join(self.directory, 'missing', 'generation')
+        generation = IndexGeneration(path)
+        self.addCleanup(generation.close)
+        with self.assertLogs('search.generation', 'ERROR'):
+            self.assertIsNone(generation.read())
+        self.assertIsNone(generation.current())
+        with self.assertRaises(OSError):
+            generation.bump()
+        os.mkdir(os.path.dirname(path))
+        self.assertIsNone(generation.current())
+        generation.RETRY_AFTER = 0
+        self.assertEqual(generation.current(), 0)
+
+    def test_bump_generation(self):
+        class Indices(object):
+            refreshed = []
+
+            def refresh(self, index):
+                self.refreshed.append(index)
+
+        class Elasticsearch(object):
+            indices = Indices()
+
+        generation = IndexGeneration(os.path.join(self.directory, 'generation'))
+        self.addCleanup(generation.close)
+        bump_generation(Elasticsearch(), generation)
+        self.assertEqual(Indices.refreshed, ['yindex,modules'])
+        self.assertEqual(generation.current(), 1)
+        with self.assertLogs('search.generation', 'ERROR'):
+            bump_generation(None, generation)
+        self.assertEqual(generation.current(), 1)
+
+
+class ChangeJournalTest(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.journal = ChangeJournal(os.path.join(directory.name, 'journal.jsonl'))
+
+    def test_consume_compacts_updates(self):
+        self.assertFalse(self.journal)
+        self.assertEqual(self.journal.consume(), ({}, []))
+        self.assertFalse(self.journal.append({}, []))
+        self.assertTrue(self.journal.append({'a/org': 'a.yang'}, ['b@2019-01-01/org']))
+        self.assertTrue(self.journal.append({'a/org': 'new/a.yang', 'c/org': 'c.yang'},
+                                            ['b@2019-01-01/org', 'd@2019-01-01/org']))
+        self.assertTrue(self.journal)
+        changes, deletes = self.journal.consume()
+        self.assertEqual(changes, {'a/org': 'new/a.yang', 'c/org': 'c.yang'})
+        self.assertEqual(deletes, ['b@2019-01-01/org', 'd@2019-01-01/org'])
+        self.assertEqual(os.path.getsize(self.journal.path), 0)
+        self.journal.commit()
+        self.assertFalse(self.journal)
+        self.assertTrue(os.path.getsize('{}.bak'.format(self.journal.path)) > 0)
+        self.assertEqual(self.journal.consume(), ({}, []))
+
+    def test_updates_of_failed_run_are_consumed_again(self):
+        self.journal.append({'a/org': 'a.yang'}, ['b@2019-01-01/org'])
+        self.assertEqual(self.journal.consume(), ({'a/org': 'a.yang'}, ['b@2019-01-01/org']))
+        # the run failed before its commit while another update was appended
+        self.journal.append({'a/org': 'new/a.yang', 'c/org': 'c.yang'}, [])
+        self.assertTrue(self.journal)
+        self.assertEqual(self.journal.consume(),
+                         ({'a/org': 'new/a.yang', 'c/org': 'c.yang'}, ['b@2019-01-01/org']))
+        self.journal.commit()
+        self.assertFalse(self.journal)
+        self.assertEqual(self.journal.consume(), ({}, []))
+
+    def test_broken_line_is_skipped(self):
+        self.journal.append({'a/org': 'a.yang'}, [])
+        with open(self.journal.path, 'a') as f:
+            f.write('{"modules-to-index": {"b/o\n')
+        self.journal.append({'c/org': 'c.yang'}, [])
+        self.assertEqual(self.journal.consume(), ({'a/org': 'a.yang', 'c/org': 'c.yang'}, []))
+
+
+class MetadataUpdateTest(CatalogTestCase):
+
+    def setUp(self):
+        super(MetadataUpdateTest, self).setUp()
+        # metadata_update reads the configuration file on every request
+        patcher = mock.patch.object(connections, 'load_config', return_value=self.config)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, body, secret='test'):
+        body = json.dumps(body)
+        return self.client.post('/yang-search/metadata_update', body, content_type='application/json',
+                                HTTP_X_YC_SIGNATURE='sha1={}'.format(views.create_signature(secret, body)))
+
+    def test_update_is_journaled(self):
+        journal = ChangeJournal(journal_path(self.config.get('Directory-Section', 'changes-cache')))
+        self.addCleanup(journal.commit)
+        mod = self.latest(1)[0]
+        views.get_rev_org(mod['name'], 1, [])
+        self.assertEqual(len(views.REV_ORG_CACHE), 1)
+
+        response = self.post({'modules-to-index': {'a/org': 'a.yang'}, 'modules-to-delete': ['b@2019-01-01/org']})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(views.REV_ORG_CACHE), 0)
+        self.assertEqual(self.post({'modules-to-index': {'a/org': 'new/a.yang'}}).status_code, 201)
+        self.assertEqual(journal.consume(), ({'a/org': 'new/a.yang'}, ['b@2019-01-01/org']))
+
+    def test_invalid_signature(self):
+        journal = ChangeJournal(journal_path(self.config.get('Directory-Section', 'changes-cache')))
+        response = self.post({'modules-to-index': {'a/org': 'a.yang'}}, secret='wrong')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(journal)
+
+
+class TimingMiddlewareTest(CatalogTestCase):
+
+    def test_server_timing(self):
+        with mock.patch.object(timing.metrics, 'observe_view') as observe_view:
+            response = self.client.get('/yang-search/module_details/{}'.format(self.latest(1)[0]['name']))
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'^(es|backend);dur=[0-9.]+;desc="[0-9]+ calls", .*'
+                                                    r'render;dur=[0-9.]+;desc="1 calls", total;dur=[0-9.]+$')
+        observe_view.assert_called_once_with('module_details', mock.ANY)
+
+    def test_streaming_body_is_measured(self):
+        def slow_rows(results, headers):
+            for row in rows(results, headers):
+                time.sleep(0.05)
+                yield row
+
+        rows = views.search_rows
+        with mock.patch.object(views, 'search_rows', slow_rows), \
+                mock.patch.object(timing.metrics, 'observe_view') as observe_view:
+            response = self.client.get('/yang-search/', {'search_string': self.latest(1)[0]['name']})
+            self.assertTrue(response.streaming)
+            self.assertNotIn('Server-Timing', response)
+            observe_view.assert_not_called()
+            b''.join(response.streaming_content)
+        observe_view.assert_called_once_with('index', mock.ANY)
+        self.assertGreaterEqual(observe_view.call_args[0][1], 0.05)
+
+
+class MetricsViewTest(SimpleTestCase):
+
+    def test_metrics(self):
+        response = self.client.get('/yang-search/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'search_view_duration_seconds')
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'])
+    def test_not_allowed(self):
+        with self.assertLogs('search.views', 'WARNING'):
+            response = self.client.get('/yang-search/metrics')
+        self.assertEqual(response.status_code, 404)
+        self.assertNotContains(response, 'search_view_duration_seconds', status_code=404)
+        self.assertEqual(self.client.get('/yang-search/metrics', REMOTE_ADDR='10.0.0.1').status_code, 200)
+
+
+class PercentileTest(SimpleTestCase):
+
+    def test_nearest_rank(self):
+        self.assertEqual(percentile([], 0.5), 0.0)
+        self.assertEqual(percentile([3.0], 0.99), 3.0)
+        values = [float(i) for i in range(1, 101)]
+        self.assertEqual(percentile(values, 0.5), 51.0)
+        self.assertEqual(percentile(values, 0.95), 95.0)
+        self.assertEqual(percentile(values, 1.0), 100.0)
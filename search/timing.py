@@ -0,0 +1,192 @@
+# Copyright The IETF Trust 2019, All Rights Reserved
+# Copyright 2018 Cisco and its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Per request timing of elasticsearch queries, backend api calls and template
+rendering. The timer of the current request is kept in a context variable, work
+submitted to the thread pools of the views is run with the timer of the request
+which submitted it. Totals are sent to the client in a Server-Timing header and
+written to a structured log line by TimingMiddleware. Every call and request is
+recorded to the prometheus metrics of the process as well.
+
+Durations of calls run in parallel are summed, so a total may be longer than
+the request itself.
+"""
+
+import contextvars
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('request_timer', default=None)
+
+
+class RequestTimer(object):
+    """
+    Number of calls and their total duration for every measured kind of work.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.metrics = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, name, duration):
+        """
+        :param name: kind of work, es, backend or render
+        :param duration: duration of the call in seconds
+        """
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = [0, 0.0]
+            metric[0] += 1
+            metric[1] += duration
+
+    def elapsed(self):
+        """
+        :return: seconds since the timer was created
+        """
+        return time.perf_counter() - self.start
+
+    def header(self):
+        """
+        :return: value of the Server-Timing header, durations in milliseconds
+        """
+        with self._lock:
+            parts = ['{};dur={:.1f};desc="{} calls"'.format(name, total * 1000, count)
+                     for name, (count, total) in self.metrics.items()]
+        parts.append('total;dur={:.1f}'.format(self.elapsed() * 1000))
+        return ', '.join(parts)
+
+    def as_dict(self):
+        """
+        :return: (dict) name -> count and total duration in milliseconds
+        """
+        with self._lock:
+            return OrderedDict((name, {'count': count, 'ms': round(total * 1000, 1)})
+                               for name, (count, total) in self.metrics.items())
+
+
+def current():
+    """
+    :return: RequestTimer of the current request or None outside of a request
+    """
+    return _current.get()
+
+
+@contextmanager
+def measure(name):
+    """
+    Records duration of the block to the metrics of the process and to the timer
+    of the current request if there is one.
+    :param name: kind of work, es, backend or render
+    """
+    timer = _current.get()
+    start = time.perf_counter()
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        duration = time.perf_counter() - start
+        metrics.observe_call(name, duration, failed)
+        if timer is not None:
+            timer.record(name, duration)
+
+
+def propagate(fn):
+    """
+    :param fn: function to be run by a thread pool
+    :return: function running fn with the timer of the current request, calls it makes
+             are counted to the request which created it
+    """
+    timer = _current.get()
+
+    def run(*args, **kwargs):
+        token = _current.set(timer)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return run
+
+
+class TimingMiddleware(object):
+    """
+    Measures every request, adds Server-Timing header to its response and logs
+    its timings as a single json line. Body of a streaming response is measured
+    while it is sent, its headers are sent before the body is generated, so it
+    gets no Server-Timing header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = RequestTimer()
+        token = _current.set(timer)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        if response.streaming:
+            response.streaming_content = self.stream(request, response, timer, response.streaming_content)
+        else:
+            response['Server-Timing'] = timer.header()
+            self.finish(request, response, timer)
+        return response
+
+    def stream(self, request, response, timer, content):
+        """
+        Yields the body of a streaming response generated with the timer of the request
+        and records the request once the body was sent or the client went away.
+        :param request: Array with arguments from rest request.
+        :param response: StreamingHttpResponse
+        :param timer: RequestTimer of the request
+        :param content: body of the response as returned by the view
+        """
+        content = iter(content)
+        try:
+            while True:
+                token = _current.set(timer)
+                try:
+                    chunk = next(content)
+                except StopIteration:
+                    break
+                finally:
+                    _current.reset(token)
+                yield chunk
+        finally:
+            self.finish(request, response, timer)
+
+    def finish(self, request, response, timer):
+        view = getattr(request.resolver_match, 'url_name', None)
+        metrics.observe_view(view, timer.elapsed())
+        logger.info(json.dumps(OrderedDict([
+            ('method', request.method),
+            ('path', request.path),
+            ('view', view),
+            ('status', response.status_code),
+            ('ms', round(timer.elapsed() * 1000, 1)),
+            ('timings', timer.as_dict())
+        ])))
@@ -31,6 +31,8 @@ urlpatterns = [
     path(r'module_details/completions/<type>/<pattern>', view= views.completions, name='completions'),
     path(r'metadata_update', csrf_exempt(views.metadata_update), name='metadata_update'),
     path(r'module_details/<module>', views.module_details, name='module_details'),
+    path(r'yang_tree/data/<module>', views.yang_tree_data, name='yang_tree_data'),
+    path(r'yang_tree/children/<module>/<node_id>', views.yang_tree_children, name='yang_tree_children'),
     path(r'yang_tree/<module>', views.yang_tree, name='yang_tree'),
     path(r'impact_analysis/<module>', views.impact_analysis, name='impact_analysis'),
     path(r'yangsuite/<module>', views.yangsuite, name='yangsuite'),
@@ -38,5 +40,6 @@ urlpatterns = [
     path(r'yang_tree/', views.yang_tree, name='yang_tree'),
     path(r'impact_analysis/', views.impact_analysis, name='impact_analysis'),
     path(r'impact_analysis_php/', views.impact_analysis_php, name='impact_analysis_php'), # This one is to maintain URL compatibility from previous links of IETF datatracker
-    path(r'ping', csrf_exempt(views.ping), name='ping')
+    path(r'ping', csrf_exempt(views.ping), name='ping'),
+    path(r'metrics', views.metrics_view, name='metrics')
 ]
@@ -17,21 +17,39 @@
 
 from urllib.parse import urlencode
 
+from django.conf import settings
 from django.shortcuts import render
 from django.core.serializers.json import DjangoJSONEncoder
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template import loader
+from django.utils.cache import add_never_cache_headers
+from django.views.decorators.http import condition
 from django.shortcuts import redirect
 from Crypto.Hash import SHA, HMAC
 import configparser
+import copy
+import datetime
+import gzip
+import hashlib
 import math
-import requests
 import logging
 import json
 import os
 import time
 import re
-
-from elasticsearch import Elasticsearch
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+
+from .backend import BackendUnavailable, get_client
+from .cache import LRUCache, SharedCache, SnapshotHolder, TieredCache
+from .completion import load_completion_index
+from .connections import get_api_prefix, get_config, get_es
+from .depgraph import load_dependency_graph
+from .generation import IndexGeneration, generation_path
+from .journal import ChangeJournal, journal_path
+from .templatetags.search_extras import iter_search_results, search_error_row
+from . import connections, metrics, queries, timing, ytree
 
 __module = [
     'name', 'revision', 'organization', 'ietf', 'namespace', 'schema', 'generated-from', 'maturity-level',
@@ -59,10 +77,7 @@ MATURITY_MAP = {
     'COMPILATION FAILED': '#ff0000',
 }
 
-ORG_CACHE = dict()
 NUM_STEPS = -1
-CUR_STEP = 1
-seen_modules = dict()
 
 SDOS = [
     'ietf',
@@ -72,36 +87,78 @@ SDOS = [
     'mef'
 ]
 
-found_orgs = dict()
-found_mats = dict()
+GRAPH_WORKERS = 8
+GRAPH_BATCH_SIZE = 100
+graph_executor = None
+DETAILS_WORKERS = 6
+# number of seconds module_details waits for all its calls together
+MODULE_DETAILS_BUDGET = 30
+details_executor = None
+
+# index generation counter shared with the indexer, opened lazily
+generation_counter = None
+# SQLite database of the caches shared by all the workers, stored in the temp directory
+SHARED_CACHE_FILE = 'search-cache.sqlite'
+# caches below are bound to the index generation and emptied as soon as it changes
+# number of seconds after which a revision and organization is looked up again, metadata
+# of the backend may change without the indexer increasing the generation
+REV_ORG_TTL = 600
+# (module[@revision], depth) -> {'org': ..., 'rev': ...}
+REV_ORG_CACHE = TieredCache(LRUCache(maxsize=4096, ttl=REV_ORG_TTL, name='rev-org',
+                                     generation=lambda: index_generation()),
+                            SharedCache(lambda: shared_cache_path(), maxsize=50000, name='rev-org',
+                                        generation=lambda: index_generation(), ttl=REV_ORG_TTL))
+# name@revision/organization -> metadata of the module fetched from the api, never handed out
+# to callers, module_from_cache() returns a copy
+MODULE_CACHE = TieredCache(LRUCache(maxsize=2048, name='modules', generation=lambda: index_generation()),
+                           SharedCache(lambda: shared_cache_path(), maxsize=50000, name='modules',
+                                       generation=lambda: index_generation()))
+# yang-catalog revision -> help texts of module details keys
+HELP_TEXT_CACHE = LRUCache(maxsize=4, name='help-text', generation=lambda: index_generation())
+# maximal number of rows shown on the search page
+MAX_SEARCH_RESULTS = 10000
+# rows of the search results table sent to the client at once
+SEARCH_RESULTS_CHUNK = 100
+SEARCH_RESULTS_PLACEHOLDER = '<!-- search results -->'
+# maximal number of rows held by SEARCH_CACHE in total, a search with MAX_SEARCH_RESULTS rows takes a fifth of it
+SEARCH_CACHE_ROWS = 5 * MAX_SEARCH_RESULTS
+# sha256 of normalized search -> alerts and rows of the search results
+SEARCH_CACHE = LRUCache(maxsize=256, name='search', generation=lambda: index_generation(),
+                        weight=lambda entry: len(entry[1]), maxweight=SEARCH_CACHE_ROWS,
+                        max_entry_weight=MAX_SEARCH_RESULTS)
+# (json-ytree file path, mtime and size of the file) -> jsTree data, so a file rewritten by the
+# indexer is picked up automatically. Both tiers
+# are bounded by size, trees larger than TREE_CACHE_MAX_ENTRY_BYTES are not cached at all
+TREE_CACHE_LOCAL_BYTES = 64 * 1024 * 1024
+TREE_CACHE_SHARED_BYTES = 512 * 1024 * 1024
+TREE_CACHE_MAX_ENTRY_BYTES = 16 * 1024 * 1024
+TREE_CACHE = TieredCache(LRUCache(maxsize=64, name='ytree', weight=lambda tree: tree_entry_size(tree),
+                                  maxweight=TREE_CACHE_LOCAL_BYTES, max_entry_weight=TREE_CACHE_MAX_ENTRY_BYTES),
+                         SharedCache(lambda: shared_cache_path(), maxsize=512, name='ytree',
+                                     maxbytes=TREE_CACHE_SHARED_BYTES, max_entry_bytes=TREE_CACHE_MAX_ENTRY_BYTES))
+# number of yang tree levels sent with the page, deeper nodes are loaded when opened
+YANG_TREE_INLINE_DEPTH = 2
+# TREE_CACHE key -> gzipped whole jsTree data, built only for the trees expanded as a whole
+TREE_DATA_CACHE = LRUCache(maxsize=64, name='ytree-data', weight=len, maxweight=32 * 1024 * 1024,
+                           max_entry_weight=8 * 1024 * 1024)
+# snapshot of the whole catalog dependency graph used by impact_analysis
+DEPENDENCY_GRAPH = SnapshotHolder(lambda: load_dependency_graph(backend()), max_age=3600, name='dependency-graph',
+                                  generation=lambda: index_generation())
+# all module names and organizations used to answer completions without elasticsearch
+COMPLETION_INDEXES = {
+    'module': SnapshotHolder(lambda: load_completion_index(get_es(), 'module.keyword'), max_age=3600,
+                             name='module-completions', generation=lambda: index_generation()),
+    'org': SnapshotHolder(lambda: load_completion_index(get_es(), 'organization.keyword'), max_age=3600,
+                          name='org-completions', generation=lambda: index_generation())
+}
 
 logger = logging.getLogger(__name__)
-config_path = '/etc/yangcatalog/yangcatalog.conf'
-config = configparser.ConfigParser()
-config._interpolation = configparser.ExtendedInterpolation()
-config.read(config_path)
-es_host = config.get('DB-Section', 'es-host')
-es_port = config.get('DB-Section', 'es-port')
-es_aws = config.get('DB-Section', 'es-aws')
-elk_credentials = config.get('Secrets-Section', 'elk-secret').strip('"').split(' ')
-if es_aws == 'True':
-    es = Elasticsearch([es_host], http_auth=(elk_credentials[0], elk_credentials[1]), scheme="https", port=443)
-else:
-    es = Elasticsearch([{'host': '{}'.format(es_host), 'port': es_port}])
-initialize_body_yindex = json.load(open('search/templates/json/initialize_yindex_elasticsearch.json', 'r'))
-initialize_body_modules = json.load(open('search/templates/json/initialize_module_elasticsearch.json', 'r'))
-es.indices.create(index='yindex', body=initialize_body_yindex, ignore=400)
-es.indices.create(index='modules', body=initialize_body_modules, ignore=400)
 logging.getLogger('elasticsearch').setLevel(logging.ERROR)
-api_prefix = config.get('Web-Section', 'my-uri')
 
 
 def reload_config(request):
     logger.info('Reloading config')
-    config_path = '/etc/yangcatalog/yangcatalog.conf'
-    config = configparser.ConfigParser()
-    config._interpolation = configparser.ExtendedInterpolation()
-    config.read(config_path)
+    config = connections.load_config()
     update_signature = config.get('Secrets-Section', 'update-signature')
     body_unicode = request.body.decode('utf-8')
     signature = create_signature(update_signature, body_unicode)
@@ -114,31 +171,12 @@ def reload_config(request):
         return HttpResponse(json.dumps({'error': 'Invalid message signature'}, cls=DjangoJSONEncoder),
                             content_type="application/json", status=404)
 
-    config = configparser.ConfigParser()
-    config._interpolation = configparser.ExtendedInterpolation()
-    config.read(config_path)
-    global es_host
-    es_host = config.get('DB-Section', 'es-host')
-    global es_port
-    es_port = config.get('DB-Section', 'es-port')
-    global es_aws
-    global elk_credentials
-    es_aws = config.get('DB-Section', 'es-aws')
-    elk_credentials = config.get('Secrets-Section', 'elk-secret').strip('"').split(' ')
-    global es
-    if es_aws == 'True':
-        es = Elasticsearch([es_host], http_auth=(elk_credentials[0], elk_credentials[1]), scheme="https", port=443)
-    else:
-        es = Elasticsearch([{'host': '{}'.format(es_host), 'port': es_port}])
-    global initialize_body_yindex
-    initialize_body_yindex = json.load(open('search/templates/json/initialize_yindex_elasticsearch.json', 'r'))
-    global initialize_body_modules
-    initialize_body_modules = json.load(open('search/templates/json/initialize_module_elasticsearch.json', 'r'))
-    es.indices.create(index='yindex', body=initialize_body_yindex, ignore=400)
-    es.indices.create(index='modules', body=initialize_body_modules, ignore=400)
-    logging.getLogger('elasticsearch').setLevel(logging.ERROR)
-    global api_prefix
-    api_prefix = config.get('Web-Section', 'my-uri')
+    clear_caches()
+    global generation_counter
+    if generation_counter is not None:
+        generation_counter.close()
+        generation_counter = None
+    connections.reload()
     logger.info('Config reloaded')
     return HttpResponse(json.dumps({'info': 'Search updated succesfully'}, cls=DjangoJSONEncoder),
                         content_type="application/json", status=201)
@@ -251,10 +289,113 @@ def index(request):
     context.update({'search_term': search_term, 'search_fields': search_fields,
                     'yang_versions': yang_versions, 'schema_types': schema_types, 'alerts': alerts,
                     'search_columns': search_columns, 'search_columns_show': search_columns_show})
-    context['results'] = output
-    return render(request, 'search/index.html', context)
+    context['results_placeholder'] = SEARCH_RESULTS_PLACEHOLDER
+    with timing.measure('render'):
+        page = loader.render_to_string('search/index.html', context, request)
+    # the results table and its placeholder are in the page only when something was searched for
+    if not search_term or SEARCH_RESULTS_PLACEHOLDER not in page:
+        return HttpResponse(page)
+    head, tail = page.split(SEARCH_RESULTS_PLACEHOLDER, 1)
+    return StreamingHttpResponse(stream_search_page(head, output, search_columns, tail))
 
 
+def stream_search_page(head, results, search_columns, tail):
+    """
+    Generates the search page with rows of the results table rendered while they are
+    being sent, so the whole table is never held in memory. When the results fail
+    the table ends with an error row and the page is still completed.
+    :param head: rendered page up to the rows of the results table
+    :param results: iterable of search results
+    :param search_columns: selected columns
+    :param tail: rendered rest of the page
+    :return: generator of html chunks
+    """
+    yield head
+    rows = []
+    try:
+        for row in iter_search_results(results, search_columns):
+            rows.append(row)
+            if len(rows) == SEARCH_RESULTS_CHUNK:
+                yield ''.join(rows)
+                rows = []
+    except Exception as e:
+        # status and head of the page are sent already, the error can only be shown in the table
+        logger.exception('Failed to generate search results')
+        rows.append(search_error_row('Failed to get all the search results, {}'.format(e), search_columns))
+    rows.append(tail)
+    yield ''.join(rows)
+
+
+def get_generation():
+    """
+    :return: IndexGeneration of the configured temp directory, opened once per worker
+    """
+    global generation_counter
+    if generation_counter is None:
+        generation_counter = IndexGeneration(generation_path(get_config().get('Directory-Section', 'temp')))
+    return generation_counter
+
+
+def shared_cache_path():
+    """
+    :return: path to the database of the caches shared by all the workers
+    """
+    return os.path.join(get_config().get('Directory-Section', 'temp'), SHARED_CACHE_FILE)
+
+
+def index_generation():
+    """
+    Generation of the index increased by the indexer once it finished writing its modules.
+    Reading it costs only a read from the memory mapped generation file.
+    :return: (int) index generation, None if it is not known
+    """
+    return get_generation().current()
+
+
+def page_etag(request, *args, **kwargs):
+    """
+    Strong ETag of a module page. It is computed from the requested url and the index
+    generation only, so a repeated request is answered with 304 before elasticsearch
+    or the api are called. No ETag is sent while the generation is not known, a page
+    could not be told apart from the one of an older index.
+    :param request: Array with arguments from rest request.
+    :return: (str) ETag or None if the index generation is not known
+    """
+    generation = index_generation()
+    if generation is None:
+        return None
+    page = [request.path, sorted(request.GET.lists()), generation]
+    return hashlib.sha1(json.dumps(page).encode('utf-8')).hexdigest()
+
+
+def page_last_modified(request, *args, **kwargs):
+    """
+    :param request: Array with arguments from rest request.
+    :return: (datetime) time of the last change of the index or None if it is not known
+    """
+    state = get_generation().read()
+    if state is None or state[1] == 0:
+        return None
+    return datetime.datetime.utcfromtimestamp(state[1])
+
+
+def render_page(request, template_name, context):
+    """
+    Renders a module page. Pages showing alerts are not stored by clients, so that a
+    temporary failure is not revalidated with 304 until the index changes.
+    :param request: Array with arguments from rest request.
+    :param template_name: template of the page
+    :param context: context of the template
+    :return: HttpResponse
+    """
+    with timing.measure('render'):
+        response = render(request, template_name, context)
+    if context.get('alerts'):
+        add_never_cache_headers(response)
+    return response
+
+
+@condition(etag_func=page_etag, last_modified_func=page_last_modified)
 def show_node(request, name='', path='', revision=''):
     """
     View for show_node page, which provides context for show_node.html
@@ -272,11 +413,9 @@ def show_node(request, name='', path='', revision=''):
         if not revision:
             revision = get_latest_mod(name)
             revision = revision.split('@')[1]
-        query = json.load(open('search/templates/json/show_node.json', 'r'))
-        query['query']['bool']['must'][0]['match_phrase']['module.keyword']['query'] = name
-        query['query']['bool']['must'][1]['match_phrase']['path']['query'] = path
-        query['query']['bool']['must'][2]['match_phrase']['revision']['query'] = revision
-        hits = es.search(index='yindex', doc_type='modules', body=query)['hits']['hits']
+        query = queries.node_by_path(name, path, revision)
+        hits = queries.hits(get_es().search(index='yindex', doc_type='modules', body=query, size=1,
+                                      filter_path=queries.HITS_FILTER))
         if len(hits) == 0:
             alerts.append('Could not find data for {} at {}'.format(name, path))
         else:
@@ -286,50 +425,56 @@ def show_node(request, name='', path='', revision=''):
     except:
         alerts.append('Module and path must be specified')
     context['alerts'] = alerts
-    return render(request, 'search/show_node.html', context)
-
-
-def create_prev_next(module, rv):
-    query = \
-        {
-            "query": {
-                "bool": {
-                    "must": [{
-                        "match_phrase": {
-                            "module.keyword": {
-                                "query": module
-                            }
-                        }
-                    }]
-                }
-            },
-            "sort": [
-                {"revision": {"order": "desc"}}
-            ]
-        }
-    mods = es.search(index='modules', doc_type='modules', body=query, size=100)['hits']['hits']
-    prev = None
-    nxt = None
-    i = 0
-    revisions = []
-    for mod in mods:
-        i = i + 1
-        mod = mod['_source']
+    return render_page(request, 'search/show_node.html', context)
 
-        if mod['revision'] != rv:
-            revisions.append(mod['revision'])
-        else:
-            revisions.append('current@{}'.format(mod['revision']))
-        #    try:
-        #        nxt = mods[i]['_source']['revision']
-        #    except IndexError as e:
-        #        pass
-        #    break
-        # prev = mod['revision']
 
+def get_module_details(module, alerts):
+    """
+    Resolves revision and organization of the module and gets its details from the api.
+    :param module: module name optionally with @revision
+    :param alerts: alerts to show when something has gone awry.
+    :return: (tuple) revision, organization and response of the api
+    """
+    rv_org = get_rev_org(module, 1, alerts)
+    rv = rv_org['rev']
+    org = rv_org['org']
+    url = '/api/search/modules/' + module.split('@')[0] + ',' + rv + ',' + org
+    response = backend().get(url, endpoint='search/modules/<module>')
+    logger.error('Module details request created to backend {} with response \n{}'.format(url, response.text))
+    return rv, org, response
+
+
+def get_module_revisions(module):
+    """
+    :param module: module name
+    :return: all the revisions of the module from the latest
+    """
+    query = queries.module_revisions(module)
+    mods = queries.hits(get_es().search(index='modules', doc_type='modules', body=query, size=100,
+                                  filter_path=queries.HITS_FILTER))
+    return [mod['_source']['revision'] for mod in mods]
+
+
+def create_prev_next(module, rv, module_revisions=None):
+    """
+    :param module: module name
+    :param rv: current revision
+    :param module_revisions: revisions of the module as returned by get_module_revisions,
+                             they are queried if not set
+    :return: revisions of the module with the current one marked
+    """
+    if module_revisions is None:
+        module_revisions = get_module_revisions(module)
+    revisions = []
+    for revision in module_revisions:
+        if revision != rv:
+            revisions.append(revision)
+        else:
+            revisions.append('current@{}'.format(revision))
     return revisions
 
 
+@condition(etag_func=page_etag, last_modified_func=page_last_modified)
 def module_details(request, module=''):
     """
     View for module_details, which provides context for module_details.html
@@ -350,54 +495,45 @@ def module_details(request, module=''):
             context['module'] = ""
             context['module_details'] = None
             context['alerts'] = alerts
-            return render(request, 'search/module_details.html', context)
+            return render_page(request, 'search/module_details.html', context)
         module = module.replace('.yang', '')
         module = module.replace('.yin', '')
-        rev_org = get_rev_org('yang-catalog', 1, alerts)
-        revision = rev_org['rev']
-        query = json.load(open('search/templates/json/get_yang_catalog_yang.json', 'r'))
-        query['query']['bool']['must'][1]['match_phrase']['revision']['query'] = revision
-        mod = es.search(index='yindex', doc_type='modules', body=query, size=10000)['hits']['hits']
-        rv_org = get_rev_org(module, 1, alerts)
+        # independent calls run concurrently, page waits for the slowest of them
+        deadline = time.monotonic() + MODULE_DETAILS_BUDGET
+        executor = get_details_executor()
+        help_texts_future = executor.submit(timing.propagate(get_catalog_help_texts), alerts)
+        details_future = executor.submit(timing.propagate(get_module_details), module, alerts)
         module = module.split('@')[0]
-        rv = rv_org['rev']
-        org = rv_org['org']
-        revisions = create_prev_next(module, rv)
-        url = api_prefix + '/api/search/modules/' + module + ',' + rv + ',' + org
-        response = requests.get(url, headers={'Content-type': 'application/json', 'Accept': 'application/json'})
-        logger.error('Module details request created to backend {} with response \n{}'.format(url, response.text))
+        revisions_future = executor.submit(timing.propagate(get_module_revisions), module)
+
+        rv, org, response = details_future.result(timeout=max(deadline - time.monotonic(), 0))
+        try:
+            module_revisions = revisions_future.result(timeout=max(deadline - time.monotonic(), 0))
+            revisions = create_prev_next(module, rv, module_revisions)
+        except FuturesTimeoutError:
+            alerts.append('Revisions of module {} could not be loaded in time'.format(module))
+            revisions = create_prev_next(module, rv, [rv])
+        try:
+            help_texts = help_texts_future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FuturesTimeoutError:
+            alerts.append('Help texts could not be loaded in time')
+            help_texts = dict()
+        except Exception as e:
+            logger.exception('Failed to get help texts')
+            alerts.append('Failed to get help texts, {}'.format(e))
+            help_texts = dict()
         if response.text is not None and json.loads(response.text).get('module') is not None:
             results = json.loads(response.text)['module']
         else:
             alerts.append('Module not Found.')
         module_details = dict()
         for key in __module:
-            help_text = ''
-            val = ''
             for result in results:
                 if result.get(key) is not None:
                     module_details[key] = result.get(key)
                 else:
                     module_details[key] = ''
-            for m in mod:
-                m = m['_source']
-                if m.get('argument') is not None and m.get('argument') == key:
-                    if m.get('description') is not None:
-                        help_text = m.get('description')
-                    nprops = json.loads(m['properties'])
-                    for prop in nprops:
-                        if prop.get('type') is not None:
-                            if prop.get('type')['has_children'] == True:
-                                for child in prop['type']['children']:
-                                    if child.get('enum') and child['enum']['has_children'] == True:
-                                        for echild in child['enum']['children']:
-                                            if echild.get('description') is not None:
-                                                description = echild['description']['value'].replace('\n', "<br/>\r\n")
-                                                help_text += "<br/>\r\n<br/>\r\n{} : {}".format(child['enum']['value'],
-                                                                                                description)
-
-                        break
-                module_details['{}_ht'.format(key)] = help_text
+            module_details['{}_ht'.format(key)] = help_texts.get(key, '')
 
         module_details['revision'] = revisions
         context['module_details'] = module_details
@@ -408,14 +544,81 @@ def module_details(request, module=''):
         context['mod_rev'] = '{}@{}'.format(module, rv)
         context['alerts'] = alerts
         context['title'] = 'Module Details for {}@{}.yang'.format(module, rv)
+    except FuturesTimeoutError:
+        logger.error('Module details of {} not loaded within {}s'.format(module, MODULE_DETAILS_BUDGET))
+        alerts.append('Module details could not be loaded in time')
+        context['title'] = title
+        context['module'] = ""
+        context['module_details'] = None
+        context['alerts'] = alerts
+        return render_page(request, 'search/module_details.html', context)
     except Exception:
         logger.exception("Failed to get module")
         context['title'] = title
         context['module'] = ""
         context['module_details'] = None
         context['alerts'] = alerts
-        return render(request, 'search/module_details.html', context)
-    return render(request, 'search/module_details.html', context)
+        return render_page(request, 'search/module_details.html', context)
+    return render_page(request, 'search/module_details.html', context)
+
+
+def get_catalog_help_texts(alerts):
+    """
+    Gets help texts of the module details keys from the latest revision of yang-catalog.
+    :param alerts: alerts to show when something has gone awry.
+    :return: (dict) module details key -> help text, empty if the revision is not found
+    """
+    rev_org = get_rev_org('yang-catalog', 1, alerts)
+    if rev_org is None or not rev_org.get('rev'):
+        alerts.append('Help texts could not be loaded, revision of yang-catalog not found')
+        return dict()
+    return get_help_texts(rev_org['rev'])
+
+
+def get_help_texts(revision):
+    """
+    Gets help texts of the module details keys from the description of the nodes of
+    the yang-catalog module in given revision, including descriptions of enum values.
+    Help texts only change with new revision of yang-catalog, so they are cached by it.
+    :param revision: revision of the yang-catalog module
+    :return: (dict) module details key -> help text
+    """
+    help_texts = HELP_TEXT_CACHE.get(revision)
+    if help_texts is not None:
+        return help_texts
+    query = queries.yang_catalog_nodes(revision)
+    mod = queries.hits(get_es().search(index='yindex', doc_type='modules', body=query, size=10000,
+                                 filter_path=queries.HITS_FILTER))
+    nodes = dict()
+    for m in mod:
+        m = m['_source']
+        if m.get('argument') is not None:
+            nodes.setdefault(m['argument'], []).append(m)
+    help_texts = dict()
+    for key in __module:
+        if len(mod) == 0:
+            break
+        help_text = ''
+        for m in nodes.get(key, []):
+            if m.get('description') is not None:
+                help_text = m.get('description')
+            nprops = json.loads(m['properties'])
+            for prop in nprops:
+                if prop.get('type') is not None:
+                    if prop.get('type')['has_children'] == True:
+                        for child in prop['type']['children']:
+                            if child.get('enum') and child['enum']['has_children'] == True:
+                                for echild in child['enum']['children']:
+                                    if echild.get('description') is not None:
+                                        description = echild['description']['value'].replace('\n', "<br/>\r\n")
+                                        help_text += "<br/>\r\n<br/>\r\n{} : {}".format(child['enum']['value'],
+                                                                                        description)
+
+                break
+        help_texts[key] = help_text
+    if len(mod) > 0:
+        HELP_TEXT_CACHE.set(revision, help_texts)
+    return help_texts
 
 
 def completions(request, type, pattern):
@@ -443,21 +646,22 @@ def completions(request, type, pattern):
 
     selector = None
     try:
-        completion = json.load(open('search/templates/json/completion.json', 'r'))
-
         if type == 'org':
             selector = 'organization'
         elif type == 'module':
             selector = 'module'
 
-        completion['query']['bool']['must'][0]['term'] = {selector: pattern.lower()}
-        completion['aggs']['groupby_module']['terms']['field'] = '{}.keyword'.format(selector)
-        rows = \
-        es.search(index='modules', doc_type='modules', body=completion, size=0)['aggregations']['groupby_module'][
-            'buckets']
+        completion_index = COMPLETION_INDEXES[type].get()
+        if completion_index is not None:
+            res = completion_index.lookup(pattern)
+        else:
+            completion = queries.completions(selector, pattern)
+            response = get_es().search(index='modules', doc_type='modules', body=completion, size=0,
+                                 filter_path=queries.COMPLETION_FILTER)
+            rows = response.get('aggregations', {}).get('groupby_module', {}).get('buckets', [])
 
-        for row in rows:
-            res.append(row['key'])
+            for row in rows:
+                res.append(row['key'])
 
     except Exception as e:
         raise Exception(e)
@@ -510,13 +714,12 @@ def fetch(mod_obj):
     :param mod_obj: module object
     :return: module with all arguments
     """
-    url = api_prefix + '/api/search/modules/' + mod_obj['name'] + ',' + mod_obj['revision'] + ',' + mod_obj[
-        'organization']
+    url = '/api/search/modules/' + mod_obj['name'] + ',' + mod_obj['revision'] + ',' + mod_obj['organization']
     if mod_obj.get('yang_suite'):
-        response = requests.get(url, headers={'Content-type': 'application/json', 'Accept': 'application/json',
-                                              'yangsuite': 'true', 'yang_set': mod_obj['name']})
+        response = backend().get(url, endpoint='search/modules/<module>',
+                                 headers={'yangsuite': 'true', 'yang_set': mod_obj['name']})
     else:
-        response = requests.get(url, headers={'Content-type': 'application/json', 'Accept': 'application/json'})
+        response = backend().get(url, endpoint='search/modules/<module>')
     results = json.loads(response.text)
     for result in results['module']:
         for key, value in result.items():
@@ -535,73 +738,29 @@ def metadata_update(request):
     :return: calls scripts for database update and file generation
     """
     logger.info('Updating metadata')
-    config_path = '/etc/yangcatalog/yangcatalog.conf'
-    config = configparser.ConfigParser()
-    config._interpolation = configparser.ExtendedInterpolation()
-    config.read(config_path)
+    config = connections.load_config()
     changes_cache_dir = config.get('Directory-Section', 'changes-cache')
-    delete_cache_dir = config.get('Directory-Section', 'delete-cache')
     update_signature = config.get('Secrets-Section', 'update-signature')
-    lock_file = config.get('Directory-Section', 'lock')
 
     body_unicode = request.body.decode('utf-8')
     signature = create_signature(update_signature, body_unicode)
-    while os.path.exists(lock_file):
-        time.sleep(10)
-    try:
-        try:
-            open(lock_file, 'w').close()
-        except:
-            raise Exception('Failed to obtain lock ' + lock_file)
-
-        if request.META.get('REQUEST_METHOD') is None or request.META['REQUEST_METHOD'] != 'POST':
-            return HttpResponse(json.dumps({'error': 'Invalid request method'}, cls=DjangoJSONEncoder),
-                                content_type="application/json", status=404)
-        if request.META.get('HTTP_X_YC_SIGNATURE') is None or request.META[
-            'HTTP_X_YC_SIGNATURE'] != 'sha1=' + signature:
-            return HttpResponse(json.dumps({'error': 'Invalid message signature'}, cls=DjangoJSONEncoder),
-                                content_type="application/json", status=404)
-
-        changes_cache = dict()
-        delete_cache = []
-        if os.path.exists(changes_cache_dir) and os.path.getsize(changes_cache_dir) > 0:
-            f = open(changes_cache_dir)
-            changes_cache = json.load(f)
-            f.close()
-        if os.path.exists(delete_cache_dir) and os.path.getsize(delete_cache_dir) > 0:
-            f = open(delete_cache_dir)
-            delete_cache = json.load(f)
-            f.close()
-
-        js = json.loads(body_unicode)
-        if js.get('modules-to-index') is None:
-            js['modules-to-index'] = {}
-
-        if js.get('modules-to-delete') is None:
-            js['modules-to-delete'] = []
-
-        for mname, mpath in js['modules-to-index'].items():
-            changes_cache[mname] = mpath
-        for mname in js['modules-to-delete']:
-            exists = False
-            for existing in delete_cache:
-                if mname == existing:
-                    exists = True
-            if not exists:
-                delete_cache.append(mname)
-        fd = open(changes_cache_dir, 'w')
-        fd.write(json.dumps(changes_cache))
-        fd.close()
-        fd = open(delete_cache_dir, 'w')
-        fd.write(json.dumps(delete_cache))
-        fd.close()
-    except Exception as e:
-        os.unlink(lock_file)
-        raise Exception("Caught exception {}".format(e))
-    os.unlink(lock_file)
+    if request.META.get('REQUEST_METHOD') is None or request.META['REQUEST_METHOD'] != 'POST':
+        return HttpResponse(json.dumps({'error': 'Invalid request method'}, cls=DjangoJSONEncoder),
+                            content_type="application/json", status=404)
+    if request.META.get('HTTP_X_YC_SIGNATURE') is None or request.META[
+        'HTTP_X_YC_SIGNATURE'] != 'sha1=' + signature:
+        return HttpResponse(json.dumps({'error': 'Invalid message signature'}, cls=DjangoJSONEncoder),
+                            content_type="application/json", status=404)
+
+    clear_caches()
+    js = json.loads(body_unicode)
+    # the cron job reads the journal, appending to it never waits for the job to finish
+    journal = ChangeJournal(journal_path(changes_cache_dir))
+    journal.append(js.get('modules-to-index') or {}, js.get('modules-to-delete') or [])
     return HttpResponse(status=201)
 
 
+@condition(etag_func=page_etag, last_modified_func=page_last_modified)
 def yang_tree(request, module=''):
     """
     View for yang_tree.html webpage. Generates yang tree view of the module.
@@ -611,8 +770,7 @@ def yang_tree(request, module=''):
     """
     context = dict()
     alerts = []
-    jstree_json = None
-    json_tree = dict()
+    tree = None
     modn = ''
     title = ''
     maturity = ''
@@ -629,51 +787,13 @@ def yang_tree(request, module=''):
 
             modn = module.split('@', 1)[0]
             module = "{}@{}".format(modn, mod_obj['rev'])
-            ytree_dir = config.get('Directory-Section', 'json-ytree')
-            f = '{}/{}.json'.format(ytree_dir, module)
             maturity = get_maturity(mod_obj)
-            if os.path.isfile(f):
-                try:
-                    contents = open(f).read()
-                    json_tree = json.loads(contents)
-                    if json_tree.get('namespace') is None:
-                        json_tree['namespace'] = ''
-                    if json_tree is None:
-                        alerts.append('Failed to decode JSON data: ')
-                    else:
-                        data_nodes = build_tree(json_tree, modn)
-                        jstree_json = dict()
-                        jstree_json['data'] = [data_nodes]
-                        if json_tree.get('rpcs') is not None:
-                            rpcs = dict()
-                            rpcs['name'] = json_tree['prefix'] + ':rpcs'
-                            rpcs['children'] = json_tree['rpcs']
-                            jstree_json['data'].append(build_tree(rpcs, modn))
-                        if json_tree.get('notifications') is not None:
-                            notifs = dict()
-                            notifs['name'] = json_tree['prefix'] + ':notifs'
-                            notifs['children'] = json_tree['notifications']
-                            jstree_json['data'].append(build_tree(notifs, modn))
-                        if json_tree.get('augments') is not None:
-                            augments = dict()
-                            augments['name'] = json_tree['prefix'] + ':augments'
-                            augments['children'] = []
-                            for aug in json_tree.get('augments'):
-                                aug_info = dict()
-                                aug_info['name'] = aug['augment_path']
-                                aug_info['children'] = aug['augment_children']
-                                augments['children'].append(aug_info)
-
-                            jstree_json['data'].append(build_tree(augments, modn, augments=True))
-                except Exception as e:
-                    alerts.append("Failed to read YANG tree data for {}, {}".format(module, e))
-            else:
-                alerts.append("YANG Tree data does not exist for {}".format(module))
-    if jstree_json is None:
+            tree = get_yang_tree(module, modn, alerts)
+    if tree is None:
         context['jstree_json'] = dict()
         alerts.append('Json tree could not be generated')
     else:
-        context['jstree_json'] = json.dumps(jstree_json, cls=DjangoJSONEncoder)
+        context['jstree_json'] = tree['top']
 
     context['module'] = module
     if modn:
@@ -681,13 +801,279 @@ def yang_tree(request, module=''):
     else:
         context['modn'] = module
     context['alerts'] = alerts
-    if json_tree:
-        context['json_tree'] = json_tree
+    if tree is not None:
+        context['json_tree'] = {'namespace': tree['namespace'], 'prefix': tree['prefix']}
     context['title'] = title
     context['maturity'] = maturity
-    return render(request, 'search/yang_tree.html', context)
+    return render_page(request, 'search/yang_tree.html', context)
 
 
+def accepts_gzip(request):
+    """
+    :param request: Array with arguments from rest request.
+    :return: (bool) whether the client accepts gzipped responses
+    """
+    return 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+
+
+def tree_data_etag(request, *args, **kwargs):
+    """
+    ETag of the whole jsTree data. Gzipped and identity bodies differ, so do their ETags.
+    :param request: Array with arguments from rest request.
+    :return: (str) ETag or None if the index generation is not known
+    """
+    etag = page_etag(request, *args, **kwargs)
+    if etag is None or not accepts_gzip(request):
+        return etag
+    return '{}-gzip'.format(etag)
+
+
+@condition(etag_func=tree_data_etag, last_modified_func=page_last_modified)
+def yang_tree_data(request, module=''):
+    """
+    Returns the whole jsTree data of the module as json, requested by Expand All of the
+    yang tree page. The body is served gzipped to clients which accept it.
+    :param request: Array with arguments from rest request.
+    :param module: Module for which we are returning the tree.
+    :return: jsTree json
+    """
+    alerts = []
+    tree = find_yang_tree(module, alerts)
+    if tree is None:
+        return HttpResponse(json.dumps({'error': 'Json tree could not be generated', 'alerts': alerts},
+                                       cls=DjangoJSONEncoder), content_type='application/json', status=404)
+    data = TREE_DATA_CACHE.get(tree['key'])
+    if data is None:
+        data = gzip.compress(assemble_jstree(tree).encode('utf-8'))
+        TREE_DATA_CACHE.set(tree['key'], data)
+    if accepts_gzip(request):
+        response = HttpResponse(data, content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(gzip.decompress(data), content_type='application/json')
+    response['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def assemble_jstree(tree):
+    """
+    Puts the children written to the blob by JsTreeWriter back to their parents.
+    :param tree: TREE_CACHE entry
+    :return: (str) serialized whole jsTree data
+    """
+    children = tree['children']
+    offsets = tree['offsets']
+
+    def attach(nodes):
+        for node in nodes:
+            node_id = node.get('id')
+            if node.get('children') is True and node_id in offsets:
+                start, length = offsets[node_id]
+                node['children'] = json.loads(children[start:start + length].decode('utf-8'))
+                del node['id']
+            if isinstance(node.get('children'), list):
+                attach(node['children'])
+
+    jstree_json = json.loads(tree['top'])
+    attach(jstree_json['data'])
+    return json.dumps(jstree_json, cls=DjangoJSONEncoder)
+
+
+@condition(etag_func=page_etag, last_modified_func=page_last_modified)
+def yang_tree_children(request, module='', node_id=''):
+    """
+    Returns children of one node of the yang tree, called by jsTree when a node
+    which was not sent with the page is opened.
+    :param request: Array with arguments from rest request.
+    :param module: Module for which we are returning the children.
+    :param node_id: id of the opened node
+    :return: json list of jsTree nodes
+    """
+    alerts = []
+    tree = find_yang_tree(module, alerts)
+    offset = None
+    if tree is not None:
+        offset = tree['offsets'].get(node_id)
+    if offset is None:
+        alerts.append('Node {} not found'.format(node_id))
+        return HttpResponse(json.dumps({'error': 'Children could not be generated', 'alerts': alerts},
+                                       cls=DjangoJSONEncoder), content_type='application/json', status=404)
+    start, length = offset
+    return HttpResponse(tree['children'][start:start + length], content_type='application/json')
+
+
+def find_yang_tree(module, alerts):
+    """
+    Resolves revision of the module and gets its jsTree data.
+    :param module: module name optionally with @revision
+    :param alerts: alerts to show when something has gone awry.
+    :return: (dict) tree cache entry or None
+    """
+    if not module or os.path.basename(module) != module:
+        alerts.append('Invalid module name specified')
+        return None
+    rev_org = get_rev_org(module, 1, alerts)
+    if rev_org is None:
+        return None
+    modn = module.split('@', 1)[0]
+    return get_yang_tree('{}@{}'.format(modn, rev_org['rev']), modn, alerts)
+
+
+def get_yang_tree(module, modn, alerts):
+    """
+    Gets rendered jsTree data of the module. Data are cached per json-ytree file and
+    rebuilt whenever modification time or size of the file changes, so a file rewritten
+    by the indexer is picked up automatically.
+    :param module: module name with revision
+    :param modn: module name
+    :param alerts: alerts to show when something has gone awry.
+    :return: (dict) top levels of the tree with the children index, namespace and prefix
+             of the module or None
+    """
+    ytree_dir = get_config().get('Directory-Section', 'json-ytree')
+    f = '{}/{}.json'.format(ytree_dir, module)
+    if not os.path.isfile(f):
+        alerts.append("YANG Tree data does not exist for {}".format(module))
+        return None
+    stat = os.stat(f)
+    version = (stat.st_mtime_ns, stat.st_size)
+    key = (f, version)
+    tree = TREE_CACHE.get(key)
+    if tree is not None:
+        return tree
+    try:
+        with open(f, 'r') as ytree_file:
+            jstree_json, json_tree, children, offsets = build_jstree(ytree_file, modn)
+        if json_tree.get('namespace') is None:
+            json_tree['namespace'] = ''
+    except Exception as e:
+        alerts.append("Failed to read YANG tree data for {}, {}".format(module, e))
+        return None
+    tree = {
+        'key': key,
+        'top': json.dumps(jstree_json, cls=DjangoJSONEncoder),
+        'children': children,
+        'offsets': offsets,
+        'namespace': json_tree['namespace'],
+        'prefix': json_tree.get('prefix')
+    }
+    TREE_CACHE.set(key, tree)
+    return tree
+
+
+def tree_entry_size(tree):
+    """
+    :param tree: TREE_CACHE entry
+    :return: (int) approximate size of the entry in bytes
+    """
+    size = sum(len(value) for value in tree.values() if isinstance(value, (bytes, str)))
+    # a key and a tuple of two integers for every node with children loaded lazily
+    return size + 100 * len(tree['offsets'])
+
+
+class JsTreeWriter(object):
+    """
+    Builds jsTree data of the yang tree while the json-ytree file is being parsed.
+    Nodes of the first inline_depth levels are kept to be sent with the page. Every
+    deeper node with children gets a sequential id and its children are replaced by
+    true, which makes jsTree ask for them once the node is opened. Children of such
+    a node are serialized into the blob as soon as all of them were built, so only
+    the nodes on the path from the root to the current node and their siblings are
+    held in memory, never the whole tree. The index maps id of a node to offset and
+    length of its children in the blob.
+    """
+
+    def __init__(self, module, inline_depth=YANG_TREE_INLINE_DEPTH):
+        """
+        :param module: module name
+        :param inline_depth: number of levels which are sent with the page
+        """
+        self.module = module
+        self.inline_depth = inline_depth
+        self.blob = bytearray()
+        self.offsets = dict()
+
+    def section(self, jsont, augments=False):
+        """
+        :param jsont: root of a section of the tree, the module itself, its rpcs, notifications or augments
+        :param augments: whether the section holds augments
+        :return: (dict) jsTree node of the root with its inline levels
+        """
+        return self._node(jsont, [], augments, 0)
+
+    def _node(self, jsont, pass_on_schemas, augments, depth):
+        node = build_node(jsont, self.module, pass_on_schemas, augments)
+        if 'children' not in node:
+            return node
+        node_id = None
+        if depth + 1 >= self.inline_depth:
+            node_id = 'n{}'.format(len(self.offsets))
+            self.offsets[node_id] = None
+        children = [self._node(child, pass_on_schemas, augments, depth + 1) for child in jsont['children']]
+        if len(pass_on_schemas) != 0 and jsont.get('schema_type') not in ['choice', 'case']:
+            pass_on_schemas.pop()
+        if node_id is None:
+            node['children'] = children
+            return node
+        chunk = json.dumps(children, cls=DjangoJSONEncoder).encode('utf-8')
+        self.offsets[node_id] = (len(self.blob), len(chunk))
+        self.blob.extend(chunk)
+        node['children'] = True
+        node['id'] = node_id
+        return node
+
+
+def build_jstree(ytree_file, modn, inline_depth=YANG_TREE_INLINE_DEPTH):
+    """
+    Builds jsTree data from the json-ytree output of the module. The file is parsed
+    while the tree is being built and nodes below inline_depth are serialized right
+    away, so neither the file nor the whole tree is ever held in memory.
+    :param ytree_file: opened json-ytree file
+    :param modn: module name
+    :param inline_depth: number of levels which are sent with the page
+    :return: (dict, dict, bytes, dict) inline levels of the jsTree data, attributes of the module
+             other than its nodes, blob with serialized children of deeper nodes and its index
+             node id -> (offset, length)
+    """
+    writer = JsTreeWriter(modn, inline_depth)
+    json_tree = dict()
+    sections = dict()
+    for key, value in ytree.iter_module(ytree_file):
+        if key == 'children':
+            json_tree['children'] = value
+            sections['data'] = writer.section(json_tree)
+            del json_tree['children']
+        elif key == 'rpcs':
+            rpcs = dict()
+            rpcs['name'] = json_tree['prefix'] + ':rpcs'
+            rpcs['children'] = value
+            sections['rpcs'] = writer.section(rpcs)
+        elif key == 'notifications':
+            notifs = dict()
+            notifs['name'] = json_tree['prefix'] + ':notifs'
+            notifs['children'] = value
+            sections['notifications'] = writer.section(notifs)
+        elif key == 'augments':
+            augments = dict()
+            augments['name'] = json_tree['prefix'] + ':augments'
+            augments['children'] = []
+            for aug in value:
+                aug_info = dict()
+                aug_info['name'] = aug['augment_path']
+                aug_info['children'] = aug['augment_children']
+                augments['children'].append(aug_info)
+
+            sections['augments'] = writer.section(augments, augments=True)
+        else:
+            json_tree[key] = value
+    if 'data' not in sections:
+        sections['data'] = writer.section(json_tree)
+    jstree_json = dict()
+    jstree_json['data'] = [sections[key] for key in ('data', 'rpcs', 'notifications', 'augments') if key in sections]
+    return jstree_json, json_tree, bytes(writer.blob), writer.offsets
+
+
+@condition(etag_func=page_etag, last_modified_func=page_last_modified)
 def impact_analysis(request, module=''):
     """
     View for impact_analysis.html
@@ -706,20 +1092,15 @@ def impact_analysis(request, module=''):
     colors = ['#FFC20A', '#0C7BDC', '#994F00', '#E1BE6A', '#E66100', '#ff0000', '#4B0092', '#827F1C', '#D35FB7',
               '#000000', '#117733', '#BB4F54', '#656565']
     try:
-        nodes = []
-        edges = []
-        edge_counts = dict()
-        nseen = dict()
-        eseen = dict()
         mods = []
         good_mods = []
+        roots = []
         show_rfcs = True
         recurse = 0
         show_subm = True
         show_dir = 'both'
         found_bottleneck = False
         bottlenecks = []
-        global found_orgs, found_mats
         num_legend_cols = 1
         rim_cols = 0
         if 'modtags' in request.GET:
@@ -759,8 +1140,7 @@ def impact_analysis(request, module=''):
                             continue
                         good_mods.append(m)
                         mods.append(m)
-                        build_graph(m, mod_obj, orgs, nodes, edges, edge_counts, nseen, eseen, alerts, show_rfcs,
-                                    colors, recurse, False, show_subm, show_dir)
+                        roots.append((m, mod_obj))
         else:
             for m in mods:
                 nmodule = os.path.basename(m)
@@ -773,14 +1153,17 @@ def impact_analysis(request, module=''):
                     mod_obj = get_rev_org_obj(m, alerts)
                     m = m.split('@')[0]
                     good_mods.append(m)
-                    build_graph(m, mod_obj, orgs, nodes, edges, edge_counts, nseen, eseen, alerts, show_rfcs,
-                                colors, recurse, False, show_subm, show_dir)
+                    roots.append((m, mod_obj))
+        graph = GraphBuilder(orgs, alerts, show_rfcs, colors, recurse, show_subm, show_dir)
+        graph.expand([mod_obj for _, mod_obj in roots])
+        for m, mod_obj in roots:
+            graph.add_module(m, mod_obj)
         if len(good_mods) > 0:
             title = 'YANG Impact Graph for Module(s): ' + ', '.join(good_mods)
-        edge_counts = asort(edge_counts)
+        edge_counts = asort(graph.edge_counts)
         curr_count = 0
         tbottlenecks = []
-        rim_cols = len(found_mats)
+        rim_cols = len(graph.found_mats)
         for pair in edge_counts:
             if pair[1] < 1 or pair[1] < curr_count:
                 break
@@ -790,7 +1173,7 @@ def impact_analysis(request, module=''):
 
         for bn in tbottlenecks:
             found_dep = False
-            for edge in edges:
+            for edge in graph.edges:
                 if edge['data']['target'] == "mod_{}".format(bn):
                     mn = edge['data']['source'].replace('mod_', '')
                     mo = get_rev_org_obj(mn, alerts)
@@ -801,21 +1184,22 @@ def impact_analysis(request, module=''):
             if not found_dep:
                 bottlenecks.append("node#mod_{}".format(bn))
 
-        num_legend_cols = math.ceil(len(found_orgs) / 6)
+        num_legend_cols = math.ceil(len(graph.found_orgs) / 6)
         if num_legend_cols < 1:
             num_legend_cols = 1
         if found_bottleneck:
             rim_cols += 1
         if rim_cols > 1:
             rim_cols -= 1
+        metrics.observe_graph(len(graph.nodes), len(graph.edges))
         context['alerts'] = alerts
-        context['nodes'] = nodes
-        context['nodes_json'] = json.dumps(nodes, cls=DjangoJSONEncoder)
-        context['edges'] = edges
-        context['edges_json'] = json.dumps(edges, cls=DjangoJSONEncoder)
+        context['nodes'] = graph.nodes
+        context['nodes_json'] = json.dumps(graph.nodes, cls=DjangoJSONEncoder)
+        context['edges'] = graph.edges
+        context['edges_json'] = json.dumps(graph.edges, cls=DjangoJSONEncoder)
         context['edge_counts'] = edge_counts
-        context['nseen'] = nseen
-        context['eseen'] = eseen
+        context['nseen'] = graph.nseen
+        context['eseen'] = graph.eseen
         context['modules'] = mods
         context['good_mods'] = good_mods
         context['orgs'] = orgs
@@ -829,137 +1213,205 @@ def impact_analysis(request, module=''):
         context['num_legend_cols'] = num_legend_cols
         context['rim_cols'] = rim_cols
         context['MATURITY_MAP'] = MATURITY_MAP
-        context['found_orgs'] = found_orgs
-        found_orgs = {}
-        context['ORG_CACHE'] = ORG_CACHE
-        context['found_mats'] = found_mats
-        found_mats = {}
+        context['found_orgs'] = graph.found_orgs
+        context['ORG_CACHE'] = graph.org_colors
+        context['found_mats'] = graph.found_mats
         context['DIR_HELP_TEXT'] = DIR_HELP_TEXT
     except Exception as e:
         context['alerts'] = alerts
         logger.error(e)
-        return render(request, 'search/impact_analysis.html', context)
-    return render(request, 'search/impact_analysis.html', context)
+        return render_page(request, 'search/impact_analysis.html', context)
+    return render_page(request, 'search/impact_analysis.html', context)
 
 
 def search(post_json, search_term, alerts):
     """
-    Searches for results of the main yang-search webpage.
+    Searches for results of the main yang-search webpage. Errors reported by the
+    backend are added to alerts right away, rows are produced lazily.
     :param post_json: Json which we are sending to api
     :param search_term: Term for which we are searching
     :return: Search results.
     """
     if search_term != '':
-
-        response = requests.post('{}/api/fast'.format(api_prefix), json=post_json,
-                                 headers={'Content-type': 'application/json', 'Accept': 'application/json'})
+        key = search_cache_key(post_json)
+        cached = SEARCH_CACHE.get(key)
+        if cached is not None:
+            search_alerts, rows = cached
+            alerts.extend(search_alerts)
+            return rows
+
+        response = backend().post('/api/fast', endpoint='fast', json=post_json)
         if response.status_code == 400:
             alerts.append(response.json().get('description'))
             return ''
         results = response.json().get('results')
 
-        all_results = set()
-
         if results is None:
             return ''
 
-        node_name_ctx = {}
+        search_alerts = []
         for result in results:
-
-            results_context = {}
             module = result.get('module')
-            node = result.get('node')
+            if module is not None and module.get('error') is not None:
+                search_alerts.append(module.get('error'))
+        alerts.extend(search_alerts)
+        return cache_search_rows(key, search_alerts, search_rows(results, post_json['headers']))
+    else:
+        return ''
 
-            type = ''
-            path = ''
-            node_name = ''
-            description = ''
 
-            if module is not None:
-                if module.get('error') is not None:
-                    alerts.append(module.get('error'))
-                    continue
-                if module['name'] is None:
-                    continue
-                organization = module['organization']
-                if module.get('maturity-level') is not None:
-                    maturity = module.get('maturity-level')
-                else:
-                    maturity = ''
-                revision = module['revision']
-                dependents = module.get('dependents')
-                if dependents is None:
-                    dependents = '0'
-                else:
-                    dependents = len(dependents)
-
-                try:
-                    compile_status = module['compilation-status']
-                except:
-                    logger.error('{}@{}'.format(module['name'], module['revision']))
-                mod_sig = "{}@{}/{}".format(
-                    module['name'], module['revision'], module['organization']
-                )
-                name = module['name']
-            else:
+def search_cache_key(post_json):
+    """
+    Creates key of SEARCH_CACHE which is the same for all the equivalent searches.
+    Order of the selected fields, yang versions and schema types does not change
+    the results, so these are sorted.
+    :param post_json: Json which we are sending to api
+    :return: (str) sha256 of the normalized search
+    """
+    normalized = dict(post_json)
+    for field in ['search-fields', 'yang-versions', 'schema-types']:
+        if normalized.get(field) is not None:
+            normalized[field] = sorted(normalized[field])
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def cache_search_rows(key, search_alerts, rows):
+    """
+    Passes rows through and stores them in SEARCH_CACHE once all of them were generated.
+    Rows of a response which was not sent completely are not cached.
+    :param key: SEARCH_CACHE key
+    :param search_alerts: alerts of the search
+    :param rows: generator of rows
+    :return: generator of rows
+    """
+    cached = []
+    for row in rows:
+        cached.append(row)
+        yield row
+    SEARCH_CACHE.set(key, (search_alerts, cached))
+
+
+def search_rows(results, headers):
+    """
+    Generates rows of the search results table from results returned by the backend.
+    :param results: results returned by /api/fast
+    :param headers: selected columns of the table
+    :return: generator of rows
+    """
+    # rows are deduplicated on values of the selected columns, first occurrence
+    # keeps its position so the ranking of the backend is preserved
+    seen = set()
+    count = 0
+    for result in results:
+
+        results_context = {}
+        module = result.get('module')
+        node = result.get('node')
+
+        type = ''
+        path = ''
+        node_name = ''
+        description = ''
+
+        if module is not None:
+            if module.get('error') is not None:
                 continue
+            if module['name'] is None:
+                continue
+            organization = module['organization']
+            if module.get('maturity-level') is not None:
+                maturity = module.get('maturity-level')
+            else:
+                maturity = ''
+            revision = module['revision']
+            dependents = module.get('dependents')
+            if dependents is None:
+                dependents = '0'
+            else:
+                dependents = len(dependents)
 
-            if organization is None or organization == '':
-                organization = 'N/A'
-
-            origin = 'N/A'
-            if organization != 'N/A' and organization in SDOS:
-                origin = 'Industry Standard'
-            elif organization != 'N/A':
-                origin = 'Vendor-Specific'
-
-            if node is not None:
-                type = node['type']
-                path = node['path']
-                node_name = node['name']
-                description = node['description']
-
-            results_context["mod_sig"] = mod_sig
-
-            headers = post_json['headers']
-
-            if "Module" in headers:
-                results_context["name"] = name
-            if "Organization" in headers:
-                results_context["organization"] = organization
-            if "Maturity" in headers:
-                results_context["maturity"] = maturity
-            if "Compilation Status" in headers:
-                results_context["compile_status"] = compile_status
-            if "Origin" in headers:
-                results_context["origin"] = origin
-            if "Revision" in headers:
-                results_context["revision"] = revision
-            if "Schema Type" in headers:
-                results_context["type"] = type
-            if "Path" in headers:
-                results_context["path"] = path
-            if "Imported By # Modules" in headers:
-                results_context["dependents"] = dependents
-            if "Name" in headers:
-                results_context["node_name"] = node_name
-                results_context["name"] = name
-                results_context["revision"] = revision
-                results_context["path"] = path
-            if "Description" in headers:
-                results_context["description"] = description
-            all_results.add(json.dumps(results_context))
-        all_results_list = []
-        counter = 0
-        for res in all_results:
-            res = json.loads(res)
-            all_results_list.append(res)
-            counter += 1
-            if counter == 10000:
-                break
-        return all_results_list
-    else:
-        return ''
+            try:
+                compile_status = module['compilation-status']
+            except:
+                logger.error('{}@{}'.format(module['name'], module['revision']))
+            mod_sig = "{}@{}/{}".format(
+                module['name'], module['revision'], module['organization']
+            )
+            name = module['name']
+        else:
+            continue
+
+        if organization is None or organization == '':
+            organization = 'N/A'
+
+        origin = 'N/A'
+        if organization != 'N/A' and organization in SDOS:
+            origin = 'Industry Standard'
+        elif organization != 'N/A':
+            origin = 'Vendor-Specific'
+
+        if node is not None:
+            type = node['type']
+            path = node['path']
+            node_name = node['name']
+            description = node['description']
+
+        results_context["mod_sig"] = mod_sig
+
+        if "Module" in headers:
+            results_context["name"] = name
+        if "Organization" in headers:
+            results_context["organization"] = organization
+        if "Maturity" in headers:
+            results_context["maturity"] = maturity
+        if "Compilation Status" in headers:
+            results_context["compile_status"] = compile_status
+        if "Origin" in headers:
+            results_context["origin"] = origin
+        if "Revision" in headers:
+            results_context["revision"] = revision
+        if "Schema Type" in headers:
+            results_context["type"] = type
+        if "Path" in headers:
+            results_context["path"] = path
+        if "Imported By # Modules" in headers:
+            results_context["dependents"] = dependents
+        if "Name" in headers:
+            results_context["node_name"] = node_name
+            results_context["name"] = name
+            results_context["revision"] = revision
+            results_context["path"] = path
+        if "Description" in headers:
+            results_context["description"] = description
+        key = tuple(results_context.values())
+        if key in seen:
+            continue
+        seen.add(key)
+        yield results_context
+        count += 1
+        if count == MAX_SEARCH_RESULTS:
+            break
+
+
+def backend():
+    """
+    :return: BackendClient of this worker for the configured api prefix
+    """
+    return get_client(get_api_prefix())
+
+
+def clear_caches():
+    """
+    Logs hit and miss counters of the worker caches and empties them. Called whenever
+    the catalog or the configuration changes.
+    """
+    for cache in [REV_ORG_CACHE, MODULE_CACHE, HELP_TEXT_CACHE, SEARCH_CACHE, TREE_CACHE, TREE_DATA_CACHE]:
+        logger.info('Clearing cache {}'.format(cache.stats()))
+        cache.clear()
+    DEPENDENCY_GRAPH.invalidate()
+    for completion_index in COMPLETION_INDEXES.values():
+        completion_index.invalidate()
+    logger.info('Backend api stats {}'.format(backend().stats()))
 
 
 def get_rev_org(mod, depth=1, alerts=[]):
@@ -970,69 +1422,54 @@ def get_rev_org(mod, depth=1, alerts=[]):
     :return: revision and organization
     """
     try:
-        if '@' in mod:
-            mod_parts = mod.split('@')
-            modn = mod_parts[0]
-            rev = mod_parts[1]
-            query = \
-                {
-                    "query": {
-                        "bool": {
-                            "must": [{
-                                "match_phrase": {
-                                    "module.keyword": {
-                                        "query": modn
-                                    }
-                                }
-                            }, {
-                                "match_phrase": {
-                                    "revision": {
-                                        "query": rev
-                                    }
-                                }
-                            }]
-                        }
-                    }
-                }
-            rev_org = es.search(index='modules', doc_type='modules', body=query)['hits']['hits']
-        else:
-            query = \
-                {
-                    "query": {
-                        "bool": {
-                            "must": [{
-                                "match_phrase": {
-                                    "module.keyword": {
-                                        "query": mod
-                                    }
-                                }
-                            }]
-                        }
-                    },
-                    "sort": [
-                        {"revision": {"order": "desc"}}
-                    ]
-                }
-            rev_org = es.search(index='modules', doc_type='modules', body=query)['hits']['hits']
-
-        row = dict()
-        i = 1
-        for result in rev_org:
-            result = result['_source']
-            if i > depth:
-                break
-            row.update(result)
-            i += 1
-        if not row.get('organization'):
-            row['organization'] = 'independent'
-        if row.get('revision') is not None:
-            return {'org': row['organization'], 'rev': row['revision']}
-        else:
-            return {'org': row['organization'], 'rev': ''}
+        return dict(search_rev_org(mod, depth))
     except Exception as e:
         alerts.append("Failed to get module revision and organization for {}, {}".format(mod, e))
 
 
+def search_rev_org(mod, depth=1):
+    """
+    Gets revision and organization for specified Module either from the cache
+    or from the modules index. Results are cached in REV_ORG_CACHE until the index changes.
+    :param mod: Module name optionally with @revision
+    :param depth: Searches dependents for module to get newest rev and org
+    :return: (dict) cached revision and organization, must not be modified
+    """
+    key = (mod, depth)
+    rev_org = REV_ORG_CACHE.get(key)
+    if rev_org is not None:
+        return rev_org
+    query = queries.rev_org(mod)
+    hits = queries.hits(get_es().search(index='modules', doc_type='modules', body=query, size=depth,
+                                  filter_path=queries.HITS_FILTER))
+    rev_org = rev_org_from_hits(hits, depth)
+    REV_ORG_CACHE.set(key, rev_org)
+    return rev_org
+
+
+def rev_org_from_hits(hits, depth=1):
+    """
+    Merges first depth hits of the modules index into revision and organization.
+    :param hits: hits returned from the modules index
+    :param depth: number of hits to merge
+    :return: (dict) revision and organization
+    """
+    row = dict()
+    i = 1
+    for result in hits:
+        result = result['_source']
+        if i > depth:
+            break
+        row.update(result)
+        i += 1
+    if not row.get('organization'):
+        row['organization'] = 'independent'
+    if row.get('revision') is not None:
+        return {'org': row['organization'], 'rev': row['revision']}
+    else:
+        return {'org': row['organization'], 'rev': ''}
+
+
 def get_rev_org_obj(module, alerts):
     """
     Gets revision and organization but also fills other arguments of module object.
@@ -1046,10 +1483,13 @@ def get_rev_org_obj(module, alerts):
         if rev_org.get('rev') is None or rev_org.get('rev') == '':
             alerts.append("Failed to find revision for module {} in the API".format(module))
             return
+        mobj = module_from_cache(modn, rev_org['rev'], rev_org['org'])
+        if mobj is not None:
+            return mobj
         mobj = moduleFactory(modn, rev_org['rev'], rev_org['org'])
         try:
-            url = api_prefix + '/api/search/modules/' + modn + ',' + rev_org['rev'] + ',' + rev_org['org']
-            response = requests.get(url, headers={'Content-type': 'application/json', 'Accept': 'application/json'})
+            url = '/api/search/modules/' + modn + ',' + rev_org['rev'] + ',' + rev_org['org']
+            response = backend().get(url, endpoint='search/modules/<module>')
             results = json.loads(response.text).get('module')
             if results is not None:
                 for result in results:
@@ -1057,36 +1497,165 @@ def get_rev_org_obj(module, alerts):
                         if k in __module:
                             mobj[k] = v
             else:
+                alerts.append("Module {} not found in the API".format(module))
                 return dict()
+            cache_module(mobj)
             return mobj
+        except BackendUnavailable as e:
+            alerts.append("Failed to get module {} from the API, {}".format(module, e))
+            return
         except Exception as e:
             logger.error(e)
             depth += 1
 
 
+def get_rev_org_objs(modules, alerts):
+    """
+    Batched version of get_rev_org_obj. Revisions and organizations of all the modules
+    are resolved with a single msearch request to the modules index and their metadata
+    are then requested from the api with a single request.
+    :param modules: list of module names
+    :param alerts: alerts to show when something has gone awry.
+    :return: (dict) module name -> module object, None if the revision could not be found
+    """
+    modules = list(OrderedDict.fromkeys(modules))
+    rev_orgs = dict()
+    missing = []
+    for module in modules:
+        rev_org = REV_ORG_CACHE.get((module, 1))
+        if rev_org is None:
+            missing.append(module)
+        else:
+            rev_orgs[module] = rev_org
+    if missing:
+        body = []
+        for module in missing:
+            body.append({'index': 'modules', 'type': 'modules'})
+            body.append(queries.rev_org(module))
+            body[-1]['size'] = 1
+        try:
+            responses = get_es().msearch(body=body, filter_path=queries.MSEARCH_FILTER)['responses']
+            for module, response in zip(missing, responses):
+                if response.get('error') is not None:
+                    logger.error('Failed to get revision and organization for {}, {}'
+                                 .format(module, response['error']))
+                    continue
+                rev_org = rev_org_from_hits(queries.hits(response))
+                REV_ORG_CACHE.set((module, 1), rev_org)
+                rev_orgs[module] = rev_org
+        except Exception as e:
+            logger.error('Failed to get revisions and organizations of {} modules, {}'.format(len(missing), e))
+
+    mod_objs = dict()
+    to_fetch = []
+    for module in modules:
+        rev_org = rev_orgs.get(module)
+        if rev_org is None:
+            mod_objs[module] = get_rev_org_obj(module, alerts)
+            continue
+        if not rev_org['rev']:
+            alerts.append("Failed to find revision for module {} in the API".format(module))
+            mod_objs[module] = None
+            continue
+        mobj = module_from_cache(module.split('@')[0], rev_org['rev'], rev_org['org'])
+        if mobj is not None:
+            mod_objs[module] = mobj
+            continue
+        to_fetch.append((module, moduleFactory(module.split('@')[0], rev_org['rev'], rev_org['org'])))
+    if len(to_fetch) == 0:
+        return mod_objs
+
+    try:
+        post_json = {'input': [{'name': mobj['name'], 'revision': mobj['revision'],
+                                'organization': mobj['organization']} for _, mobj in to_fetch]}
+        response = backend().post('/api/search/modules', endpoint='search/modules', json=post_json)
+        results = json.loads(response.text).get('module') or []
+    except Exception as e:
+        logger.error('Failed to get metadata of {} modules, {}'.format(len(to_fetch), e))
+        for module, _ in to_fetch:
+            mod_objs[module] = get_rev_org_obj(module, alerts)
+        return mod_objs
+
+    found = dict()
+    for result in results:
+        found[(result.get('name'), result.get('revision'), result.get('organization'))] = result
+    if len(found) < len(to_fetch):
+        logger.warning('Metadata of {} out of {} modules missing in the response of the api, requesting them one by one'
+                       .format(len(to_fetch) - len(found), len(to_fetch)))
+    for module, mobj in to_fetch:
+        result = found.get((mobj['name'], mobj['revision'], mobj['organization']))
+        if result is None:
+            # same as when the whole request fails, get_rev_org_obj alerts if the api does not know the module
+            mod_objs[module] = get_rev_org_obj(module, alerts)
+            continue
+        for k, v in result.items():
+            if k in __module:
+                mobj[k] = v
+        cache_module(mobj)
+        mod_objs[module] = mobj
+    return mod_objs
+
+
+def resolve_graph_modules(modules, alerts):
+    """
+    Resolves module objects for the impact graph. Modules are looked up in the dependency
+    graph snapshot first, only the ones missing there are requested with get_rev_org_objs.
+    :param modules: list of module names
+    :param alerts: alerts to show when something has gone awry.
+    :return: (dict) module name -> module object, None if the revision could not be found
+    """
+    snapshot = DEPENDENCY_GRAPH.get()
+    mod_objs = dict()
+    missing = []
+    for module in modules:
+        mod_obj = None
+        if snapshot is not None:
+            mod_obj = snapshot.module_object(module)
+        if mod_obj is None:
+            missing.append(module)
+        else:
+            mod_objs[module] = mod_obj
+    if missing:
+        mod_objs.update(get_rev_org_objs(missing, alerts))
+    return mod_objs
+
+
 def moduleFactory(name, revision, organization, override=False, yang_suite=False, attrs=dict()):
     """
-    Checks whether module isn't already filled, and creates it if not.
+    Creates new module object which the caller fills with metadata from the api. Every
+    call returns a new object, so callers running in parallel never share one.
     :param name: module name
     :param revision: revision of module
     :param organization: author organization
-    :param override: if enabled, recreates module from scratch
+    :param override: kept for compatibility, module is always created from scratch
     :param yang_suite: tells whether to request yangsuite url as well.
     :param attrs: attributes which are already avaiable
     :return: module
     """
-    mod_sig = "{}@{}/{}".format(name, revision, organization)
-    create_new = False
-    if yang_suite:
-        create_new = True
-    if seen_modules.get(mod_sig) is None:
-        create_new = True
-    elif override:
-        seen_modules[mod_sig] = None
-        create_new = True
-    if create_new:
-        seen_modules[mod_sig] = constructModule(name, revision, organization, yang_suite, attrs)
-    return seen_modules[mod_sig]
+    return constructModule(name, revision, organization, yang_suite, attrs)
+
+
+def module_from_cache(name, revision, organization):
+    """
+    :param name: module name
+    :param revision: revision of module
+    :param organization: author organization
+    :return: copy of the module metadata fetched from the api before, None if it is not cached
+    """
+    mod = MODULE_CACHE.get("{}@{}/{}".format(name, revision, organization))
+    if mod is None:
+        return None
+    return copy.deepcopy(mod)
+
+
+def cache_module(mod_obj):
+    """
+    Stores a copy of module filled with metadata from the api, later changes of mod_obj
+    do not change the cached one.
+    :param mod_obj: module object
+    """
+    mod_sig = "{}@{}/{}".format(mod_obj['name'], mod_obj['revision'], mod_obj['organization'])
+    MODULE_CACHE.set(mod_sig, copy.deepcopy(mod_obj))
 
 
 def constructModule(name, revision, organization, yang_suite=False, attrs=dict()):
@@ -1141,12 +1710,16 @@ def get_type_str(json):
     return type_str
 
 
-def build_tree(jsont, module, pass_on_schemas=None, augments=False):
+def build_node(jsont, module, pass_on_schemas, augments=False):
     """
-    Builds data for yang_tree.html, takes json and recursively writes out it's children.
+    Builds data of one node for yang_tree.html without its children. Schema type of
+    a node with children is pushed to pass_on_schemas, the caller pops it once the
+    children are built.
     :param jsont: input json
     :param module: module name
-    :return: (dict) with all nodes and their parameters
+    :param pass_on_schemas: schema types of the ancestors of the node
+    :param augments: whether the node is in the augments section
+    :return: (dict) node and its parameters, with empty list of children if it has any
     """
     node = dict()
     node['text'] = jsont['name']
@@ -1167,8 +1740,6 @@ def build_tree(jsont, module, pass_on_schemas=None, augments=False):
         'path': '',
         'path_class': 'path-class'
     }
-    if pass_on_schemas is None:
-        pass_on_schemas = []
     if jsont.get('name') == module:
         node['data']['schema'] = 'module'
     elif jsont.get('schema_type') is not None:
@@ -1199,7 +1770,7 @@ def build_tree(jsont, module, pass_on_schemas=None, augments=False):
             path = '{}/{}'.format(path, path_part.split('?')[0])
         node['data']['path'] = path
         node['data']['sensor_path'] = re.sub(r'/[^:]+:', '/', path).replace('/', '/{}:'.format(module), 1)
-    if jsont['name'] != module and jsont.get('children') is None or len(jsont['children']) == 0:
+    if jsont['name'] != module and jsont.get('children') is None or not jsont.get('children'):
         node['icon'] = 'glyphicon glyphicon-leaf'
         if jsont.get('path') is not None:
             if augments:
@@ -1215,10 +1786,6 @@ def build_tree(jsont, module, pass_on_schemas=None, augments=False):
         node['a_attr']['style'] = 'color: #00e;'
     elif jsont.get('children') is not None:
         node['children'] = []
-        for child in jsont['children']:
-            node['children'].append(build_tree(child, module, pass_on_schemas, augments))
-        if len(pass_on_schemas) != 0 and jsont.get('schema_type') not in ['choice', 'case']:
-            pass_on_schemas.pop()
 
     return node
 
@@ -1273,181 +1840,370 @@ def is_submod(mod_obj):
         return False
 
 
-def build_graph(module, mod_obj, orgs, nodes, edges, edge_counts, nseen, eseen, alerts, show_rfcs, colors,
-                recurse=0, nested=False, show_subm=True, show_dir='both'):
+def get_graph_executor():
     """
-    Builds graph for impact_analysis. takes module name, and mod_obj, which has all of the modules
-    dependents and dependencies.
-    Goes through both dependents and dependencies and adds them to output if they are
-    eligible for
-    :param module: module name
-    :param mod_obj: module object
+    Thread pool used to resolve modules of the impact graph in parallel. It is created
+    lazily so that every gunicorn worker gets its own threads after fork.
+    :return: ThreadPoolExecutor
+    """
+    global graph_executor
+    if graph_executor is None:
+        graph_executor = ThreadPoolExecutor(max_workers=GRAPH_WORKERS, thread_name_prefix='impact-graph')
+    return graph_executor
+
+
+def get_details_executor():
+    """
+    Thread pool used to run the independent calls of module_details concurrently.
+    It is created lazily so that every gunicorn worker gets its own threads after fork.
+    :return: ThreadPoolExecutor
+    """
+    global details_executor
+    if details_executor is None:
+        details_executor = ThreadPoolExecutor(max_workers=DETAILS_WORKERS, thread_name_prefix='module-details')
+    return details_executor
+
+
+def expand_graph(mod_objs, orgs, alerts, show_rfcs, recurse=0, show_subm=True, show_dir='both'):
+    """
+    Traversal engine for impact_analysis. Walks the dependency graph breadth first from
+    the given module objects and resolves every level's frontier on a bounded thread pool,
+    GRAPH_BATCH_SIZE modules per resolve_graph_modules call. It follows the same recursion rules
+    as build_graph, which then finds all the module objects it needs already resolved.
+    :param mod_objs: module objects of the target modules
     :param orgs: organizations array
-    :param nodes: nodes for output (circles)
-    :param edges: lines for output
-    :param edge_counts: number of edges
-    :param nseen: dict
-    :param eseen: dict
     :param alerts: alerts to show when something has gone awry.
     :param show_rfcs: (bool) show rfcs or not
     :param recurse: recursion level
-    :param nested: (bool) module object multiple level status
     :param show_subm: (bool) submodules visibility status
     :param show_dir: (bool) directory visibility status
-    :return: (dict) graph output
-    """
-    global found_orgs, found_mats
-    is_subm = False
-    if not show_subm and nested:
-        module = get_parent(mod_obj)
-    elif show_subm:
-        is_subm = is_submod(mod_obj)
-    if nested and nseen.get(module) is not None:
-        return
-    if mod_obj.get('organization') is not None:
-        org = mod_obj.get('organization')
-    else:
-        org = 'independent'
-
-    if nested > 0 and len(orgs) > 0 and not (len(orgs) == 1 and orgs[0] == ''):
-        if org not in orgs:
-            return
-
-    found_orgs[org] = True
-    try:
-        dependents = mod_obj.get('dependents')
-        dependencies = mod_obj.get('dependencies')
-        mmat = get_maturity(mod_obj)
-        if nested and mmat.get('olevel') == 'RATIFIED' and not show_rfcs:
-            return
-
-        color = color_gen(org, colors)
-        if found_mats.get(mmat['level']) is None:
-            found_mats[mmat['level']] = [module]
-        else:
-            found_mats[mmat['level']].append(module)
-        document = get_doc(mod_obj)
-        upper_org = ''
-        if org:
-            upper_org = org.upper()
-        nodes.append({'data': {'id': "mod_{}".format(module), 'name': module, 'objColor': color,
-                               'document': document, 'sub_mod': is_subm, 'org': upper_org, 'mat': mmat['level']}})
-        if edge_counts.get(module) is None:
-            edge_counts[module] = 0
-        nseen[module] = True
-        if (show_dir == 'both' or show_dir == 'dependents') and dependents is not None:
-            for moda in dependents:
-                mod = moda['name']
-                is_msubm = False
-                mobj = get_rev_org_obj(mod, alerts)
-                if mobj is None:
+    :return: (dict) module name -> module object
+    """
+    resolved = dict()
+    expanded = set()
+    level = [(mod_obj, recurse, show_dir) for mod_obj in mod_objs if mod_obj]
+    while level:
+        frontier = []
+        for mod_obj, _, direction in level:
+            for key in ['dependents', 'dependencies']:
+                if direction != 'both' and direction != key:
                     continue
-                if not show_subm:
-                    mod = get_parent(mobj)
-                else:
-                    is_msubm = is_submod(mobj)
-
-                if eseen.get("mod_{}:mod_{}".format(module, mod)):
+                for moda in mod_obj.get(key) or []:
+                    if moda['name'] not in resolved:
+                        frontier.append(moda['name'])
+        frontier = list(OrderedDict.fromkeys(frontier))
+        batches = [frontier[i:i + GRAPH_BATCH_SIZE] for i in range(0, len(frontier), GRAPH_BATCH_SIZE)]
+        resolve_batch = timing.propagate(lambda batch: resolve_graph_modules(batch, alerts))
+        for mobjs in get_graph_executor().map(resolve_batch, batches):
+            resolved.update(mobjs)
+
+        next_level = []
+        for mod_obj, r, direction in level:
+            for key in ['dependents', 'dependencies']:
+                if direction != 'both' and direction != key:
                     continue
-
-                eseen["mod_{}:mod_{}".format(module, mod)] = True
-                maturity = get_maturity(mobj)
-                if maturity['olevel'] == 'RATIFIED' and not show_rfcs:
+                if (key == 'dependents' and r == 0) or (key == 'dependencies' and r <= 0):
                     continue
+                for moda in mod_obj.get(key) or []:
+                    mobj = resolved.get(moda['name'])
+                    if not mobj or moda['name'] in expanded:
+                        continue
+                    if key == 'dependencies' and not show_subm and is_submod(mobj):
+                        continue
+                    if get_maturity(mobj)['olevel'] == 'RATIFIED' and not show_rfcs:
+                        continue
+                    if len(orgs) > 0 and (mobj.get('organization') or 'UNKNOWN') not in orgs:
+                        continue
+                    expanded.add(moda['name'])
+                    # nested build_graph calls for dependencies always show both directions
+                    next_level.append((mobj, r - 1, direction if key == 'dependents' else 'both'))
+        level = next_level
+    return resolved
 
-                org = mobj.get('organization')
-                if not org:
-                    org = 'UNKNOWN'
 
-                mcolor = color_gen(org, colors)
+class GraphBuilder(object):
+    """
+    Request scoped state of the impact_analysis graph. Collects nodes, edges and legend
+    data for one request so nothing is shared between requests or threads.
+    """
+
+    def __init__(self, orgs, alerts, show_rfcs, colors, recurse=0, show_subm=True, show_dir='both'):
+        """
+        :param orgs: organizations array
+        :param alerts: alerts to show when something has gone awry.
+        :param show_rfcs: (bool) show rfcs or not
+        :param colors: colors assigned to the organizations before generated ones are used
+        :param recurse: recursion level
+        :param show_subm: (bool) submodules visibility status
+        :param show_dir: (bool) directory visibility status
+        """
+        self.orgs = orgs
+        self.alerts = alerts
+        self.show_rfcs = show_rfcs
+        self.colors = list(colors)
+        self.recurse = recurse
+        self.show_subm = show_subm
+        self.show_dir = show_dir
+        self.nodes = []
+        self.edges = []
+        self.edge_counts = dict()
+        self.nseen = dict()
+        self.eseen = dict()
+        self.found_orgs = dict()
+        self.found_mats = dict()
+        self.org_colors = dict()
+        self.cur_step = 1
+        self.resolved = dict()
+
+    def add_module(self, module, mod_obj):
+        """
+        Adds target module to the graph together with its dependents and dependencies.
+        :param module: module name
+        :param mod_obj: module object
+        """
+        self.build_graph(module, mod_obj, self.recurse, False, self.show_subm, self.show_dir)
+
+    def expand(self, mod_objs):
+        """
+        Resolves all the module objects reachable from the target modules up front.
+        :param mod_objs: module objects of the target modules
+        """
+        self.resolved.update(expand_graph(mod_objs, self.orgs, self.alerts, self.show_rfcs, self.recurse,
+                                          self.show_subm, self.show_dir))
+
+    def build_graph(self, module, mod_obj, recurse=0, nested=False, show_subm=True, show_dir='both'):
+        """
+        Builds graph for impact_analysis. takes module name, and mod_obj, which has all of the modules
+        dependents and dependencies.
+        Goes through both dependents and dependencies and adds them to output if they are
+        eligible for
+        :param module: module name
+        :param mod_obj: module object
+        :param recurse: recursion level
+        :param nested: (bool) module object multiple level status
+        :param show_subm: (bool) submodules visibility status
+        :param show_dir: (bool) directory visibility status
+        """
+        is_subm = False
+        if not show_subm and nested:
+            module = get_parent(mod_obj)
+        elif show_subm:
+            is_subm = is_submod(mod_obj)
+        if nested and self.nseen.get(module) is not None:
+            return
+        if mod_obj.get('organization') is not None:
+            org = mod_obj.get('organization')
+        else:
+            org = 'independent'
 
-                if found_mats.get(maturity['level']) is None:
-                    found_mats[maturity['level']] = [mod]
-                else:
-                    found_mats[maturity['level']].append(mod)
+        if nested > 0 and len(self.orgs) > 0 and not (len(self.orgs) == 1 and self.orgs[0] == ''):
+            if org not in self.orgs:
+                return
 
-                if len(orgs) > 0:
-                    if org not in orgs:
+        self.found_orgs[org] = True
+        try:
+            dependents = mod_obj.get('dependents')
+            dependencies = mod_obj.get('dependencies')
+            mmat = get_maturity(mod_obj)
+            if nested and mmat.get('olevel') == 'RATIFIED' and not self.show_rfcs:
+                return
+
+            color = self.color_gen(org)
+            if self.found_mats.get(mmat['level']) is None:
+                self.found_mats[mmat['level']] = [module]
+            else:
+                self.found_mats[mmat['level']].append(module)
+            document = get_doc(mod_obj)
+            upper_org = ''
+            if org:
+                upper_org = org.upper()
+            self.nodes.append({'data': {'id': "mod_{}".format(module), 'name': module, 'objColor': color,
+                                        'document': document, 'sub_mod': is_subm, 'org': upper_org, 'mat': mmat['level']}})
+            if self.edge_counts.get(module) is None:
+                self.edge_counts[module] = 0
+            self.nseen[module] = True
+            neighbours = []
+            if (show_dir == 'both' or show_dir == 'dependents') and dependents is not None:
+                neighbours.extend([moda['name'] for moda in dependents])
+            if (show_dir == 'both' or show_dir == 'dependencies') and dependencies:
+                neighbours.extend([moda['name'] for moda in dependencies])
+            pending = [name for name in neighbours if name not in self.resolved]
+            if pending:
+                self.resolved.update(resolve_graph_modules(pending, self.alerts))
+            if (show_dir == 'both' or show_dir == 'dependents') and dependents is not None:
+                for moda in dependents:
+                    mod = moda['name']
+                    is_msubm = False
+                    mobj = self.resolved[mod]
+                    if mobj is None:
                         continue
+                    if not show_subm:
+                        mod = get_parent(mobj)
+                    else:
+                        is_msubm = is_submod(mobj)
 
-                found_orgs[org] = True
-
-                if mmat['olevel'] == 'INITIAL' or mmat['olevel'] == 'ADOPTED':
-                    edge_counts[module] += 1
-                if "mod_{}".format(module) != "mod_{}".format(mod):
-                    edges.append({'data': {'source': "mod_{}".format(module), 'target': "mod_{}".format(mod),
-                                           'objColor': mcolor, 'org': org.upper(), 'mat': maturity['level']}})
-                if recurse > 0 or recurse < 0:
-                    r = recurse - 1
-                    build_graph(mod, mobj, orgs, nodes, edges, edge_counts, nseen, eseen, alerts, show_rfcs,
-                                colors, r, True, show_subm, show_dir)
-                else:
-                    document = get_doc(mobj)
-                    nodes.append(
-                        {'data': {'id': "mod_{}".format(mod), 'name': mod, 'objColor': mcolor, 'document': document,
-                                  'sub_mod': is_msubm, 'org': org.upper(), 'mat': maturity['level']}})
-
-        if (show_dir == 'both' or show_dir == 'dependencies') and dependencies:
-            for moda in dependencies:
-                mod = moda['name']
-                is_msubm = False
-                mobj = get_rev_org_obj(mod, alerts)
-
-                if show_subm:
-                    is_msubm = is_submod(mobj)
-                else:
-                    is_msubm = is_submod(mobj)
-                    if is_msubm:
+                    if self.eseen.get("mod_{}:mod_{}".format(module, mod)):
                         continue
 
-                if eseen.get("mod_{}:mod_{}".format(mod, module)) is not None:
-                    continue
+                    self.eseen["mod_{}:mod_{}".format(module, mod)] = True
+                    maturity = get_maturity(mobj)
+                    if maturity['olevel'] == 'RATIFIED' and not self.show_rfcs:
+                        continue
 
-                if eseen.get("mod_{}:mod_{}".format(module, mod)) is not None:
-                    alerts.append("Loop found {} <=> {}")
+                    org = mobj.get('organization')
+                    if not org:
+                        org = 'UNKNOWN'
 
-                eseen["mod_{}:mod_{}".format(mod, module)] = True
-                maturity = get_maturity(mobj)
-                if maturity.get('olevel') == 'RATIFIED' and not show_rfcs:
-                    continue
+                    mcolor = self.color_gen(org)
 
-                org = mobj.get('organization')
-                if org == '':
-                    org = 'UNKNOWN'
-                if found_mats.get(maturity['level']) is None:
-                    found_mats[maturity['level']] = [mod]
-                else:
-                    found_mats[maturity['level']].append(mod)
+                    if self.found_mats.get(maturity['level']) is None:
+                        self.found_mats[maturity['level']] = [mod]
+                    else:
+                        self.found_mats[maturity['level']].append(mod)
+
+                    if len(self.orgs) > 0:
+                        if org not in self.orgs:
+                            continue
+
+                    self.found_orgs[org] = True
+
+                    if mmat['olevel'] == 'INITIAL' or mmat['olevel'] == 'ADOPTED':
+                        self.edge_counts[module] += 1
+                    if "mod_{}".format(module) != "mod_{}".format(mod):
+                        self.edges.append({'data': {'source': "mod_{}".format(module), 'target': "mod_{}".format(mod),
+                                                    'objColor': mcolor, 'org': org.upper(), 'mat': maturity['level']}})
+                    if recurse > 0 or recurse < 0:
+                        r = recurse - 1
+                        self.build_graph(mod, mobj, r, True, show_subm, show_dir)
+                    else:
+                        document = get_doc(mobj)
+                        self.nodes.append(
+                            {'data': {'id': "mod_{}".format(mod), 'name': mod, 'objColor': mcolor, 'document': document,
+                                      'sub_mod': is_msubm, 'org': org.upper(), 'mat': maturity['level']}})
+
+            if (show_dir == 'both' or show_dir == 'dependencies') and dependencies:
+                for moda in dependencies:
+                    mod = moda['name']
+                    is_msubm = False
+                    mobj = self.resolved[mod]
+
+                    if show_subm:
+                        is_msubm = is_submod(mobj)
+                    else:
+                        is_msubm = is_submod(mobj)
+                        if is_msubm:
+                            continue
 
-                if len(orgs) > 0:
-                    if org not in orgs:
+                    if self.eseen.get("mod_{}:mod_{}".format(mod, module)) is not None:
                         continue
 
-                found_orgs[org] = True
+                    if self.eseen.get("mod_{}:mod_{}".format(module, mod)) is not None:
+                        self.alerts.append("Loop found {} <=> {}")
+
+                    self.eseen["mod_{}:mod_{}".format(mod, module)] = True
+                    maturity = get_maturity(mobj)
+                    if maturity.get('olevel') == 'RATIFIED' and not self.show_rfcs:
+                        continue
 
-                mcolor = color_gen(org, colors)
-                if maturity['olevel'] == 'INITIAL' or maturity['olevel'] == 'ADOPTED':
-                    if not edge_counts.get(mod):
-                        edge_counts[mod] = 1
+                    org = mobj.get('organization')
+                    if org == '':
+                        org = 'UNKNOWN'
+                    if self.found_mats.get(maturity['level']) is None:
+                        self.found_mats[maturity['level']] = [mod]
                     else:
-                        edge_counts[mod] += 1
-
-                if not nested:
-                    if "mod_{}".format(mod) != "mod_{}".format(module):
-                        edges.append({'data': {'source': "mod_{}".format(mod), 'target': "mod_{}".format(module),
-                                               'objColor': mcolor, 'org': org.upper(), 'mat': maturity['level']}})
-
-                if recurse > 0:
-                    r = recurse - 1
-                    build_graph(mod, mobj, orgs, nodes, edges, edge_counts, nseen, eseen, alerts, show_rfcs, colors,
-                                r, True)
-                elif not nested:
-                    document = get_doc(mobj)
-                    nodes.append(
-                        {'data': {'id': "mod_{}".format(mod), 'name': mod, 'objColor': mcolor, 'document': document,
-                                  'sub_mod': is_msubm, 'org': org.upper(), 'mat': maturity['level']}})
-    except Exception as e:
-        alerts.append("Failed to read dependency data for {}, {}".format(module, e))
+                        self.found_mats[maturity['level']].append(mod)
+
+                    if len(self.orgs) > 0:
+                        if org not in self.orgs:
+                            continue
+
+                    self.found_orgs[org] = True
+
+                    mcolor = self.color_gen(org)
+                    if maturity['olevel'] == 'INITIAL' or maturity['olevel'] == 'ADOPTED':
+                        if not self.edge_counts.get(mod):
+                            self.edge_counts[mod] = 1
+                        else:
+                            self.edge_counts[mod] += 1
+
+                    if not nested:
+                        if "mod_{}".format(mod) != "mod_{}".format(module):
+                            self.edges.append({'data': {'source': "mod_{}".format(mod),
+                                                        'target': "mod_{}".format(module),
+                                                        'objColor': mcolor, 'org': org.upper(), 'mat': maturity['level']}})
+
+                    if recurse > 0:
+                        r = recurse - 1
+                        self.build_graph(mod, mobj, r, True)
+                    elif not nested:
+                        document = get_doc(mobj)
+                        self.nodes.append(
+                            {'data': {'id': "mod_{}".format(mod), 'name': mod, 'objColor': mcolor, 'document': document,
+                                      'sub_mod': is_msubm, 'org': org.upper(), 'mat': maturity['level']}})
+        except Exception as e:
+            self.alerts.append("Failed to read dependency data for {}, {}".format(module, e))
+
+    def color_gen(self, org):
+        """
+        Color generator for impact_analysis website, dependent organization and it's arguments.
+        Makes request to local database
+        :param org: organization
+        :return: color
+        """
+        global NUM_STEPS
+        if org:
+            org = org.upper()
+        if self.org_colors.get(org) is not None:
+            return self.org_colors[org]
+        if NUM_STEPS == -1:
+            try:
+                response = get_es().search(index='modules', doc_type='modules', body=queries.distinct_orgs(),
+                                     filter_path=queries.DISTINCT_ORGS_FILTER)
+                row = response['aggregations']['distinct_orgs']['value']
+                NUM_STEPS = row + 1
+            except Exception as e:
+                NUM_STEPS = 33
+                raise Exception(e)
+        if len(self.colors) != 0:
+            self.org_colors[org] = self.colors.pop()
+        else:
+            r = -1
+            g = -1
+            b = -1
+            h = self.cur_step / NUM_STEPS
+            i = int(h * 6)
+            f = h * 6 - i
+            q = 1 - f
+            result = i % 6
+            if result == 0:
+                r = 1
+                g = f
+                b = 0
+            elif result == 1:
+                r = q
+                g = 1
+                b = 0
+            elif result == 2:
+                r = 0
+                g = 1
+                b = f
+            elif result == 3:
+                r = 0
+                g = q
+                b = 1
+            elif result == 4:
+                r = f
+                g = 0
+                b = 1
+            elif result == 5:
+                r = 1
+                g = 0
+                b = q
+            c = '#' + ('00' + hex(int(r * 255)))[-2:] + ('00' + hex(int(g * 255)))[-2:] + ('00' + hex(int(b * 255)))[-2:]
+            c = c.replace('x', '0')
+            self.org_colors[org] = c
+        self.cur_step += 1
+        return self.org_colors[org]
 
 
 def get_maturity(mod_obj, alerts=None):
@@ -1491,78 +2247,6 @@ def get_compile_status(mod_obj):
         return ''
 
 
-def color_gen(org, colors):
-    """
-    Color generator for impact_analysis website, dependent organization and it's arguments.
-    Makes request to local database
-    :param org: organization
-    :return: color
-    """
-    global NUM_STEPS, CUR_STEP, ORG_CACHE
-    if org:
-        org = org.upper()
-    if ORG_CACHE.get(org) is not None:
-        return ORG_CACHE[org]
-    if NUM_STEPS == -1:
-        try:
-            query = \
-                {
-                    "size": 0,
-                    "aggs": {
-                        "distinct_orgs": {
-                            "cardinality": {
-                                "field": "organization.keyword"
-                            }
-                        }
-                    }
-                }
-            row = es.search(index='modules', doc_type='modules', body=query)['aggregations']['distinct_orgs']['value']
-            NUM_STEPS = row + 1
-        except Exception as e:
-            NUM_STEPS = 33
-            raise Exception(e)
-    if len(colors) != 0:
-        ORG_CACHE[org] = colors.pop()
-    else:
-        r = -1
-        g = -1
-        b = -1
-        h = CUR_STEP / NUM_STEPS
-        i = int(h * 6)
-        f = h * 6 - i
-        q = 1 - f
-        result = i % 6
-        if result == 0:
-            r = 1
-            g = f
-            b = 0
-        elif result == 1:
-            r = q
-            g = 1
-            b = 0
-        elif result == 2:
-            r = 0
-            g = 1
-            b = f
-        elif result == 3:
-            r = 0
-            g = q
-            b = 1
-        elif result == 4:
-            r = f
-            g = 0
-            b = 1
-        elif result == 5:
-            r = 1
-            g = 0
-            b = q
-        c = '#' + ('00' + hex(int(r * 255)))[-2:] + ('00' + hex(int(g * 255)))[-2:] + ('00' + hex(int(b * 255)))[-2:]
-        c = c.replace('x', '0')
-        ORG_CACHE[org] = c
-    CUR_STEP += 1
-    return ORG_CACHE[org]
-
-
 def moduleFactoryFromSearch(search):
     """
     Creates module based on api search. Used only with ietf_wg in impact_analysis.
@@ -1570,14 +2254,13 @@ def moduleFactoryFromSearch(search):
     :return: module object
     """
     mod_objs = []
-    global seen_modules
-    url = '{}/api/search/{}'.format(api_prefix, search)
-    response = requests.get(url, headers={'Content-type': 'application/json', 'Accept': 'application/json'})
+    url = '/api/search/{}'.format(search)
+    response = backend().get(url, endpoint='search/<key>/<value>')
     result = json.loads(response.text)
     for mod in result['yang-catalog:modules']['module']:
-        mod_sig = "{}@{}/{}".format(mod['name'], mod['revision'], mod['organization'])
-        seen_modules[mod_sig] = constructModule(mod['name'], mod['revision'], mod['organization'], False, mod)
-        mod_objs.append(seen_modules[mod_sig])
+        mod_obj = constructModule(mod['name'], mod['revision'], mod['organization'], False, mod)
+        cache_module(mod_obj)
+        mod_objs.append(mod_obj)
 
     return mod_objs
 
@@ -1598,27 +2281,12 @@ def get_latest_mod(module):
     :return: module
     """
     try:
-        query = \
-            {
-                "query": {
-                    "bool": {
-                        "must": [{
-                            "match_phrase": {
-                                "module.keyword": {
-                                    "query": module
-                                }
-                            }
-                        }]
-                    }
-                },
-                "sort": [
-                    {"revision": {"order": "desc"}}
-                ]
-            }
-        rev_org = es.search(index='modules', doc_type='modules', body=query)['hits']['hits'][0]['_source']
-        return "{}@{}".format(module, rev_org['revision'])
+        rev_org = search_rev_org(module)
     except Exception as e:
         raise Exception("Failed to get revision for {}".format(module))
+    if not rev_org['rev']:
+        raise Exception("Failed to get revision for {}".format(module))
+    return "{}@{}".format(module, rev_org['rev'])
 
 
 def impact_analysis_php(request):
@@ -1635,7 +2303,7 @@ def impact_analysis_php(request):
     #    base_url = reverse('impact_analysis')
     #    base_url = reverse(views.impact_analysis)
     #    base_url = reverse(impact_analysis)
-    base_url = '{}/yang-search/impact_analysis/'.format(api_prefix)
+    base_url = '{}/yang-search/impact_analysis/'.format(get_api_prefix())
     # More complex now... let's translate the query_string
     query_dict = dict()
     modtags = []
@@ -1665,6 +2333,20 @@ def impact_analysis_php(request):
     return redirect(url, permanent=False)
 
 
+def metrics_view(request):
+    """
+    Exposes prometheus metrics of all the workers to the addresses in METRICS_ALLOWED_IPS setting.
+    :param request: Array with arguments from rest request.
+    :return: metrics in the prometheus text format
+    """
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        logger.warning('Metrics requested from {} which is not allowed'.format(request.META.get('REMOTE_ADDR')))
+        return HttpResponse(json.dumps({'error': 'Not found'}, cls=DjangoJSONEncoder),
+                            content_type='application/json', status=404)
+    output, content_type = metrics.exposition()
+    return HttpResponse(output, content_type=content_type)
+
+
 def ping(request):
     logger.info('Ping from healthcheck')
     config_path = '/etc/yangcatalog/yangcatalog.conf'
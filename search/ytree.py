@@ -0,0 +1,254 @@
+# Copyright The IETF Trust 2019, All Rights Reserved
+# Copyright 2018 Cisco and its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Streaming reader of the json-ytree files written by the json_tree pyang plugin.
+The file is read in chunks and nodes are parsed only when they are reached, so
+memory needed to walk the tree depends on its depth and not on the size of the
+file. The plugin writes children of every node as its last key, which is what
+allows all the other attributes of a node to be known before its children are
+parsed. Values other than lists of nodes are decoded by the C scanner of the json
+module straight from the buffer.
+"""
+
+import re
+from json.decoder import JSONDecodeError, JSONDecoder, scanstring
+
+CHUNK_SIZE = 64 * 1024
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+TERMINATOR = re.compile(r'[,\]}\s]')
+
+DECODER = JSONDecoder()
+
+# keys of the module object holding lists of nodes, these are returned lazily
+NODE_LISTS = ('children', 'rpcs', 'notifications')
+
+
+class Parser(object):
+    """
+    Pull parser of a json document read from a file object in chunks. Already
+    consumed part of the buffer is dropped whenever a new chunk is read.
+    """
+
+    def __init__(self, fd, chunk_size=CHUNK_SIZE):
+        self.fd = fd
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size=None):
+        chunk = self.fd.read(size or self.chunk_size)
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        if not chunk:
+            self.eof = True
+        return bool(chunk)
+
+    def _error(self, msg):
+        return JSONDecodeError(msg, self.buf, self.pos)
+
+    def peek(self):
+        """
+        :return: next character which is not a whitespace or '' at the end of the file
+        """
+        while True:
+            if self.pos < len(self.buf):
+                char = self.buf[self.pos]
+                if char not in ' \t\n\r':
+                    return char
+                self.pos = WHITESPACE.match(self.buf, self.pos).end()
+                continue
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise self._error('Expecting {!r}'.format(char))
+        self.pos += 1
+
+    def string(self):
+        if self.peek() != '"':
+            raise self._error('Expecting string')
+        while True:
+            try:
+                value, end = scanstring(self.buf, self.pos + 1)
+            except JSONDecodeError:
+                # string may continue in the next chunk
+                if self.eof or not self._fill():
+                    raise
+                continue
+            self.pos = end
+            return value
+
+    def value(self):
+        """
+        Parses the next json value completely. A value which is not whole in the buffer
+        is parsed again once more of the file is read, the buffer grows twice each time
+        so a large value is parsed only a few times.
+        :return: parsed value
+        """
+        char = self.peek()
+        if char == '':
+            raise self._error('Expecting value')
+        if char not in '"{[':
+            # a number or literal is decoded only once it is whole in the buffer
+            while TERMINATOR.search(self.buf, self.pos) is None and self._fill():
+                pass
+        while True:
+            try:
+                value, end = DECODER.raw_decode(self.buf, self.pos)
+            except JSONDecodeError:
+                if self.eof or not self._fill(max(self.chunk_size, len(self.buf) - self.pos)):
+                    raise
+                continue
+            self.pos = end
+            return value
+
+    def finish_object(self, obj, first=False):
+        """
+        Parses remaining keys of an object up to its closing brace into obj.
+        :param obj: dict to store the keys in
+        :param first: whether no key of the object has been parsed yet
+        """
+        while True:
+            char = self.peek()
+            if char == '}':
+                self.pos += 1
+                return
+            if not first:
+                self.expect(',')
+            first = False
+            key = self.string()
+            self.expect(':')
+            obj[key] = self.value()
+
+    def node(self):
+        """
+        Parses the next node object. Its children are not parsed, they are returned
+        as LazyNodes which parses them and the rest of the node once iterated.
+        :return: (dict) node
+        """
+        self.expect('{')
+        node = dict()
+        first = True
+        while True:
+            char = self.peek()
+            if char == '}':
+                self.pos += 1
+                return node
+            if not first:
+                self.expect(',')
+            first = False
+            key = self.string()
+            self.expect(':')
+            if key == 'children' and self.peek() == '[':
+                self.pos += 1
+                node[key] = LazyNodes(self, self.node, owner=node)
+                return node
+            node[key] = self.value()
+
+
+class LazyNodes(object):
+    """
+    Array whose items are parsed one by one while it is iterated. Only a single pass
+    is possible. Before the next item is parsed, children of the previous one which
+    were not iterated by the consumer are skipped.
+    """
+
+    def __init__(self, parser, parse_item, owner=None):
+        """
+        :param parser: Parser positioned just after the opening bracket
+        :param parse_item: function parsing one item of the array
+        :param owner: object containing the array, its remaining keys are parsed after the array
+        """
+        self._parser = parser
+        self._parse_item = parse_item
+        self._owner = owner
+        self._empty = parser.peek() == ']'
+        self._items = self._iterate()
+
+    def __bool__(self):
+        return not self._empty
+
+    def __iter__(self):
+        return self._items
+
+    def _iterate(self):
+        parser = self._parser
+        item = None
+        while True:
+            if item is not None:
+                skip(item)
+            if parser.peek() == ']':
+                parser.pos += 1
+                break
+            if item is not None:
+                parser.expect(',')
+            item = self._parse_item()
+            yield item
+        if self._owner is not None:
+            self._parser.finish_object(self._owner)
+
+    def close(self):
+        """
+        Skips all the items which were not iterated yet.
+        """
+        for _ in self._items:
+            pass
+
+
+def skip(item):
+    """
+    Skips not iterated children of a parsed node.
+    :param item: node returned by Parser.node()
+    """
+    if isinstance(item, dict):
+        children = item.get('children')
+        if isinstance(children, LazyNodes):
+            children.close()
+
+
+def iter_module(fd, chunk_size=CHUNK_SIZE):
+    """
+    Walks the module object of the json-ytree file. Lists of nodes (children, rpcs and
+    notifications) are returned as LazyNodes of nodes, augments as LazyNodes of
+    completely parsed augments because the plugin writes their children before their path.
+    Everything else is parsed completely. A lazy value which the consumer does not iterate
+    is skipped before the next key is returned.
+    :param fd: file object opened for reading
+    :param chunk_size: number of characters read at once
+    :return: generator of (key, value) pairs of the module object
+    """
+    parser = Parser(fd, chunk_size)
+    parser.expect('{')
+    first = True
+    while True:
+        if parser.peek() == '}':
+            return
+        if not first:
+            parser.expect(',')
+        first = False
+        key = parser.string()
+        parser.expect(':')
+        if parser.peek() == '[' and (key in NODE_LISTS or key == 'augments'):
+            parser.pos += 1
+            parse_item = parser.value if key == 'augments' else parser.node
+            value = LazyNodes(parser, parse_item)
+            yield key, value
+            value.close()
+        else:
+            yield key, parser.value()
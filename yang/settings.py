@@ -69,6 +69,10 @@ ALLOWED_HOSTS = [
     '18.224.127.129'
 ]
 
+# addresses allowed to scrape the prometheus metrics, separated by spaces in metrics-allowed-ips
+# of Web-Section, only local requests are answered when it is not configured
+METRICS_ALLOWED_IPS = config.get('Web-Section', 'metrics-allowed-ips', fallback='127.0.0.1 ::1').split()
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -81,6 +85,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'search.timing.TimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',